@@ -0,0 +1,7 @@
+"""
+Performance tooling for the UI Server.
+
+Run from the repository root so that ``conf`` can find ``config.yaml``:
+
+    python -m benchmarks.harness --iterations 50
+"""
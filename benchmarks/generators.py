@@ -0,0 +1,580 @@
+"""
+Synthetic payload generators for load testing the UI builders
+
+Every generator produces a ``backend_output`` that parses into the model the
+handler itself uses (``tool_call_models`` types or the local models such as
+``MortgageData``, ``HumanApprovalRequestEvent`` and ``ReceiverByCardResponse``).
+Output is fully determined by the seed and the size knobs, so runs are
+repeatable across machines.
+
+Usage:
+    from benchmarks.generators import SizeKnobs, build_request
+
+    body = build_request("get_products", seed=7, knobs=SizeKnobs(products=500))
+"""
+
+import importlib
+import random
+from dataclasses import dataclass, fields, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BENCH_API_KEY = "bench-api-key"
+BENCH_CHAT_ID = "benchmark-synthetic"
+
+
+@dataclass(frozen=True)
+class SizeKnobs:
+    """Collection sizes used by the generators (defaults are the "large" profile)"""
+
+    products: int = 200
+    cards: int = 30
+    mortgage_months: int = 360
+    categories: int = 100
+    suppliers: int = 200
+    contacts: int = 1000
+    news: int = 50
+    notifications: int = 100
+    names: int = 50
+    supplier_fields: int = 20
+    approval_rows: int = 40
+    home_services: int = 9
+    forecast_days: int = 7
+    activity_arguments: int = 40
+    text_chars: int = 2000
+
+    @classmethod
+    def from_overrides(cls, overrides: Dict[str, Any]) -> "SizeKnobs":
+        """Build knobs from ``{"products": "500", ...}`` (e.g. parsed CLI flags)"""
+        known = {f.name for f in fields(cls)}
+        unknown = set(overrides) - known
+        if unknown:
+            raise ValueError(f"Unknown size knobs: {sorted(unknown)}")
+        return replace(cls(), **{k: int(v) for k, v in overrides.items()})
+
+
+# ---------------------------------------------------------------------------
+# Building blocks
+# ---------------------------------------------------------------------------
+
+_FIRST_NAMES = ["Ivan", "Aziz", "Dilnoza", "Jasur", "Malika", "Sardor", "Nodira", "Timur", "Olga", "Bekzod"]
+_LAST_NAMES = ["Ivanov", "Karimov", "Rahimova", "Tursunov", "Yusupova", "Aliyev", "Saidova", "Petrov"]
+_PROCESSING = ["UZCARD", "HUMO", "VISA", "MASTERCARD"]
+_BRANDS = ["Apple", "Samsung", "Xiaomi", "Artel", "LG", "Huawei"]
+_WORDS = [
+    "Ваш", "запрос", "обработан", "ниже", "приведена", "подробная", "информация",
+    "платёж", "баланс", "карта", "перевод", "успешно", "выполнен", "сумма",
+]
+_HOME_SERVICES = ["electricity", "gas", "water", "garbage", "hotWater", "coldWater", "heating", "internet", "mobile"]
+
+
+def _text(rng: random.Random, n_chars: int) -> str:
+    out: List[str] = []
+    length = 0
+    while length < n_chars:
+        word = rng.choice(_WORDS)
+        out.append(word)
+        length += len(word) + 1
+    return " ".join(out)[:n_chars]
+
+
+def _full_name(rng: random.Random) -> Tuple[str, str]:
+    return rng.choice(_FIRST_NAMES), rng.choice(_LAST_NAMES)
+
+
+def _pan_suffix(rng: random.Random) -> str:
+    return f"{rng.randint(0, 9999):04d}"
+
+
+def _card(rng: random.Random, i: int) -> Dict[str, Any]:
+    suffix = _pan_suffix(rng)
+    return {
+        "panMask": f"8600 **** **** {suffix}",
+        "panToken": f"token_{rng.getrandbits(48):012x}",
+        "requestId": f"req_{i:05d}",
+        "pan": f"8600********{suffix}",
+        "expiry": f"{rng.randint(1, 12):02d}/{rng.randint(26, 32)}",
+        "bankIssuer": "SmartBank",
+        "processingSystem": rng.choice(_PROCESSING),
+        "salaryAmount": 0,
+        "isVerified": True,
+        "createdAt": "2023-06-15",
+        "cardDetails": {
+            "cardDetailsId": i + 1,
+            "cardName": f"Card {i + 1}",
+            "cardColor": f"#{rng.getrandbits(24):06X}",
+            "cardIsPrimary": i == 0,
+        },
+        "cardBalance": {"balance": rng.randint(0, 500_000_000), "status": 0},
+        "isVirtual": rng.random() < 0.2,
+        "bankIcon": {
+            "bankLogo": "https://example.com/logo.png",
+            "bankLogoMini": "https://example.com/logo_mini.png",
+            "bankWhiteLogo": "https://example.com/logo_w.png",
+            "bankWhiteLogoMini": "https://example.com/logo_wm.png",
+        },
+    }
+
+
+def _product(rng: random.Random, i: int) -> Dict[str, Any]:
+    original = rng.randint(100, 40_000) * 1000
+    price = original - rng.randint(0, original // 10000) * 1000
+    return {
+        "id": 55000 + i,
+        "name": f"{rng.choice(_BRANDS)} Model {i} {rng.choice([64, 128, 256, 512])}GB",
+        "slug": f"product-{i}",
+        "offer_id": 90000 + i,
+        "brand": {"id": rng.randint(1, 200), "name": rng.choice(_BRANDS)},
+        "category": {"id": 5499, "name": "Smartfonlar", "slug": "smartfony", "depth": 3},
+        "images": {"main": f"https://example.com/products/{i}.jpg"},
+        "price": {
+            "is_active": True,
+            "original": original,
+            "price": price,
+            "monthly": price // 12,
+            "installments": [
+                {"period": 6, "price": price // 6},
+                {"period": 12, "price": price // 12},
+            ],
+        },
+        "view_count": rng.randint(0, 10000),
+        "order_count": rng.randint(0, 500),
+        "like_count": rng.randint(0, 1000),
+        "rate": rng.randint(1, 5),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Generators: (rng, knobs) -> (backend_output, llm_output or None)
+# ---------------------------------------------------------------------------
+
+Generated = Tuple[Any, Optional[str]]
+
+
+def gen_get_balance(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    first, last = _full_name(rng)
+    return {
+        "body": [
+            {
+                "custNo": str(rng.randint(10000, 99999)),
+                "phoneNumber": f"+99890{rng.randint(0, 9999999):07d}",
+                "firstname": first,
+                "middlename": "",
+                "lastname": last,
+                "birthDate": "1990-01-01",
+                "pinfl": f"{rng.getrandbits(40):014d}"[:14],
+                "createdAt": "2023-01-01",
+                "cardList": [_card(rng, i) for i in range(knobs.cards)],
+            }
+        ],
+        "status": 200,
+    }, None
+
+
+def gen_get_products(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    n = knobs.products
+    return {
+        "products": [_product(rng, i) for i in range(n)],
+        "meta": {"current_page": 1, "from": 1, "last_page": 1, "per_page": n, "to": n, "total": n},
+    }, None
+
+
+def gen_calculate_mortgage(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    months = max(knobs.mortgage_months, 1)
+    loan = rng.randint(100, 2000) * 1_000_000
+    rate = rng.choice([0.01, 0.0125, 0.015, 0.0175])
+    payment = int(loan * rate / (1 - (1 + rate) ** -months))
+    remaining = loan
+    schedule = []
+    for month in range(1, months + 1):
+        interest = int(remaining * rate)
+        principal = payment - interest
+        remaining = max(remaining - principal, 0)
+        schedule.append(
+            {
+                "month": month,
+                "monthly_payment": payment,
+                "principal": principal,
+                "interest": interest,
+                "remaining_balance": remaining,
+            }
+        )
+    return {
+        "loan_amount": loan,
+        "monthly_payment": payment,
+        "total_months": months,
+        "total_paid": payment * months,
+        "total_interest": payment * months - loan,
+        "schedule": schedule,
+    }, None
+
+
+def gen_get_categories(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    return {
+        "payload": [
+            {
+                "id": i,
+                "name": f"Категория {i}",
+                "imagePath": f"/img/{i}.png",
+                "s3Url": f"https://example.com/categories/{i}.png",
+            }
+            for i in range(knobs.categories)
+        ],
+        "code": 0,
+    }, None
+
+
+def gen_get_suppliers_by_category(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    category_id = rng.randint(1, 20)
+    return {
+        "payload": [
+            {
+                "id": i,
+                "name": f"Поставщик {i}",
+                "categoryId": category_id,
+                "s3Url": f"https://example.com/suppliers/{i}.png",
+            }
+            for i in range(knobs.suppliers)
+        ],
+        "code": 0,
+    }, None
+
+
+def gen_get_fields_of_supplier(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    return {
+        "payload": {
+            "checkUp": rng.random() < 0.5,
+            "fieldList": [
+                {
+                    "identName": f"field_{i}",
+                    "name": f"Поле {i}",
+                    "order": i,
+                    "type": rng.choice(["STRING", "PHONE", "MONEY"]),
+                    "pattern": None,
+                    "minValue": None,
+                    "maxValue": None,
+                    "fieldSize": rng.randint(5, 40),
+                    "isMain": i == 0,
+                    "valueList": [],
+                }
+                for i in range(knobs.supplier_fields)
+            ],
+        },
+        "code": 0,
+    }, None
+
+
+def gen_build_contacts_list(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    contacts = []
+    for i in range(knobs.contacts):
+        first, last = _full_name(rng)
+        contacts.append(
+            {
+                "first_name": f"{first}{i}",
+                "last_name": last,
+                "phone": f"+99890{rng.randint(0, 9999999):07d}",
+            }
+        )
+    return contacts, None
+
+
+def gen_get_receiver_id_by_receiver_phone_number(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    cards = []
+    for _ in range(knobs.cards):
+        first, last = _full_name(rng)
+        suffix = _pan_suffix(rng)
+        cards.append(
+            {
+                "pan": f"8600********{suffix}",
+                "name": f"{first.upper()} {last.upper()}",
+                "processing": rng.choice(_PROCESSING[:2]),
+                "mask": f"8600 **** **** {suffix}",
+            }
+        )
+    return {"cards": cards}, None
+
+
+def gen_get_number_by_receiver_name(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    return {"names": [" ".join(_full_name(rng)) for _ in range(knobs.names)]}, None
+
+
+def gen_get_news(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    return {
+        "header_text": "TOP NEWS",
+        "news_items": [
+            {
+                "title": _text(rng, 60),
+                "source": rng.choice(["kun.uz", "gazeta.uz", "daryo.uz"]),
+                "time": f"{rng.randint(1, 23)} часа назад",
+                "image_url": f"https://example.com/news/{i}.jpg",
+                "url": f"https://example.com/news/{i}",
+            }
+            for i in range(knobs.news)
+        ],
+    }, None
+
+
+def _weather_condition(rng: random.Random) -> Dict[str, Any]:
+    text, code = rng.choice([("Sunny", 1000), ("Partly cloudy", 1003), ("Light rain", 1183), ("Snow", 1213)])
+    return {"text": text, "icon": f"//cdn.weatherapi.com/weather/64x64/day/{code}.png", "code": code}
+
+
+def gen_get_weather_info(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    temp = round(rng.uniform(-15, 40), 1)
+    epoch = 1_700_000_000
+    current = {
+        "last_updated_epoch": epoch,
+        "last_updated": "2023-11-14 22:00",
+        "temp_c": temp,
+        "temp_f": round(temp * 9 / 5 + 32, 1),
+        "is_day": rng.randint(0, 1),
+        "condition": _weather_condition(rng),
+        "wind_dir": rng.choice(["N", "NE", "E", "SE", "S", "SW", "W", "NW"]),
+        "wind_degree": rng.randint(0, 359),
+        "humidity": rng.randint(10, 100),
+        "cloud": rng.randint(0, 100),
+    }
+    for field in (
+        "wind_mph", "wind_kph", "pressure_mb", "pressure_in", "precip_mm", "precip_in",
+        "feelslike_c", "feelslike_f", "windchill_c", "windchill_f", "heatindex_c", "heatindex_f",
+        "dewpoint_c", "dewpoint_f", "vis_km", "vis_miles", "uv", "gust_mph", "gust_kph",
+    ):
+        current[field] = round(rng.uniform(0, 30), 1)
+    return {
+        "location": {
+            "name": "Tashkent",
+            "region": "Toshkent",
+            "country": "Uzbekistan",
+            "lat": 41.32,
+            "lon": 69.25,
+            "tz_id": "Asia/Tashkent",
+            "localtime_epoch": epoch,
+            "localtime": "2023-11-14 22:13",
+        },
+        "current": current,
+        "forecast": {
+            "forecastday": [
+                {
+                    "date": f"2023-11-{15 + i % 15:02d}",
+                    "date_epoch": epoch + 86400 * i,
+                    "day": {
+                        "maxtemp_c": temp + rng.randint(0, 8),
+                        "mintemp_c": temp - rng.randint(0, 8),
+                        "avghumidity": rng.randint(10, 100),
+                        "daily_chance_of_rain": rng.randint(0, 100),
+                        "condition": _weather_condition(rng),
+                    },
+                    "astro": {
+                        "sunrise": "07:05 AM",
+                        "sunset": "05:02 PM",
+                        "moonrise": "08:41 AM",
+                        "moonset": "06:03 PM",
+                        "moon_phase": "Waxing Crescent",
+                        "moon_illumination": rng.randint(0, 100),
+                        "is_moon_up": 0,
+                        "is_sun_up": 0,
+                    },
+                }
+                for i in range(knobs.forecast_days)
+            ]
+        },
+    }, None
+
+
+def gen_get_notifications(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    return {
+        "notifications": [
+            {"title": f"Уведомление {i}", "description": _text(rng, 80)}
+            for i in range(knobs.notifications)
+        ]
+    }, None
+
+
+def gen_get_home_balances(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    output: Dict[str, Any] = {"homeName": "Мой дом"}
+    for service in _HOME_SERVICES[: knobs.home_services]:
+        output[service] = {"balance": rng.randint(-2_000_000, 2_000_000), "details": {}}
+    return output, None
+
+
+def _check_up_rows(rng: random.Random, rows: int) -> List[Dict[str, Any]]:
+    first, last = _full_name(rng)
+    return [
+        {
+            "name": "ФИО" if i == 0 else f"Поле {i}",
+            "value": f"{last.upper()} {first.upper()}" if i == 0 else _text(rng, 20),
+            "type": "full_name" if i == 0 else "string",
+            "order": i,
+        }
+        for i in range(rows)
+    ]
+
+
+def gen_human_approval(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    call_id = f"call_{rng.getrandbits(32):08x}"
+    return {
+        "human_approval_event": {
+            "tool_call_id": call_id,
+            "user_id": f"user_{rng.randint(1, 10**6)}",
+            "session_id": f"session_{rng.getrandbits(32):08x}",
+            "app_name": "smarty",
+            "approve_link": f"https://example.com/approve/{call_id}",
+            "reject_link": f"https://example.com/reject/{call_id}",
+            "tool_name": "make_payment",
+            "arguments": {
+                "amount": rng.randint(1, 5000) * 1000,
+                "category_id": str(rng.randint(1, 20)),
+                "supplier_id": str(rng.randint(100, 999)),
+                "region_id": str(rng.randint(1, 14)),
+                "payment_no": str(rng.randint(10**6, 10**7 - 1)),
+                "supplierName": "Hududgaz",
+                "homeImage": "https://example.com/home.png",
+                "homeName": "Мой дом",
+                "supplierImage": "https://example.com/gas.png",
+                "checkUp": {
+                    "data": {
+                        "id": f"chk-{rng.getrandbits(24):06x}",
+                        "balance": rng.randint(0, 2_000_000),
+                        "response": _check_up_rows(rng, knobs.approval_rows),
+                    }
+                },
+            },
+        }
+    }, None
+
+
+def gen_pay_for_home_utility(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    return {
+        "data": {
+            "id": f"pay-{rng.getrandbits(24):06x}",
+            "transactionId": f"tx-{rng.getrandbits(32):08x}",
+            "response": _check_up_rows(rng, knobs.approval_rows),
+            "ofd": {"qr": "https://ofd.soliq.uz/check?t=1", "receiptType": "sale"},
+        },
+        "additional": {
+            "sender_masked_pan": f"8600 **** **** {_pan_suffix(rng)}",
+            "sender_name": " ".join(_full_name(rng)).upper(),
+            "date": "2025-06-01 13:00",
+            "amount": str(rng.randint(1, 5000) * 1000),
+        },
+    }, None
+
+
+def gen_get_receiver_by_card(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    found = rng.random() < 0.8
+    return {
+        "processingSystem": rng.choice(_PROCESSING[:2]),
+        "iconMini": "https://example.com/uz_mini.png",
+        "isFound": found,
+        "maskedPan": f"8600 **** **** {_pan_suffix(rng)}",
+        "icon": "https://example.com/uz.png",
+        "fullName": " ".join(_full_name(rng)).upper() if found else None,
+        "token": f"tok_{rng.getrandbits(32):08x}",
+    }, None
+
+
+def gen_send_money_to_someone_via_card(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    return {
+        "amount": rng.randint(1, 99000) * 1000,
+        "fullName": " ".join(_full_name(rng)).upper(),
+        "maskedPan": f"8600 **** **** {_pan_suffix(rng)}",
+        "icon": "https://example.com/uzcard.png",
+        "card_name": "Salary card",
+        "processingSystem": rng.choice(_PROCESSING[:2]),
+        "token": f"tok_{rng.getrandbits(32):08x}",
+    }, None
+
+
+def gen_chatbot_answer(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    return {}, _text(rng, knobs.text_chars)
+
+
+def gen_function_call_activity_record(rng: random.Random, knobs: SizeKnobs) -> Generated:
+    return {
+        "function_name": "get_balance",
+        "arguments": {f"arg_{i}": _text(rng, 16) for i in range(knobs.activity_arguments)},
+    }, None
+
+
+GENERATORS: Dict[str, Callable[[random.Random, SizeKnobs], Generated]] = {
+    "get_balance": gen_get_balance,
+    "get_products": gen_get_products,
+    "calculate_mortgage": gen_calculate_mortgage,
+    "get_categories": gen_get_categories,
+    "get_suppliers_by_category": gen_get_suppliers_by_category,
+    "get_fields_of_supplier": gen_get_fields_of_supplier,
+    "build_contacts_list": gen_build_contacts_list,
+    "get_receiver_id_by_receiver_phone_number": gen_get_receiver_id_by_receiver_phone_number,
+    "get_number_by_receiver_name": gen_get_number_by_receiver_name,
+    "get_news": gen_get_news,
+    "get_weather_info": gen_get_weather_info,
+    "get_notifications": gen_get_notifications,
+    "get_home_balances": gen_get_home_balances,
+    "human_approval": gen_human_approval,
+    "pay_for_home_utility": gen_pay_for_home_utility,
+    "get_receiver_by_card": gen_get_receiver_by_card,
+    "send_money_to_someone_via_card": gen_send_money_to_someone_via_card,
+    "chatbot_answer": gen_chatbot_answer,
+    "function_call_activity_record": gen_function_call_activity_record,
+}
+
+# Models each generated backend_output must parse into: (module, class, key).
+# ``key`` selects a sub-object of backend_output; None validates the whole thing.
+# Local models are imported lazily because their modules pull in the UI stack.
+MODELS: Dict[str, Tuple[str, str, Optional[str]]] = {
+    "get_balance": ("tool_call_models.cards", "CardsBalanceResponse", None),
+    "get_products": ("tool_call_models.smartbazar", "SearchProductsResponse", None),
+    "calculate_mortgage": ("functions_to_format.functions.mortgage", "MortgageData", None),
+    "get_categories": ("tool_call_models.paynet", "CategoriesResponse", None),
+    "get_suppliers_by_category": ("tool_call_models.paynet", "SupplierByCategoryResponse", None),
+    "get_receiver_id_by_receiver_phone_number": ("tool_call_models.cards", "CardsByPhoneNumberResponse", None),
+    "get_weather_info": ("tool_call_models.weather", "WeatherResponse", None),
+    "human_approval": ("functions_to_format.functions.human_approval", "HumanApprovalRequestEvent", "human_approval_event"),
+    "get_receiver_by_card": ("functions_to_format.functions.transfer", "ReceiverByCardResponse", None),
+}
+
+
+def validate_backend_output(function_name: str, backend_output: Any) -> None:
+    """
+    Parse a generated backend_output with the handler's model
+
+    Raises:
+        pydantic.ValidationError: If the payload does not match the model
+        ImportError: If the model's module cannot be imported here
+    """
+    spec = MODELS.get(function_name)
+    if spec is None:
+        return
+    module_name, class_name, key = spec
+    model = getattr(importlib.import_module(module_name), class_name)
+    data = backend_output[key] if key else backend_output
+    model.model_validate(data)
+
+
+def build_request(
+    function_name: str,
+    seed: int = 0,
+    knobs: Optional[SizeKnobs] = None,
+    validate: bool = False,
+) -> Dict[str, Any]:
+    """
+    Generate a ``/chat/v3/build_ui`` request body
+
+    Args:
+        function_name: Key of GENERATORS
+        seed: Seed for the per-request ``random.Random``
+        knobs: Collection sizes; defaults to ``SizeKnobs()``
+        validate: Parse backend_output with the handler's model before returning
+    """
+    if function_name not in GENERATORS:
+        raise KeyError(f"No generator for {function_name!r}")
+    rng = random.Random(f"{function_name}:{seed}")
+    backend_output, llm_output = GENERATORS[function_name](rng, knobs or SizeKnobs())
+    if validate:
+        validate_backend_output(function_name, backend_output)
+    return {
+        "function_name": function_name,
+        "llm_output": llm_output if llm_output is not None else "Вот результат по вашему запросу.",
+        "backend_output": backend_output,
+        "chat_id": BENCH_CHAT_ID,
+        "api_key": BENCH_API_KEY,
+    }
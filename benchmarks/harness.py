@@ -0,0 +1,610 @@
+"""
+Benchmark harness for every ``functions_mapper`` entry
+
+For each function name it loads ``tests/fixtures/benchmark/<function_name>.json``
+(a mapping of variant name -> ``/chat/v3/build_ui`` request body) and measures,
+per variant:
+
+- latency distribution of ``FunctionStrategy.__call__`` (``direct`` mode)
+  and of a full ``POST /chat/v3/build_ui`` through the ASGI app (``asgi`` mode)
+- allocations recorded by ``tracemalloc`` (peak and retained bytes)
+- output size in bytes
+
+Results are written as JSON and compared against a stored baseline so that
+regressions are visible per function, variant and mode.
+
+Usage:
+    python -m benchmarks.harness --iterations 50
+    python -m benchmarks.harness --functions get_balance,get_products --modes direct
+    python -m benchmarks.harness --synthetic --seed 7 --size products=500 --size contacts=5000
+    python -m benchmarks.harness --captured --modes direct
+    python -m benchmarks.harness --save-baseline
+"""
+
+import argparse
+import asyncio
+import copy
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Identical requests are repeated on purpose; they must render every time
+# instead of being answered by the render cache or coalesced.
+os.environ.setdefault("RENDER_CACHE_ENABLED", "false")
+os.environ.setdefault("COALESCE_ENABLED", "false")
+
+from benchmarks.stats import summarize_latencies
+
+FIXTURES_DIR = os.path.join("tests", "fixtures", "benchmark")
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+DEFAULT_OUTPUT_DIR = os.path.join("logs", "benchmarks")
+VARIANTS = ("small", "typical", "large")
+MODES = ("direct", "asgi")
+BENCH_CHAT_PREFIX = "benchmark-"
+
+# Handlers that are plain functions delegating to another handler, so they
+# cannot be matched to a fixture by object identity.
+FIXTURE_ALIASES = {
+    "get_home_utility_suppliers": "get_home_balances",
+}
+
+# (section, field) pairs compared against the baseline; field None means the
+# section itself is the value.
+COMPARED_METRICS: Tuple[Tuple[str, Optional[str]], ...] = (
+    ("latency_ms", "p50"),
+    ("latency_ms", "p99"),
+    ("allocations", "peak_bytes"),
+    ("output_bytes", None),
+)
+
+
+@dataclass
+class BenchmarkCase:
+    function_name: str
+    variant: str
+    payload: Dict[str, Any]
+    language: str = "ru"
+    source: str = ""
+
+
+@dataclass
+class BenchmarkResult:
+    function_name: str
+    variant: str
+    mode: str
+    latency_ms: Dict[str, float] = field(default_factory=dict)
+    allocations: Dict[str, float] = field(default_factory=dict)
+    output_bytes: int = 0
+    errors: int = 0
+    last_error: str = ""
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "function_name": self.function_name,
+            "variant": self.variant,
+            "mode": self.mode,
+            "latency_ms": self.latency_ms,
+            "allocations": self.allocations,
+            "output_bytes": self.output_bytes,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Case loading
+# ---------------------------------------------------------------------------
+
+
+def _fixture_index(fixtures_dir: str) -> Dict[str, str]:
+    return {
+        os.path.splitext(os.path.basename(path))[0]: path
+        for path in glob.glob(os.path.join(fixtures_dir, "*.json"))
+    }
+
+
+def resolve_fixture(
+    function_name: str, functions_mapper: Dict[str, Any], fixtures_dir: str
+) -> Optional[str]:
+    """
+    Find the fixture file for a function name
+
+    Aliases in ``functions_mapper`` (several names bound to the same handler
+    instance) share the fixture of whichever name has one.
+    """
+    index = _fixture_index(fixtures_dir)
+    if function_name in index:
+        return index[function_name]
+    alias = FIXTURE_ALIASES.get(function_name)
+    if alias in index:
+        return index[alias]
+    handler = functions_mapper.get(function_name)
+    for name, other in functions_mapper.items():
+        if other is handler and name in index:
+            return index[name]
+    return None
+
+
+def load_cases(
+    function_names: Optional[Sequence[str]] = None,
+    variants: Sequence[str] = VARIANTS,
+    fixtures_dir: str = FIXTURES_DIR,
+    language: str = "ru",
+) -> List[BenchmarkCase]:
+    """
+    Build benchmark cases for the requested functions and variants
+
+    Args:
+        function_names: Names from functions_mapper; defaults to all of them
+        variants: Fixture variants to include
+        fixtures_dir: Directory with ``<function_name>.json`` fixtures
+        language: Value of the ``language`` header used for every case
+    """
+    from functions_to_format.functions import functions_mapper
+
+    names = list(function_names or functions_mapper.keys())
+    cases: List[BenchmarkCase] = []
+    for name in names:
+        if name not in functions_mapper:
+            print(f"[bench] unknown function_name {name!r}, skipping", file=sys.stderr)
+            continue
+        path = resolve_fixture(name, functions_mapper, fixtures_dir)
+        if path is None:
+            print(f"[bench] no fixture for {name!r}, skipping", file=sys.stderr)
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            fixture = json.load(f)
+        for variant in variants:
+            if variant not in fixture:
+                continue
+            payload = dict(fixture[variant])
+            payload["function_name"] = name
+            payload["chat_id"] = f"{BENCH_CHAT_PREFIX}{name}"
+            cases.append(
+                BenchmarkCase(
+                    function_name=name,
+                    variant=variant,
+                    payload=payload,
+                    language=language,
+                    source=path,
+                )
+            )
+    return cases
+
+
+def load_synthetic_cases(
+    function_names: Optional[Sequence[str]] = None,
+    seed: int = 0,
+    size_overrides: Optional[Dict[str, Any]] = None,
+    language: str = "ru",
+) -> List[BenchmarkCase]:
+    """
+    Build ``synthetic`` cases from ``benchmarks.generators``
+
+    Args:
+        function_names: Names with a generator; defaults to all generators
+        seed: Generator seed
+        size_overrides: Size knob overrides, e.g. ``{"products": 500}``
+        language: Value of the ``language`` header used for every case
+    """
+    from benchmarks.generators import GENERATORS, SizeKnobs, build_request
+
+    knobs = SizeKnobs.from_overrides(size_overrides or {})
+    cases: List[BenchmarkCase] = []
+    for name in function_names or GENERATORS.keys():
+        if name not in GENERATORS:
+            continue
+        payload = build_request(name, seed=seed, knobs=knobs)
+        payload["chat_id"] = f"{BENCH_CHAT_PREFIX}{name}"
+        cases.append(
+            BenchmarkCase(
+                function_name=name,
+                variant="synthetic",
+                payload=payload,
+                language=language,
+                source=f"generators:seed={seed}",
+            )
+        )
+    return cases
+
+
+def load_captured_cases(
+    capture_dir: str,
+    function_names: Optional[Sequence[str]] = None,
+) -> List[BenchmarkCase]:
+    """
+    Build cases from slow-request captures (``utils.slow_requests``)
+
+    Each capture becomes its own ``captured:<request_id prefix>`` variant and
+    keeps the language it was recorded with.
+    """
+    cases: List[BenchmarkCase] = []
+    for path in sorted(glob.glob(os.path.join(capture_dir, "slot-*.json"))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                capture = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        payload = dict(capture.get("input") or {})
+        name = payload.get("function_name")
+        if not name or (function_names and name not in function_names):
+            continue
+        payload["chat_id"] = f"{BENCH_CHAT_PREFIX}{name}"
+        cases.append(
+            BenchmarkCase(
+                function_name=name,
+                variant=f"captured:{(capture.get('request_id') or os.path.basename(path))[:8]}",
+                payload=payload,
+                language=capture.get("language") or "ru",
+                source=path,
+            )
+        )
+    return cases
+
+
+# ---------------------------------------------------------------------------
+# Measurement helpers
+# ---------------------------------------------------------------------------
+
+
+def _output_size(result: Any) -> int:
+    if hasattr(result, "model_dump_json"):
+        return len(result.model_dump_json().encode("utf-8"))
+    return len(json.dumps(result, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _measure_allocations(run_once: Callable[[], Any], runs: int) -> Dict[str, float]:
+    """Median peak/retained bytes of ``runs`` traced executions."""
+    peaks: List[int] = []
+    retained: List[int] = []
+    for _ in range(runs):
+        tracemalloc.start()
+        try:
+            baseline_current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            run_once()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peaks.append(peak - baseline_current)
+        retained.append(current - baseline_current)
+    return {
+        "peak_bytes": statistics.median(peaks),
+        "retained_bytes": statistics.median(retained),
+    }
+
+
+def _make_context(case: BenchmarkCase):
+    from conf import logger
+    from functions_to_format.functions.general.const_values import LanguageOptions
+    from models.context import Context, LoggerContext
+
+    payload = copy.deepcopy(case.payload)
+    return Context(
+        logger_context=LoggerContext(chat_id=payload.get("chat_id") or "", logger=logger),
+        llm_output=payload.get("llm_output") or "",
+        backend_output=payload.get("backend_output") or {},
+        version="v3",
+        language=LanguageOptions(case.language),
+        api_key=payload.get("api_key") or "",
+        function_name=case.function_name,
+    )
+
+
+def run_direct(
+    case: BenchmarkCase, iterations: int, warmup: int, alloc_runs: int
+) -> BenchmarkResult:
+    """Benchmark ``functions_mapper[name](context=...)`` in-process."""
+    from functions_to_format.functions import functions_mapper
+
+    handler = functions_mapper[case.function_name]
+    result = BenchmarkResult(case.function_name, case.variant, "direct")
+    samples: List[float] = []
+    output: Any = None
+
+    for i in range(warmup + iterations):
+        # Contexts are built outside the timed region: handlers may mutate
+        # backend_output, so every call gets a fresh copy.
+        context = _make_context(case)
+        start = time.perf_counter_ns()
+        try:
+            output = handler(context=context)
+        except Exception as e:
+            result.errors += 1
+            result.last_error = repr(e)
+            continue
+        elapsed_ms = (time.perf_counter_ns() - start) / 1e6
+        if i >= warmup:
+            samples.append(elapsed_ms)
+
+    result.latency_ms = summarize_latencies(samples)
+    if output is not None:
+        result.output_bytes = _output_size(output)
+        contexts = [_make_context(case) for _ in range(alloc_runs)]
+        result.allocations = _measure_allocations(
+            lambda: handler(context=contexts.pop()), alloc_runs
+        )
+    return result
+
+
+async def _run_asgi_async(
+    case: BenchmarkCase, iterations: int, warmup: int, alloc_runs: int
+) -> BenchmarkResult:
+    import httpx
+    from src.server import app
+
+    result = BenchmarkResult(case.function_name, case.variant, "asgi")
+    body = json.dumps(case.payload, ensure_ascii=False).encode("utf-8")
+    headers = {"content-type": "application/json", "language": case.language}
+    samples: List[float] = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def post() -> httpx.Response:
+            return await client.post("/chat/v3/build_ui", content=body, headers=headers)
+
+        response: Optional[httpx.Response] = None
+        for i in range(warmup + iterations):
+            start = time.perf_counter_ns()
+            response = await post()
+            elapsed_ms = (time.perf_counter_ns() - start) / 1e6
+            if response.status_code != 200:
+                result.errors += 1
+                result.last_error = f"HTTP {response.status_code}: {response.text[:200]}"
+                continue
+            if i >= warmup:
+                samples.append(elapsed_ms)
+
+        if response is not None:
+            result.output_bytes = len(response.content)
+
+        peaks: List[int] = []
+        retained: List[int] = []
+        for _ in range(alloc_runs):
+            tracemalloc.start()
+            try:
+                baseline_current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                await post()
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            peaks.append(peak - baseline_current)
+            retained.append(current - baseline_current)
+        if peaks:
+            result.allocations = {
+                "peak_bytes": statistics.median(peaks),
+                "retained_bytes": statistics.median(retained),
+            }
+
+    result.latency_ms = summarize_latencies(samples)
+    return result
+
+
+def run_asgi(
+    case: BenchmarkCase, iterations: int, warmup: int, alloc_runs: int
+) -> BenchmarkResult:
+    """Benchmark ``POST /chat/v3/build_ui`` through the ASGI app (no network)."""
+    return asyncio.run(_run_asgi_async(case, iterations, warmup, alloc_runs))
+
+
+def cleanup_usage_logs() -> None:
+    """Remove usage segments written by benchmark requests."""
+    for path in glob.glob(os.path.join("logs", "usage", f"{BENCH_CHAT_PREFIX}*.jsonl")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------------
+
+
+def _metric(entry: Dict[str, Any], section: str, name: Optional[str]) -> Optional[float]:
+    value = entry.get(section)
+    if name is not None:
+        value = value.get(name) if isinstance(value, dict) else None
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def compare_to_baseline(
+    results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float
+) -> List[Dict[str, Any]]:
+    """
+    Compare results with a baseline report
+
+    Args:
+        results: ``BenchmarkResult.to_json()`` entries
+        baseline: A previously saved report (``{"results": [...]}``)
+        threshold: Allowed relative growth, e.g. 0.2 for +20%
+
+    Returns:
+        One row per result with per-metric ratios and a status of
+        ``ok``, ``regressed``, ``improved`` or ``new``
+    """
+    base_index = {
+        (r["function_name"], r["variant"], r["mode"]): r
+        for r in baseline.get("results", [])
+    }
+    rows: List[Dict[str, Any]] = []
+    for entry in results:
+        key = (entry["function_name"], entry["variant"], entry["mode"])
+        row: Dict[str, Any] = {
+            "function_name": key[0],
+            "variant": key[1],
+            "mode": key[2],
+            "metrics": {},
+        }
+        base = base_index.get(key)
+        if base is None:
+            row["status"] = "new"
+            rows.append(row)
+            continue
+
+        regressed: List[str] = []
+        improved: List[str] = []
+        for section, name in COMPARED_METRICS:
+            label = f"{section}.{name}" if name else section
+            current = _metric(entry, section, name)
+            previous = _metric(base, section, name)
+            if current is None or not previous:
+                continue
+            ratio = current / previous
+            row["metrics"][label] = {
+                "baseline": previous,
+                "current": current,
+                "ratio": round(ratio, 4),
+            }
+            if ratio > 1 + threshold:
+                regressed.append(label)
+            elif ratio < 1 - threshold:
+                improved.append(label)
+
+        row["regressed"] = regressed
+        row["status"] = "regressed" if regressed else ("improved" if improved else "ok")
+        rows.append(row)
+    return rows
+
+
+def _print_report(results: List[BenchmarkResult], comparison: List[Dict[str, Any]]) -> None:
+    status = {(r["function_name"], r["variant"], r["mode"]): r["status"] for r in comparison}
+    header = f"{'function':42} {'variant':8} {'mode':6} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>9} {'out KiB':>8} {'err':>4}  status"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        p50 = r.latency_ms.get("p50", 0.0)
+        p99 = r.latency_ms.get("p99", 0.0)
+        peak = r.allocations.get("peak_bytes", 0) / 1024
+        out = r.output_bytes / 1024
+        st = status.get((r.function_name, r.variant, r.mode), "-")
+        print(
+            f"{r.function_name:42} {r.variant:8} {r.mode:6} {p50:9.2f} {p99:9.2f} "
+            f"{peak:9.1f} {out:8.1f} {r.errors:4d}  {st}"
+        )
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def _split(value: Optional[str]) -> Optional[List[str]]:
+    if not value:
+        return None
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--functions", help="Comma-separated function names (default: all)")
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--language", default="ru", choices=["ru", "uz", "en"])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--alloc-runs", type=int, default=3)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--output", help="Result file (default: logs/benchmarks/bench-<ts>.json)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write results to --baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--keep-usage-logs", action="store_true")
+    parser.add_argument(
+        "--captured",
+        nargs="?",
+        const=os.path.join("logs", "slow_requests"),
+        metavar="DIR",
+        help="Add slow-request captures (default dir: logs/slow_requests)",
+    )
+    parser.add_argument("--synthetic", action="store_true", help="Add generated payloads as variant 'synthetic'")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for --synthetic")
+    parser.add_argument(
+        "--size",
+        action="append",
+        default=[],
+        metavar="KNOB=N",
+        help="Size knob for --synthetic, e.g. --size products=500 (repeatable)",
+    )
+    args = parser.parse_args(argv)
+
+    cases = load_cases(
+        function_names=_split(args.functions),
+        variants=_split(args.variants) or VARIANTS,
+        fixtures_dir=args.fixtures,
+        language=args.language,
+    )
+    if args.synthetic:
+        overrides = dict(item.split("=", 1) for item in args.size)
+        cases += load_synthetic_cases(
+            function_names=_split(args.functions),
+            seed=args.seed,
+            size_overrides=overrides,
+            language=args.language,
+        )
+    if args.captured:
+        cases += load_captured_cases(args.captured, function_names=_split(args.functions))
+    modes = _split(args.modes) or list(MODES)
+    runners = {"direct": run_direct, "asgi": run_asgi}
+
+    results: List[BenchmarkResult] = []
+    try:
+        for case in cases:
+            for mode in modes:
+                results.append(
+                    runners[mode](case, args.iterations, args.warmup, args.alloc_runs)
+                )
+    finally:
+        if not args.keep_usage_logs:
+            cleanup_usage_logs()
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "language": args.language,
+        },
+        "results": [r.to_json() for r in results],
+    }
+
+    comparison: List[Dict[str, Any]] = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            comparison = compare_to_baseline(report["results"], json.load(f), args.threshold)
+        report["comparison"] = {"baseline": args.baseline, "threshold": args.threshold, "rows": comparison}
+
+    output = args.output or os.path.join(
+        DEFAULT_OUTPUT_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    _print_report(results, comparison)
+    print(f"\nResults written to {output}")
+
+    if args.fail_on_regression and any(r["status"] == "regressed" for r in comparison):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
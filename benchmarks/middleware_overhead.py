@@ -0,0 +1,93 @@
+"""
+Per-request overhead of the rate limiting middleware
+
+Calls a trivial ASGI app directly (no HTTP, no server) with and without
+``RateLimitMiddleware`` in front of it, spreading requests over a number of
+distinct client keys, and reports the latency distribution of each mode and
+the median overhead the middleware adds. The limiter is configured so that
+every request is allowed; rejections are cheaper than the allowed path.
+
+Usage:
+    python -m benchmarks.middleware_overhead
+    python -m benchmarks.middleware_overhead --requests 200000 --keys 10000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from benchmarks.stats import summarize_latencies
+from utils.security import RateLimiter, RateLimitMiddleware
+
+_START = {"type": "http.response.start", "status": 200, "headers": []}
+_BODY = {"type": "http.response.body", "body": b"{}"}
+
+
+async def _app(scope, receive, send):
+    await send(_START)
+    await send(_BODY)
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+def _scopes(keys: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "type": "http",
+            "path": "/chat/v3/build_ui",
+            "query_string": b"",
+            "headers": [(b"content-type", b"application/json"), (b"x-api-key", f"key-{i}".encode())],
+            "client": (f"10.0.{i // 256 % 256}.{i % 256}", 40000),
+        }
+        for i in range(keys)
+    ]
+
+
+async def _measure(app, scopes: List[Dict[str, Any]], requests: int) -> List[float]:
+    samples = []
+    n = len(scopes)
+    for i in range(requests):
+        scope = scopes[i % n]
+        started = time.perf_counter_ns()
+        await app(scope, _receive, _send)
+        samples.append((time.perf_counter_ns() - started) / 1e3)
+    return samples
+
+
+def run(requests: int, keys: int) -> Dict[str, Any]:
+    scopes = _scopes(keys)
+    limiter = RateLimiter(max_requests=10**9, window=1, enabled=True)
+    # Every benchmark key authenticates, so requests are limited per api key
+    known_keys = {f"key-{i}": {} for i in range(keys)}
+    middleware = RateLimitMiddleware(_app, limiter=limiter, authenticate=known_keys.get)
+    modes = {"bare": _app, "rate_limited": middleware}
+    report: Dict[str, Any] = {"requests": requests, "keys": keys, "latency_us": {}}
+    for name, app in modes.items():
+        asyncio.run(_measure(app, scopes, min(requests, 10000)))  # warm-up
+        report["latency_us"][name] = summarize_latencies(asyncio.run(_measure(app, scopes, requests)))
+    report["overhead_us_p50"] = round(
+        report["latency_us"]["rate_limited"]["p50"] - report["latency_us"]["bare"]["p50"], 3
+    )
+    report["tracked_keys"] = len(limiter)
+    return report
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--keys", type=int, default=1000)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.requests, args.keys), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
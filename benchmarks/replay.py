@@ -0,0 +1,420 @@
+"""
+Traffic capture and replay from usage logs
+
+``save_builder_output`` appends every rendered request to
+``logs/usage/<chat_id>.jsonl``. This tool turns those segments into an
+anonymized replay corpus and replays it against the app, either in-process
+(ASGI transport, no network) or against a running instance.
+
+Usage:
+    # 1. Build a corpus (api_key and chat_id are replaced by salted hashes)
+    python -m benchmarks.replay corpus --usage-dir logs/usage --output logs/replay/corpus.jsonl
+
+    # 2. Replay in-process at 16 concurrent requests, 200 req/s
+    python -m benchmarks.replay run --corpus logs/replay/corpus.jsonl --concurrency 16 --rate 200
+
+    # 3. Replay against a local server, keeping the recorded inter-arrival times
+    python -m benchmarks.replay run --base-url http://localhost:8003 --preserve-timing --speedup 10
+"""
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import secrets
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from benchmarks.stats import summarize_latencies
+
+DEFAULT_USAGE_DIR = os.path.join("logs", "usage")
+DEFAULT_CORPUS = os.path.join("logs", "replay", "corpus.jsonl")
+DEFAULT_REPORT_DIR = os.path.join("logs", "replay")
+BUILD_UI_PATH = "/chat/v3/build_ui"
+
+# chat_id prefixes written by the benchmark, replay and warm-up tooling, so
+# replayed traffic never ends up in the next corpus
+SKIPPED_CHAT_PREFIXES = ("benchmark-", "replay-", "warmup-")
+
+
+@dataclass
+class ReplayItem:
+    function_name: str
+    language: str
+    body: Dict[str, Any]
+    timestamp: Optional[float] = None
+
+
+@dataclass
+class FunctionStats:
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    status_codes: Dict[int, int] = field(default_factory=lambda: defaultdict(int))
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies_ms) + self.errors
+
+
+# ---------------------------------------------------------------------------
+# Corpus building
+# ---------------------------------------------------------------------------
+
+
+def anonymize(value: Optional[str], salt: bytes, prefix: str) -> Optional[str]:
+    """Replace an identifier with a stable salted hash (empty values pass through)."""
+    if not value:
+        return value
+    digest = hashlib.blake2b(value.encode("utf-8"), key=salt, digest_size=8).hexdigest()
+    return f"{prefix}-{digest}"
+
+
+def iter_usage_records(usage_dir: str) -> Iterator[Dict[str, Any]]:
+    """Yield parsed usage records, skipping unreadable lines."""
+    for path in sorted(glob.glob(os.path.join(usage_dir, "*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def record_to_item(record: Dict[str, Any], salt: bytes) -> Optional[ReplayItem]:
+    """
+    Convert one usage record into a replay item
+
+    Returns None for records that cannot be replayed: written before
+    ``function_name`` was recorded, embedded renders, or benchmark traffic.
+    """
+    context = record.get("context") or {}
+    function_name = context.get("function_name")
+    chat_id = context.get("chat_id") or ""
+    if not function_name or chat_id.startswith(SKIPPED_CHAT_PREFIXES):
+        return None
+    body = {
+        "function_name": function_name,
+        "llm_output": context.get("llm_output"),
+        "backend_output": context.get("backend_output"),
+        "chat_id": anonymize(chat_id, salt, "replay"),
+        "api_key": anonymize(context.get("api_key"), salt, "key"),
+    }
+    return ReplayItem(
+        function_name=function_name,
+        language=context.get("language") or "ru",
+        body=body,
+        timestamp=record.get("timestamp"),
+    )
+
+
+def build_corpus(usage_dir: str, output: str, salt: Optional[bytes] = None) -> Dict[str, int]:
+    """
+    Build an anonymized, time-ordered replay corpus from usage segments
+
+    Args:
+        usage_dir: Directory with ``<chat_id>.jsonl`` usage segments
+        output: Corpus file to write (JSON lines)
+        salt: Key for identifier hashing; random per corpus when omitted, so
+            hashes cannot be correlated across corpora
+
+    Returns:
+        Counts of written and skipped records
+    """
+    salt = salt or secrets.token_bytes(16)
+    items: List[ReplayItem] = []
+    skipped = 0
+    for record in iter_usage_records(usage_dir):
+        item = record_to_item(record, salt)
+        if item is None:
+            skipped += 1
+            continue
+        items.append(item)
+
+    # Records without a timestamp keep their file order at the front
+    items.sort(key=lambda item: item.timestamp or 0.0)
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(
+                json.dumps(
+                    {
+                        "timestamp": item.timestamp,
+                        "function_name": item.function_name,
+                        "language": item.language,
+                        "body": item.body,
+                    },
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+    return {"written": len(items), "skipped": skipped}
+
+
+def load_corpus(path: str, function_names: Optional[Sequence[str]] = None) -> List[ReplayItem]:
+    items: List[ReplayItem] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if function_names and data["function_name"] not in function_names:
+                continue
+            items.append(
+                ReplayItem(
+                    function_name=data["function_name"],
+                    language=data.get("language") or "ru",
+                    body=data["body"],
+                    timestamp=data.get("timestamp"),
+                )
+            )
+    return items
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+
+def is_open_loop(
+    items: Sequence[ReplayItem], rate: Optional[float], preserve_timing: bool
+) -> bool:
+    """True when requests are sent on a schedule (recorded timing or ``rate``)"""
+    if preserve_timing and items and all(item.timestamp for item in items):
+        return True
+    return bool(rate)
+
+
+def schedule_offsets(
+    items: Sequence[ReplayItem],
+    rate: Optional[float],
+    preserve_timing: bool,
+    speedup: float,
+) -> List[float]:
+    """
+    Seconds after start at which each item is sent
+
+    ``preserve_timing`` replays recorded inter-arrival times (divided by
+    ``speedup``); otherwise ``rate`` spaces requests evenly, and without a
+    rate everything is released at once and only ``concurrency`` limits load.
+    """
+    if preserve_timing and items and all(item.timestamp for item in items):
+        first = items[0].timestamp or 0.0
+        return [max(((item.timestamp or first) - first) / speedup, 0.0) for item in items]
+    if rate:
+        return [i / rate for i in range(len(items))]
+    return [0.0] * len(items)
+
+
+async def replay(
+    items: Sequence[ReplayItem],
+    base_url: Optional[str] = None,
+    concurrency: int = 8,
+    rate: Optional[float] = None,
+    preserve_timing: bool = False,
+    speedup: float = 1.0,
+    timeout: float = 30.0,
+    app: Any = None,
+) -> Dict[str, Any]:
+    """
+    Replay items and collect per-function statistics
+
+    Args:
+        items: Corpus items in send order
+        base_url: Target server; when None the app is called in-process
+        concurrency: Maximum requests in flight
+        rate: Target requests per second (ignored with preserve_timing)
+        preserve_timing: Keep recorded inter-arrival times
+        speedup: Divide recorded gaps by this factor
+        timeout: Per-request timeout in seconds
+        app: ASGI app called in-process when there is no base_url
+            (default: src.server.app)
+    """
+    import httpx
+
+    if base_url:
+        client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+    else:
+        if app is None:
+            from src.server import app
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://replay", timeout=timeout
+        )
+
+    stats: Dict[str, FunctionStats] = defaultdict(FunctionStats)
+    semaphore = asyncio.Semaphore(concurrency)
+    offsets = schedule_offsets(items, rate, preserve_timing, speedup)
+    open_loop = is_open_loop(items, rate, preserve_timing)
+    # Bodies are serialized up front so encoding cost is not part of latency
+    payloads = [json.dumps(item.body, ensure_ascii=False).encode("utf-8") for item in items]
+
+    async def send(item: ReplayItem, payload: bytes, scheduled: float) -> None:
+        entry = stats[item.function_name]
+        headers = {"content-type": "application/json", "language": item.language}
+        async with semaphore:
+            # Open loop: measured from the scheduled send time, not from acquiring
+            # the semaphore, since time queued behind slow requests is part of the
+            # latency a client would see (avoids coordinated omission). Closed loop
+            # releases everything at start, so only the request itself is timed.
+            sent = scheduled if open_loop else time.perf_counter()
+            try:
+                response = await client.post(BUILD_UI_PATH, content=payload, headers=headers)
+            except httpx.HTTPError:
+                entry.errors += 1
+                return
+            elapsed_ms = (time.perf_counter() - sent) * 1000
+        entry.status_codes[response.status_code] += 1
+        if response.status_code >= 400:
+            entry.errors += 1
+        else:
+            entry.latencies_ms.append(elapsed_ms)
+
+    tasks: List[asyncio.Task] = []
+    started = time.perf_counter()
+    async with client:
+        for item, payload, offset in zip(items, payloads, offsets):
+            delay = offset - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(item, payload, started + offset)))
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    return build_report(stats, elapsed)
+
+
+def build_report(stats: Dict[str, FunctionStats], elapsed_s: float) -> Dict[str, Any]:
+    elapsed_s = max(elapsed_s, 1e-9)
+    functions: Dict[str, Any] = {}
+    all_latencies: List[float] = []
+    total = errors = 0
+    for name in sorted(stats):
+        entry = stats[name]
+        all_latencies.extend(entry.latencies_ms)
+        total += entry.count
+        errors += entry.errors
+        functions[name] = {
+            "requests": entry.count,
+            "errors": entry.errors,
+            "error_rate": entry.errors / entry.count if entry.count else 0.0,
+            "throughput_rps": entry.count / elapsed_s,
+            "status_codes": dict(entry.status_codes),
+            "latency_ms": summarize_latencies(entry.latencies_ms),
+        }
+    return {
+        "elapsed_s": elapsed_s,
+        "total": {
+            "requests": total,
+            "errors": errors,
+            "error_rate": errors / total if total else 0.0,
+            "throughput_rps": total / elapsed_s,
+            "latency_ms": summarize_latencies(all_latencies),
+        },
+        "functions": functions,
+    }
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    header = f"{'function':42} {'reqs':>6} {'err%':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    rows: Iterable = list(report["functions"].items()) + [("TOTAL", report["total"])]
+    for name, row in rows:
+        lat = row["latency_ms"]
+        print(
+            f"{name:42} {row['requests']:6d} {row['error_rate'] * 100:6.2f} "
+            f"{row['throughput_rps']:8.1f} {lat.get('p50', 0.0):9.2f} "
+            f"{lat.get('p95', 0.0):9.2f} {lat.get('p99', 0.0):9.2f}"
+        )
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay captured /chat/v3/build_ui traffic")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    corpus = sub.add_parser("corpus", help="Build an anonymized corpus from usage logs")
+    corpus.add_argument("--usage-dir", default=DEFAULT_USAGE_DIR)
+    corpus.add_argument("--output", default=DEFAULT_CORPUS)
+    corpus.add_argument(
+        "--salt",
+        default=os.getenv("REPLAY_ANONYMIZE_SALT"),
+        help="Hash key for api_key/chat_id (random when unset)",
+    )
+
+    run = sub.add_parser("run", help="Replay a corpus")
+    run.add_argument("--corpus", default=DEFAULT_CORPUS)
+    run.add_argument("--base-url", help="Target server (default: in-process app)")
+    run.add_argument("--functions", help="Comma-separated function names to replay")
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--rate", type=float, help="Requests per second")
+    run.add_argument("--preserve-timing", action="store_true")
+    run.add_argument("--speedup", type=float, default=1.0)
+    run.add_argument("--repeat", type=int, default=1, help="Replay the corpus N times")
+    run.add_argument("--limit", type=int, help="Replay at most N requests")
+    run.add_argument("--timeout", type=float, default=30.0)
+    run.add_argument("--output", help="Report file (default: logs/replay/report-<ts>.json)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "corpus":
+        salt = args.salt.encode("utf-8") if args.salt else None
+        counts = build_corpus(args.usage_dir, args.output, salt=salt)
+        print(f"Wrote {counts['written']} requests to {args.output} ({counts['skipped']} skipped)")
+        return 0
+
+    functions = [f.strip() for f in args.functions.split(",")] if args.functions else None
+    items = load_corpus(args.corpus, functions) * max(args.repeat, 1)
+    if args.limit:
+        items = items[: args.limit]
+    if not items:
+        print(f"No requests to replay in {args.corpus}", file=sys.stderr)
+        return 1
+
+    report = asyncio.run(
+        replay(
+            items,
+            base_url=args.base_url,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            preserve_timing=args.preserve_timing and args.repeat == 1,
+            speedup=args.speedup,
+            timeout=args.timeout,
+        )
+    )
+    report["meta"] = {
+        "corpus": args.corpus,
+        "base_url": args.base_url or "in-process",
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "preserve_timing": args.preserve_timing,
+        "speedup": args.speedup,
+    }
+
+    output = args.output or os.path.join(
+        DEFAULT_REPORT_DIR, f"report-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    _print_report(report)
+    print(f"\nReport written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Small statistics helpers shared by the benchmark and load-test tools
+"""
+
+import math
+import statistics
+from typing import Dict, Iterable, List
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    """
+    Linear-interpolated percentile of an already sorted sample list
+
+    Args:
+        sorted_samples: Samples sorted in ascending order
+        pct: Percentile in the 0-100 range
+    """
+    if not sorted_samples:
+        return 0.0
+    if len(sorted_samples) == 1:
+        return sorted_samples[0]
+    rank = (len(sorted_samples) - 1) * pct / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return sorted_samples[low]
+    weight = rank - low
+    return sorted_samples[low] * (1 - weight) + sorted_samples[high] * weight
+
+
+def summarize_latencies(samples_ms: Iterable[float]) -> Dict[str, float]:
+    """
+    Summarize latency samples (milliseconds) into a distribution
+
+    Returns:
+        Dict with count, mean, stdev, min, p50, p90, p95, p99 and max
+    """
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "stdev": statistics.pstdev(ordered) if len(ordered) > 1 else 0.0,
+        "min": ordered[0],
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1],
+    }
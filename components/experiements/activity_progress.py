@@ -1,5 +1,7 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
+import hashlib
 import json
+from urllib.parse import quote
 
 import pydivkit as dk
 from pydivkit.core import Expr
@@ -31,7 +33,23 @@ DivWrapContentSize = dk.DivWrapContentSize
 TOTAL_STEPS = 8
 POLL_INTERVAL_MS = 2000  # poll every 2 seconds
 POLL_DURATION_MS = 120_000  # keep polling for up to 2 minutes
-MESSAGES_ENDPOINT = "http://10.212.134.3:8003/new_messages"
+# Long-poll: the server holds each poll until a new step arrives, so a step
+# shows up as soon as it is produced instead of on the next tick.
+POLL_TIMEOUT_S = 1.5
+BASE_URL = "http://10.212.134.3:8003"
+MESSAGES_ENDPOINT = BASE_URL + "/new_messages"
+MESSAGES_POLL_QUERY = (
+    "?session_id=@{session_id_query}&since_step=@{current_step}"
+    + f"&timeout={POLL_TIMEOUT_S}"
+)
+
+# Placeholders for the precompiled card; chosen so they never occur in
+# DivKit JSON and need no escaping themselves.
+_BASE_URL_SLOT = "__AGENT_CARD_BASE_URL__"
+_SESSION_ID_SLOT = "__AGENT_CARD_SESSION_ID__"
+_SESSION_QUERY_SLOT = "__AGENT_CARD_SESSION_QUERY__"
+_STEP_NUMBER_SLOT = "__AGENT_STEP_NUMBER__"
+_STEP_TEXT_SLOT = "__AGENT_STEP_TEXT__"
 
 
 def _make_action(log_id: str, url: str) -> DivAction:
@@ -41,8 +59,11 @@ def _make_action(log_id: str, url: str) -> DivAction:
 # ---------------------------------------------------------------------------
 # Variables  (8 steps)
 # ---------------------------------------------------------------------------
-def _build_variables() -> List[dk.DivVariable]:
+def _build_variables(session_id: str, session_query: str) -> List[dk.DivVariable]:
     variables: List[dk.DivVariable] = [
+        StringVariable(name="session_id", value=session_id),
+        # URL-encoded for the poll URL: ids may contain &, # or spaces
+        StringVariable(name="session_id_query", value=session_query),
         BooleanVariable(name="is_running", value=False),
         IntegerVariable(name="current_step", value=0),
         StringVariable(name="status_text", value="Idle"),
@@ -62,7 +83,7 @@ def _build_variables() -> List[dk.DivVariable]:
 # ---------------------------------------------------------------------------
 # Timers – single polling timer that fetches from the backend
 # ---------------------------------------------------------------------------
-def _build_timers() -> List[DivTimer]:
+def _build_timers(base_url: str) -> List[DivTimer]:
     """Return a polling timer that hits the backend for new messages."""
     return [
         DivTimer(
@@ -72,7 +93,7 @@ def _build_timers() -> List[DivTimer]:
             tick_actions=[
                 _make_action(
                     "poll_messages",
-                    MESSAGES_ENDPOINT,
+                    base_url + "/new_messages" + MESSAGES_POLL_QUERY,
                 ),
             ],
         ),
@@ -189,6 +210,10 @@ def _make_buttons() -> DivContainer:
             "reset_status",
             "div-action://set_variable?name=status_text&value=Idle",
         ),
+        _make_action(
+            "reset_current_step",
+            "div-action://set_variable?name=current_step&value=0",
+        ),
     ]
     for i in range(1, TOTAL_STEPS + 1):
         reset_actions.append(
@@ -419,8 +444,14 @@ def _make_agent_output_section() -> DivContainer:
 # ---------------------------------------------------------------------------
 # Card builder
 # ---------------------------------------------------------------------------
-def build_agent_progress_card() -> Dict[str, Any]:
+def build_agent_progress_card(
+    session_id: str = "default",
+    base_url: str = BASE_URL,
+    session_query: str | None = None,
+) -> Dict[str, Any]:
     """Build DivKit card with 8-step agent progress that polls the backend."""
+    if session_query is None:
+        session_query = quote(session_id, safe="")
     root = DivContainer(
         orientation=DivContainerOrientation.VERTICAL,
         width=DivMatchParentSize(),
@@ -438,14 +469,16 @@ def build_agent_progress_card() -> Dict[str, Any]:
     card: Dict[str, Any] = {
         "card": {
             "log_id": "agent_progress",
-            "variables": [v.dict() for v in _build_variables()],
+            "variables": [
+                v.dict() for v in _build_variables(session_id, session_query)
+            ],
             "states": [
                 {
                     "state_id": 0,
                     "div": root.dict(),
                 },
             ],
-            "timers": [timer.dict() for timer in _build_timers()],
+            "timers": [timer.dict() for timer in _build_timers(base_url)],
         }
     }
 
@@ -459,11 +492,72 @@ def build_agent_progress_card() -> Dict[str, Any]:
 
 
 # ---------------------------------------------------------------------------
-# Helper: build a step-row dict (used by the /new_messages endpoint to
-# create DivKit patches without importing pydivkit on every request).
+# Precompiled templates
+#
+# The card only varies in the server base URL and the session id, so it is
+# built once with placeholders, serialized, and split around them. Rendering
+# is then a join of byte chunks with the JSON-escaped values.
 # ---------------------------------------------------------------------------
-def make_step_row_dict(step_number: int, text: str) -> Dict[str, Any]:
-    """Return a raw DivKit JSON dict for a single visible step row."""
+class CompiledTemplate:
+    def __init__(self, document: Any, slots: Tuple[str, ...]):
+        raw = json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+        self.slots = slots
+        # Alternating literal chunks and slot names, in document order
+        self.parts: List[Any] = []
+        rest = raw
+        while True:
+            positions = [(rest.find(slot), slot) for slot in slots if slot in rest]
+            if not positions:
+                self.parts.append(rest.encode("utf-8"))
+                break
+            index, slot = min(positions)
+            self.parts.append(rest[:index].encode("utf-8"))
+            self.parts.append(slot)
+            rest = rest[index + len(slot):]
+        self.digest = hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+    def render(self, **values: str) -> bytes:
+        """Fill the slots; values land inside JSON strings, so they are escaped."""
+        encoded = {
+            slot: json.dumps(str(values[slot]), ensure_ascii=False)[1:-1].encode("utf-8")
+            for slot in self.slots
+        }
+        return b"".join(
+            encoded[part] if isinstance(part, str) else part for part in self.parts
+        )
+
+
+_compiled_card: CompiledTemplate | None = None
+_compiled_step_rows: Dict[bool, CompiledTemplate] = {}
+
+
+def compile_agent_progress_card() -> CompiledTemplate:
+    """Build the card once (at server startup) and keep its serialized template."""
+    global _compiled_card
+    if _compiled_card is None:
+        _compiled_card = CompiledTemplate(
+            build_agent_progress_card(_SESSION_ID_SLOT, _BASE_URL_SLOT, _SESSION_QUERY_SLOT),
+            (_BASE_URL_SLOT, _SESSION_ID_SLOT, _SESSION_QUERY_SLOT),
+        )
+    return _compiled_card
+
+
+def render_agent_progress_card(session_id: str = "default", base_url: str = BASE_URL) -> bytes:
+    """Serialized card for one session, equal to json.dumps(build_agent_progress_card(...))."""
+    return compile_agent_progress_card().render(
+        **{
+            _BASE_URL_SLOT: base_url.rstrip("/"),
+            _SESSION_ID_SLOT: session_id,
+            _SESSION_QUERY_SLOT: quote(session_id, safe=""),
+        }
+    )
+
+
+# ---------------------------------------------------------------------------
+# Helper: step-row template (used by the /new_messages endpoint to create
+# DivKit patches without importing pydivkit on every request).
+# ---------------------------------------------------------------------------
+def _step_row_document(step_number: Any, text: str, is_last: bool) -> Dict[str, Any]:
     return {
         "type": "container",
         "orientation": "horizontal",
@@ -474,7 +568,7 @@ def make_step_row_dict(step_number: int, text: str) -> Dict[str, Any]:
             "stroke": {"color": "#334155", "width": 1.0},
         },
         "paddings": {"left": 12, "right": 12, "top": 10, "bottom": 10},
-        "margins": {"bottom": 8} if step_number < TOTAL_STEPS else None,
+        "margins": None if is_last else {"bottom": 8},
         "visibility": "visible",
         "items": [
             {
@@ -489,7 +583,7 @@ def make_step_row_dict(step_number: int, text: str) -> Dict[str, Any]:
                 "items": [
                     {
                         "type": "text",
-                        "text": str(step_number),
+                        "text": step_number,
                         "font_size": 12,
                         "text_color": "#CBD5E1",
                     }
@@ -507,6 +601,28 @@ def make_step_row_dict(step_number: int, text: str) -> Dict[str, Any]:
     }
 
 
+def _step_row_template(is_last: bool) -> CompiledTemplate:
+    template = _compiled_step_rows.get(is_last)
+    if template is None:
+        template = _compiled_step_rows[is_last] = CompiledTemplate(
+            _step_row_document(_STEP_NUMBER_SLOT, _STEP_TEXT_SLOT, is_last),
+            (_STEP_NUMBER_SLOT, _STEP_TEXT_SLOT),
+        )
+    return template
+
+
+def make_step_row_json(step_number: int, text: str) -> bytes:
+    """Serialized DivKit JSON for a single visible step row."""
+    return _step_row_template(step_number >= TOTAL_STEPS).render(
+        **{_STEP_NUMBER_SLOT: str(step_number), _STEP_TEXT_SLOT: text}
+    )
+
+
+def make_step_row_dict(step_number: int, text: str) -> Dict[str, Any]:
+    """Return a raw DivKit JSON dict for a single visible step row."""
+    return json.loads(make_step_row_json(step_number, text))
+
+
 def save_agent_progress(path: str = "agent_progress.json") -> None:
     """Save the built card to JSON file."""
     card = build_agent_progress_card()
@@ -10,6 +10,7 @@ import re
 from typing import Dict, Tuple, Optional
 from functools import wraps
 from conf import logger
+from utils.security import RateLimiter
 
 
 # Janis Rubins step 2: Security and Performance Constants
@@ -95,51 +96,22 @@ def security_logger(func):
 
 
 # Janis Rubins step 7: Security Manager for rate limiting
+# Delegates to the shared GCRA limiter: O(1) state per identifier instead of
+# a list of timestamps rebuilt on every check.
 class SecurityManager:
     def __init__(self):
-        self.request_counts = {}
-        self.last_cleanup = time.time()
+        self.limiter = RateLimiter(MAX_REQUESTS, RATE_LIMIT_WINDOW, enabled=True)
         logger.debug("SecurityManager initialized")
 
     def cleanup_old_requests(self):
-        current_time = time.time()
-        if current_time - self.last_cleanup > RATE_LIMIT_WINDOW:
-            old_count = sum(len(v) for v in self.request_counts.values())
-            # Cleanup requests older than window
-            for identifier in list(self.request_counts.keys()):
-                self.request_counts[identifier] = [
-                    t
-                    for t in self.request_counts[identifier]
-                    if t > current_time - RATE_LIMIT_WINDOW
-                ]
-                if not self.request_counts[identifier]:
-                    del self.request_counts[identifier]
-            new_count = sum(len(v) for v in self.request_counts.values())
-            logger.debug(f"Cleaned up old requests. {old_count - new_count} removed.")
-            self.last_cleanup = current_time
+        removed = self.limiter.evict_idle()
+        logger.debug(f"Cleaned up idle rate limit keys. {removed} removed.")
 
     def check_rate_limit(self, identifier: str) -> bool:
-        self.cleanup_old_requests()
-        current_time = time.time()
-        window_start = current_time - RATE_LIMIT_WINDOW
-
-        request_count = 0
-        if identifier in self.request_counts:
-            request_count = sum(
-                1 for t in self.request_counts[identifier] if t > window_start
-            )
-
-        if request_count >= MAX_REQUESTS:
+        allowed, retry_after = self.limiter.acquire(identifier)
+        if not allowed:
             logger.warning(f"Rate limit exceeded for {identifier}")
-            return False
-
-        if identifier not in self.request_counts:
-            self.request_counts[identifier] = []
-        self.request_counts[identifier].append(current_time)
-        logger.debug(
-            f"Request count for {identifier}: {request_count + 1}/{MAX_REQUESTS}"
-        )
-        return True
+        return allowed
 
 
 security_manager = SecurityManager()
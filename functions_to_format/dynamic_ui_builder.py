@@ -3,7 +3,10 @@ import sys
 import logging
 from typing import Any, Dict, List, Optional, Union
 import json
+from opentelemetry import metrics
 from conf import logger
+from utils.cache import NoOpCache, build_cache, estimate_size
+from utils.fingerprint import fingerprint
 
 """
 Why this code is needed:
@@ -17,6 +20,9 @@ Key Environment Variables:
 - UI_BUILDER_OUTPUT_FORMAT (default: "json"): The final UI output format (e.g., "json", "dict", "html" - you can extend as needed).
 - UI_BUILDER_WIDGET_MAPPING (default: ""): A JSON string or comma-separated keys that define how data fields map to widget names.
 - UI_BUILDER_ENABLE_CACHING (default: "false"): If "true", enable caching of widget layouts to save CPU and RAM.
+- UI_BUILDER_CACHE_BACKEND (default: "sharded"), UI_BUILDER_CACHE_MAX_BYTES, UI_BUILDER_CACHE_MAXSIZE,
+  UI_BUILDER_CACHE_EXPIRY: bounds of the layout cache (see utils/cache.py).
+- UI_BUILDER_CACHE_MAX_INPUT_BYTES (default: 262144): Larger inputs skip the cache entirely.
 - UI_BUILDER_DEFAULT_WIDGET (default: "text_widget"): Which widget to use if no mapping found.
 - UI_BUILDER_RESOURCE_SAVING_MODE (default: "true"): If "true", tries to minimize overhead, skip unnecessary steps.
 
@@ -42,6 +48,15 @@ UI_BUILDER_DEFAULT_WIDGET = os.environ.get("UI_BUILDER_DEFAULT_WIDGET", "text_wi
 UI_BUILDER_RESOURCE_SAVING_MODE = (
     os.environ.get("UI_BUILDER_RESOURCE_SAVING_MODE", "true").lower() == "true"
 )
+UI_BUILDER_CACHE_BACKEND = os.environ.get("UI_BUILDER_CACHE_BACKEND", "sharded")
+UI_BUILDER_CACHE_MAX_BYTES = int(
+    os.environ.get("UI_BUILDER_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+)
+UI_BUILDER_CACHE_MAXSIZE = int(os.environ.get("UI_BUILDER_CACHE_MAXSIZE", 1000))
+UI_BUILDER_CACHE_EXPIRY = int(os.environ.get("UI_BUILDER_CACHE_EXPIRY", 600))
+UI_BUILDER_CACHE_MAX_INPUT_BYTES = int(
+    os.environ.get("UI_BUILDER_CACHE_MAX_INPUT_BYTES", 256 * 1024)
+)
 widgets = {}
 
 
@@ -61,15 +76,38 @@ if UI_BUILDER_WIDGET_MAPPING.strip():
         mapping = {}
 
 # Janis Rubins step 5: Caching mechanism (if enabled)
-# We could keep a cache of final UI structures keyed by a hash of input data.
-ui_cache = {}
+# Final UI structures are kept in the shared bounded cache (byte budget, TTL,
+# eviction metrics) under a short digest of the input data.
+if UI_BUILDER_ENABLE_CACHING:
+    ui_cache = build_cache(
+        UI_BUILDER_CACHE_BACKEND,
+        UI_BUILDER_CACHE_MAXSIZE,
+        UI_BUILDER_CACHE_EXPIRY,
+        max_bytes=UI_BUILDER_CACHE_MAX_BYTES,
+        name="dynamic_ui",
+    )
+else:
+    ui_cache = NoOpCache()
+
+cache_lookups = metrics.get_meter(__name__).create_counter(
+    name="ui_server.dynamic_ui.cache_lookups",
+    description="DynamicUIBuilder cache lookups by result (hit, miss, bypass)",
+    unit="1",
+)
 
 
-def cache_key_for_data(data: Dict[str, Any]) -> str:
-    # Minimal overhead hash: convert to JSON string and hash it
-    # For speed, just use the JSON string as key if stable sorting done by json.dumps with sort_keys=True
-    data_str = json.dumps(data, sort_keys=True)
-    return data_str  # In production, might use a real hash like hashlib.sha256(data_str.encode()).hexdigest() for shorter keys.
+def cache_key_for_data(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Digest of the input data, or None when it should not be cached: inputs
+    above UI_BUILDER_CACHE_MAX_INPUT_BYTES (sizing stops at the cap, so this
+    check stays cheap) and values that cannot be fingerprinted.
+    """
+    if estimate_size(data, UI_BUILDER_CACHE_MAX_INPUT_BYTES) > UI_BUILDER_CACHE_MAX_INPUT_BYTES:
+        return None
+    try:
+        return "dynamic_ui:" + fingerprint(data)
+    except TypeError:
+        return None
 
 
 class DynamicUIBuilder:
@@ -96,13 +134,19 @@ class DynamicUIBuilder:
         logger.debug("DynamicUIBuilder: Starting UI construction from adapted data.")
 
         # Janis Rubins step 9: Check cache if enabled
+        ck = None
         if UI_BUILDER_ENABLE_CACHING:
             ck = cache_key_for_data(data)
-            if ck in ui_cache:
-                logger.debug(
-                    "DynamicUIBuilder: Returning UI from cache to save resources."
-                )
-                return ui_cache[ck]
+            if ck is None:
+                cache_lookups.add(1, {"result": "bypass"})
+            else:
+                cached = ui_cache.get(ck)
+                cache_lookups.add(1, {"result": "hit" if cached is not None else "miss"})
+                if cached is not None:
+                    logger.debug(
+                        "DynamicUIBuilder: Returning UI from cache to save resources."
+                    )
+                    return cached
 
         # Janis Rubins step 10: Construct UI structure.
         # We'll create a UI that is a list of widgets or a structure determined by data keys.
@@ -116,8 +160,8 @@ class DynamicUIBuilder:
         final_output = self._format_output(ui_structure)
 
         # Janis Rubins step 12: Store in cache if enabled
-        if UI_BUILDER_ENABLE_CACHING:
-            ui_cache[ck] = final_output
+        if ck is not None:
+            ui_cache.set(ck, final_output)
 
         logger.debug("DynamicUIBuilder: UI construction completed.")
         return final_output
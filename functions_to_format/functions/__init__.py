@@ -1,9 +1,10 @@
 from .functions import functions_mapper, sdui_functions_map
-from .base_strategy import FunctionStrategy
+from .base_strategy import FunctionStrategy, build_text_only
 
 
 __all__ = [
     "functions_mapper",
     "sdui_functions_map",
     "FunctionStrategy",
+    "build_text_only",
 ]
@@ -97,6 +97,8 @@ def _try_build_embedded_ui(
         language=parent_context.language,
         api_key=parent_context.api_key,
         logger_context=parent_context.logger_context,
+        # function_name stays empty: embedded renders are not requests of their
+        # own and replay tooling skips usage records without one.
     )
 
     try:
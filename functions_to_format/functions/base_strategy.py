@@ -8,6 +8,13 @@ Each function handler is a concrete strategy that only needs to implement
 build_widget_inputs() to describe what widgets should be built.
 The base class handles the rest: calling add_ui_to_widget, creating
 BuildOutput, and calling save_builder_output.
+
+Handlers with ``text_fallback = True`` degrade to a text-only answer when
+their widgets cannot be built (utils.negative_cache; payloads that failed
+validation go straight to the fallback on retry). The flag is opt-in because
+it changes the error contract: today HumanApprovalRequests and
+PayForHomeUtility set it, every other handler still raises. Admission control
+does not depend on it: under load build_text_only() serves every function.
 """
 
 from abc import ABC, abstractmethod
@@ -15,6 +22,7 @@ from typing import Callable, Dict, List, Optional
 
 from models.build import BuildOutput
 from models.context import Context
+from utils.negative_cache import negative_cache
 
 from .general import WidgetInput, TextWidget, add_ui_to_widget
 from .general.text import build_text_widget
@@ -31,8 +39,13 @@ class FunctionStrategy(ABC):
 
     Instances are callable, so they can be used directly in
     functions_mapper as drop-in replacements for plain handler functions.
+
+    Set ``text_fallback = True`` to answer with the LLM text alone when
+    widget building fails instead of propagating the error.
     """
 
+    text_fallback: bool = False
+
     @abstractmethod
     def build_widget_inputs(
         self, context: Context
@@ -46,8 +59,18 @@ class FunctionStrategy(ABC):
         Override this method only when the handler needs non-standard
         post-processing (e.g. embedding extra widgets from sub-handlers).
         """
-        widget_inputs = self.build_widget_inputs(context)
-        return self._build_and_save(context, widget_inputs)
+        if not self.text_fallback:
+            widget_inputs = self.build_widget_inputs(context)
+            return self._build_and_save(context, widget_inputs)
+
+        return negative_cache.run(
+            type(self).__name__,
+            context.backend_output,
+            lambda: self.build_widget_inputs(context),
+            lambda widget_inputs: self._build_and_save(context, widget_inputs),
+            lambda: self._build_text_only(context),
+            context.logger_context.logger,
+        )
 
     def __call__(self, context: Context) -> BuildOutput:
         """Allow strategy instances to be called like plain functions."""
@@ -81,6 +104,9 @@ class FunctionStrategy(ABC):
         save_builder_output(context, output)
         return output
 
+    def _build_text_only(self, context: Context) -> BuildOutput:
+        return build_text_only(context)
+
     @staticmethod
     def make_text_input(llm_output: str, order: int = 1):
         """Convenience: create a (builder, WidgetInput) pair for a text widget."""
@@ -91,3 +117,13 @@ class FunctionStrategy(ABC):
                 args={"text": llm_output},
             ),
         )
+
+
+def build_text_only(context: Context) -> BuildOutput:
+    """Text-only answer from the LLM output, for any function.
+
+    The cheapest BuildOutput there is: used by the text fallback and by
+    admission control when the server sheds load.
+    """
+    text_builder, text_input = FunctionStrategy.make_text_input(context.llm_output)
+    return FunctionStrategy._build_and_save(context, {text_builder: text_input})
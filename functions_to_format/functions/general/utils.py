@@ -1,6 +1,7 @@
 import json
 import os
 import asyncio
+import time
 from pymongo.asynchronous.collection import AsyncCollection
 from models.build import BuildOutput
 from models.context import Context
@@ -18,6 +19,7 @@ def save_builder_output(context: Context, output: BuildOutput):
             f.write(
                 json.dumps(
                     {
+                        "timestamp": time.time(),
                         "context": context.to_json(),
                         "output": output.model_dump(),
                     }
@@ -767,6 +767,8 @@ def human_approval_ui(
 class HumanApprovalRequests(FunctionStrategy):
     """Strategy for building human approval UI with fallback."""
 
+    text_fallback = True
+
     def build_widget_inputs(self, context: Context):
         """Build the happy-path widget inputs (approval widget)."""
         logger.info(
@@ -800,14 +802,7 @@ class HumanApprovalRequests(FunctionStrategy):
             "Starting human approval requests processing",
             chat_id=context.logger_context.chat_id,
         )
-        try:
-            return super().execute(context)
-        except Exception as e:
-            logger.error(
-                "Error creating widgets, falling back to text widget only", error=str(e)
-            )
-            text_builder, text_input = self.make_text_input(context.llm_output)
-            return self._build_and_save(context, {text_builder: text_input})
+        return super().execute(context)
 
 
 human_approval_requests = HumanApprovalRequests()
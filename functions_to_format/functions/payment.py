@@ -388,6 +388,8 @@ def build_pay_for_home_utility_ui(
 class PayForHomeUtility(FunctionStrategy):
     """Strategy for home utility payment UI with fallback."""
 
+    text_fallback = True
+
     def build_widget_inputs(self, context):
         backend_data = PaymentManagerPaymentResponse.model_validate(
             context.backend_output
@@ -408,13 +410,6 @@ class PayForHomeUtility(FunctionStrategy):
             ),
         }
 
-    def execute(self, context):
-        try:
-            return super().execute(context)
-        except Exception:
-            text_builder, text_input = self.make_text_input(context.llm_output)
-            return self._build_and_save(context, {text_builder: text_input})
-
 
 pay_for_home_utility = PayForHomeUtility()
 
@@ -25,6 +25,7 @@ class Context:
     api_key: str
     logger_context: LoggerContext
     request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    function_name: str = ""
 
     def to_json(self):
         return {
@@ -35,4 +36,5 @@ class Context:
             "language": self.language.value,
             "api_key": self.api_key,
             "request_id": self.request_id,
+            "function_name": self.function_name,
         }
@@ -6,25 +6,66 @@ from conf import logger
 import os
 import time
 import asyncio
-from datetime import datetime
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from typing import Optional, Any, Dict, List, Callable, Set, Union
 from urllib.parse import quote
-from fastapi import FastAPI, Request, Response
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Header, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from functions_to_format.functions.general.const_values import LanguageOptions
 from functions_to_format.functions.general.utils import (
     upload_usages_async,
+    save_builder_output,
 )
 from models.build import BuildOutput, ErrorResponse
-from functions_to_format.functions import functions_mapper
+from functions_to_format.functions import build_text_only, functions_mapper
 import sentry_sdk
 from models.context import Context, LoggerContext
+from utils.slow_requests import slow_request_recorder
+from utils.render_cache import render_cache
+from utils.cache import global_cache, register_admin_endpoint
+from utils.coalesce import request_coalescer
+from utils.security import (
+    BodyLimitMiddleware,
+    InputRejected,
+    RateLimitMiddleware,
+    body_limits_checked,
+    global_rate_limiter,
+    guard_raw_input,
+)
+from utils.warmup import WARMUP_ENABLED, run_startup_warmup, warmup_state
+from utils.agent_sessions import DEFAULT_SESSION_ID, agent_sessions
+from utils.session_store import session_store
+from utils.users import api_key_store
+from utils.admission import (
+    ADMISSION_RETRY_AFTER_S,
+    ADMIT,
+    DEGRADE,
+    REJECT,
+    AdmissionMiddleware,
+    admission_controller,
+)
+from components.experiements.activity_progress import (
+    compile_agent_progress_card,
+    render_agent_progress_card,
+)
+from utils.agent_events import (
+    AGENT_EVENTS_RETRY_MS,
+    TooManySubscribers,
+    agent_event_broker,
+    format_sse,
+    iter_session_events,
+)
 from telemetry import (
     setup_telemetry,
     TelemetryMiddleware,
     MetricsCollector,
+    EventLoopMonitor,
+    LOOP_MONITOR_ENABLED,
+    get_meter,
     get_tracer,
     get_prometheus_metrics,
 )
@@ -44,11 +85,58 @@ finally:
         version = "0"
 logger.info("Starting server", env=os.getenv("ENVIRONMENT"), version=version)
 
+DEFAULT_EXECUTOR_WORKERS = int(
+    os.getenv("DEFAULT_EXECUTOR_WORKERS", min(32, (os.cpu_count() or 1) + 4))
+)
+loop_monitor: Optional[EventLoopMonitor] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global loop_monitor
+    # Explicit default executor so run_in_executor/to_thread saturation is visible
+    executor = ThreadPoolExecutor(
+        max_workers=DEFAULT_EXECUTOR_WORKERS, thread_name_prefix="ui-server"
+    )
+    asyncio.get_running_loop().set_default_executor(executor)
+    if LOOP_MONITOR_ENABLED:
+        if loop_monitor is None:
+            loop_monitor = EventLoopMonitor(meter=get_meter())
+        loop_monitor.register_executor("default", executor)
+        # Admission control reads loop lag from the monitor's samples
+        loop_monitor.add_lag_listener(admission_controller.observe_loop_lag)
+        await loop_monitor.start()
+    await render_cache.reaper.start()
+    # The progress card is static apart from base URL and session id
+    await asyncio.to_thread(compile_agent_progress_card)
+    # Delivers step notifications published by other workers
+    await session_store.start()
+    # kill -HUP reloads API keys without a restart (they also reload on file change)
+    api_key_store.install_sighup_handler(asyncio.get_running_loop())
+    warmup_task = None
+    if WARMUP_ENABLED:
+        # /health answers 503 until this finishes or its time box runs out
+        warmup_task = asyncio.create_task(
+            run_startup_warmup(warm_render_cache, render_cache.is_cacheable)
+        )
+    try:
+        yield
+    finally:
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        await render_cache.reaper.stop()
+        await session_store.stop()
+        if loop_monitor is not None:
+            await loop_monitor.stop()
+        executor.shutdown(wait=False)
+
+
 app = FastAPI(
     title="UI Server",
     description="UI Server to generate UI json representations using Yandex Divkit",
     version=version,
     openapi_url="/ui_server/openapi.json",
+    lifespan=lifespan,
 )
 
 # Setup telemetry
@@ -69,6 +157,19 @@ app.add_middleware(
 # Add telemetry middleware with metrics collector
 app.add_middleware(TelemetryMiddleware, metrics_collector=metrics_collector)
 
+# Bounds request bodies (BODY_LIMIT_DEFAULT = MAX_INPUT_SIZE, MAX_JSON_DEPTH)
+# before FastAPI reads and parses them
+app.add_middleware(BodyLimitMiddleware)
+
+# Runs before body limits and routing: rejected requests cost no routing or parsing
+# (no-op unless RATE_LIMIT_ENABLED=true)
+app.add_middleware(RateLimitMiddleware, limiter=global_rate_limiter)
+
+# Outermost: stamps arrival time and counts in-flight build_ui requests for
+# admission control (queue wait lasts until format_data_v3 is entered, minus
+# the body upload)
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 
 # delete all json files in functions_to_format/functions/
 for file in os.listdir("."):
@@ -110,6 +211,106 @@ class InputV2(BaseModel):
     backend_output: Union[Dict, List, None] = None
 
 
+def capture_if_slow(
+    input_data: InputV3,
+    language: str,
+    timings: Dict[str, float],
+    request_id: str,
+    error: Optional[str] = None,
+):
+    """Hand a slow request to the ring buffer without blocking the response."""
+    if not slow_request_recorder.should_capture(
+        input_data.function_name, timings["total_ms"]
+    ):
+        return
+    asyncio.get_running_loop().run_in_executor(
+        None,
+        lambda: slow_request_recorder.capture(
+            input_data.model_dump(mode="json"), language, timings, request_id, error
+        ),
+    )
+
+
+async def render_with_cache(
+    func_name: str,
+    context: Context,
+    offload: bool = False,
+    request_key: Optional[str] = None,
+) -> BuildOutput:
+    """
+    Run ``functions_mapper[func_name]``, answering from the render cache when
+    the function is cacheable. ``offload`` renders in the default executor
+    (used by background warm-up so it does not block request handling).
+    ``request_key`` is RenderCache.request_key() if the caller computed it.
+    """
+    cache_key = None
+    if render_cache.is_cacheable(func_name):
+        cache_key = request_key or render_cache.request_key(
+            context.llm_output, context.backend_output, context.api_key, context.version
+        )
+    language = context.language.value
+    if cache_key is not None:
+        result = await render_cache.aget(func_name, language, cache_key)
+        if result is not None:
+            # Cached renders still go to the usage log like fresh ones
+            save_builder_output(context, result)
+            return result
+    if offload:
+        result = await asyncio.to_thread(functions_mapper[func_name], context=context)
+    else:
+        result = functions_mapper[func_name](context=context)
+    if cache_key is not None:
+        await render_cache.aset(func_name, language, cache_key, result)
+    return result
+
+
+WARMUP_CHAT_ID = "warmup-cache"
+
+
+async def warm_render_cache(
+    requests: List[Dict[str, Any]], deadline: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Pre-render request bodies into the render cache (startup and admin
+    warm-up). Stops early once ``deadline`` (time.monotonic()) has passed.
+    """
+    summary = {"rendered": 0, "skipped": 0, "errors": 0, "timed_out": False}
+    for item in requests:
+        if deadline is not None and time.monotonic() >= deadline:
+            summary["timed_out"] = True
+            break
+        try:
+            input_data = InputV3.model_validate(item)
+            if not render_cache.is_cacheable(input_data.function_name):
+                summary["skipped"] += 1
+                continue
+            context = Context(
+                logger_context=LoggerContext(chat_id=WARMUP_CHAT_ID, logger=logger),
+                llm_output=input_data.llm_output or "",
+                backend_output=input_data.backend_output or {},  # pyright: ignore[reportArgumentType]
+                version="v3",
+                language=LanguageOptions(item.get("language", "ru")),
+                api_key=input_data.api_key or "",
+                function_name=input_data.function_name,
+            )
+            await render_with_cache(input_data.function_name, context, offload=True)
+            summary["rendered"] += 1
+        except Exception as e:
+            summary["errors"] += 1
+            logger.warning(f"Warm-up request failed: {e}")
+    # Warm-up renders are not user traffic; keep them out of the usage upload
+    try:
+        os.remove(f"logs/usage/{WARMUP_CHAT_ID}.jsonl")
+    except OSError:
+        pass
+    return summary
+
+
+cache_control_plane = register_admin_endpoint(app, global_cache)
+cache_control_plane.register("render", render_cache.cache)
+cache_control_plane.set_warmup_handler(warm_render_cache)
+
+
 health_counter = 0
 
 
@@ -118,6 +319,8 @@ async def health():
     # here I need function to upload logs/usage to somewhere - can be [s3, mongo]
     # every health check is in 30 seconds so for 30 minutes I need to upload usages every 60 health checks
     global health_counter
+    if not warmup_state.ready:
+        return JSONResponse(status_code=503, content="Warming up")
     if health_counter % 60 == 0:
         await upload_usages_async()
     health_counter += 1
@@ -145,16 +348,53 @@ async def format_data(request: Request):
 
 @app.post(
     "/chat/v3/build_ui",
-    responses={200: {"model": BuildOutput}, 500: {"model": ErrorResponse}},
+    responses={
+        200: {"model": BuildOutput},
+        400: {"model": ErrorResponse},
+        413: {"model": ErrorResponse},
+        500: {"model": ErrorResponse},
+        503: {"model": ErrorResponse},
+    },
+    # The body is read raw (see below), so document it explicitly
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": InputV3.model_json_schema()}},
+            "required": True,
+        }
+    },
 )
-async def format_data_v3(request: Request, input_data: InputV3):
+async def format_data_v3(request: Request):
     global logger
     version = "v3"
 
     start_time = time.time()
+    # Ends the admission queue wait (body limits and rate limiting already ran)
+    admission_controller.mark_entered(request.scope)
+    # Guard the raw bytes before parsing: oversized or deeply nested bodies are
+    # rejected without building a Python tree for them
+    body = await request.body()
+    try:
+        # Size and depth were usually enforced by BodyLimitMiddleware already
+        guard_raw_input(body, checked=body_limits_checked(request.scope))
+    except InputRejected as e:
+        logger.warning(f"Rejected /chat/v3/build_ui body: {e}")
+        return JSONResponse(
+            status_code=e.status_code,
+            content=ErrorResponse(error=str(e), traceback="").model_dump(),
+        )
+    try:
+        input_data = InputV3.model_validate_json(body)
+    except ValidationError as e:
+        return JSONResponse(
+            status_code=422,
+            content={"detail": e.errors(include_url=False, include_context=False)},
+        )
+
     logger = logger.bind(chat_id=input_data.chat_id)
     logger.info("BUILD UI V3")
 
+    # Set inside the try; the except branch reports what was reached
+    func_name = language = context = None
     # with tracer.start_as_current_span("build_ui_v3") as span:
     try:
         logger.info("Step 1: Entering /chat/v3/build_ui")
@@ -188,6 +428,21 @@ async def format_data_v3(request: Request, input_data: InputV3):
                 ).model_dump(),
             )
 
+        # Shed load before the widget pipeline: past the thresholds low-priority
+        # functions are rejected and the rest get the text-only output
+        decision = admission_controller.decide(
+            func_name, admission_controller.queued_ms(request.scope)
+        )
+        if decision == REJECT:
+            logger.warning(f"Overloaded, rejecting {func_name}")
+            return JSONResponse(
+                status_code=503,
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_S)},
+                content=ErrorResponse(
+                    error="Server overloaded, retry later", traceback=""
+                ).model_dump(),
+            )
+
         logger.info(f"Step 2: Found function {func_name}, invoking now")
 
         # Time function execution
@@ -201,11 +456,29 @@ async def format_data_v3(request: Request, input_data: InputV3):
             version=version,
             language=language,
             api_key=api_key,
+            function_name=func_name,
         )
 
-        result: BuildOutput = functions_mapper[func_name](
-            context=context,
-        )
+        # One request fingerprint serves both the render cache and coalescing
+        request_key = None
+        coalescable = request_coalescer.is_coalescable(func_name)
+        if decision == ADMIT and (coalescable or render_cache.is_cacheable(func_name)):
+            request_key = render_cache.request_key(
+                llm_output, backend_output, api_key, version
+            )
+        if decision == DEGRADE:
+            logger.warning(f"Overloaded, text-only output for {func_name}")
+            result: BuildOutput = build_text_only(context)
+        elif coalescable and request_key is not None:
+            result = await request_coalescer.run(
+                request_coalescer.key(
+                    func_name, language.value, input_data.chat_id or "", request_key
+                ),
+                func_name,
+                lambda: render_with_cache(func_name, context, request_key=request_key),
+            )
+        else:
+            result = await render_with_cache(func_name, context, request_key=request_key)
         func_duration = (time.time() - func_start) * 1000
 
         # Record function metrics
@@ -216,6 +489,17 @@ async def format_data_v3(request: Request, input_data: InputV3):
             version=version,
         )
 
+        capture_if_slow(
+            input_data,
+            language.value,
+            {
+                "setup_ms": (func_start - start_time) * 1000,
+                "function_ms": func_duration,
+                "total_ms": (time.time() - start_time) * 1000,
+            },
+            context.request_id,
+        )
+
         # span.set_attribute("function.duration_ms", func_duration)
         logger.info(f"Step 3: Function result={result}")
 
@@ -224,7 +508,7 @@ async def format_data_v3(request: Request, input_data: InputV3):
         duration = (time.time() - start_time) * 1000
 
         # Record error metrics
-        if "func_name" in locals():
+        if func_name is not None:
             metrics_collector.record_function_invocation(
                 function_name=func_name,
                 duration_ms=duration,
@@ -232,6 +516,14 @@ async def format_data_v3(request: Request, input_data: InputV3):
                 version=version,
             )
 
+        capture_if_slow(
+            input_data,
+            language.value if language is not None else "",
+            {"total_ms": duration},
+            context.request_id if context is not None else "",
+            error=str(e),
+        )
+
         # span.record_exception(e)
         # span.set_attribute("error.message", str(e))
 
@@ -328,84 +620,163 @@ AGENT_STEP_MESSAGES: List[str] = [
     "Finalizing and formatting output...",
 ]
 
-# In-memory state for the running agent
-_agent_state: Dict[str, Any] = {
-    "messages": [],  # list of {"step": int, "text": str}
-    "is_running": False,
-    "is_complete": False,
-    "result": None,
-    "started_at": None,
-}
+# Base URL the progress card polls; empty means the URL the card was requested on
+AGENT_CARD_BASE_URL = os.getenv("AGENT_CARD_BASE_URL", "")
+AGENT_CARD_MAX_AGE = int(os.getenv("AGENT_CARD_MAX_AGE", 300))
+
+AGENT_RESULT_TEXT = (
+    "Agent completed successfully! The answer to your query has been "
+    "generated based on the analysis of relevant documents."
+)
+
 
+def _agent_session_id(session_id: Optional[str], chat_id: Optional[str]) -> str:
+    return session_id or chat_id or DEFAULT_SESSION_ID
 
-async def _deliver_messages_background(messages: List[str]) -> None:
+
+async def _deliver_messages_background(
+    session_id: str, run_id: int, messages: List[str]
+) -> None:
     """Background task: add one message every ~2 seconds."""
-    global _agent_state
-    for i, msg in enumerate(messages, start=1):
+    for msg in messages:
         await asyncio.sleep(2)
-        if not _agent_state["is_running"]:
-            return  # agent was reset mid-run
-        _agent_state["messages"].append({"step": i, "text": msg})
+        if await agent_sessions.add_step(session_id, run_id, msg) is None:
+            return  # agent was reset or restarted mid-run
     await asyncio.sleep(1)
-    _agent_state["is_complete"] = True
-    _agent_state["is_running"] = False
-    _agent_state["result"] = (
-        "Agent completed successfully! The answer to your query has been "
-        "generated based on the analysis of relevant documents."
-    )
+    await agent_sessions.complete(session_id, run_id, AGENT_RESULT_TEXT)
+
+
+@app.get("/agent_progress_card")
+async def agent_progress_card(
+    request: Request,
+    session_id: Optional[str] = None,
+    chat_id: Optional[str] = None,
+):
+    """Serve the precompiled DivKit progress card for a session."""
+    base_url = AGENT_CARD_BASE_URL or str(request.base_url)
+    body = render_agent_progress_card(_agent_session_id(session_id, chat_id), base_url)
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    headers = {
+        "ETag": etag,
+        # The body embeds the session id, so shared caches must not keep it
+        "Cache-Control": f"private, max-age={AGENT_CARD_MAX_AGE}",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.post("/start_agent")
-async def start_agent():
-    """Kick off a simulated 8-step agent run."""
-    global _agent_state
-    _agent_state = {
-        "messages": [],
-        "is_running": True,
-        "is_complete": False,
-        "result": None,
-        "started_at": datetime.now().isoformat(),
+async def start_agent(session_id: Optional[str] = None, chat_id: Optional[str] = None):
+    """Kick off a simulated 8-step agent run for one session."""
+    session_id = _agent_session_id(session_id, chat_id)
+    run_id = await agent_sessions.start(session_id)
+    asyncio.create_task(
+        _deliver_messages_background(session_id, run_id, AGENT_STEP_MESSAGES)
+    )
+    return {
+        "status": "started",
+        "session_id": session_id,
+        "total_steps": len(AGENT_STEP_MESSAGES),
     }
-    asyncio.create_task(_deliver_messages_background(AGENT_STEP_MESSAGES))
-    return {"status": "started", "total_steps": len(AGENT_STEP_MESSAGES)}
 
 
 @app.get("/new_messages")
-async def new_messages():
+async def new_messages(
+    session_id: Optional[str] = None,
+    chat_id: Optional[str] = None,
+    since_step: int = 0,
+    timeout: float = 0,
+):
     """
-    Return the current agent messages.
+    Return the agent messages of a session after ``since_step``.
+
+    With ``timeout`` > 0 this is a long-poll: the request is held until a
+    step newer than ``since_step`` arrives, the run stops, or the timeout
+    (capped at AGENT_LONG_POLL_MAX_S) elapses.
 
     The response contains:
-      - messages: list of delivered messages so far
+      - messages: delivered messages with step > since_step
+      - last_step: cursor to pass as since_step on the next call
       - is_running: whether the agent is still processing
       - is_complete: whether all steps finished
       - result: final result text (set once complete)
       - total_steps: total number of steps (8)
 
-    The DivKit poll timer hits this endpoint every 2 seconds.
     The host application (or DivKit action handler) should read the
     response and set the corresponding card variables:
         step_N_visible = true
         step_N_text    = <message text>
     """
+    try:
+        snapshot = await agent_sessions.wait_for_update(
+            _agent_session_id(session_id, chat_id), since_step, timeout
+        )
+    except TooManySubscribers as e:
+        return JSONResponse(status_code=503, content={"detail": str(e)})
     return {
-        "messages": _agent_state["messages"],
-        "is_running": _agent_state["is_running"],
-        "is_complete": _agent_state["is_complete"],
-        "result": _agent_state["result"],
+        **snapshot,
         "total_steps": len(AGENT_STEP_MESSAGES),
     }
 
 
 @app.post("/reset_agent")
-async def reset_agent():
-    """Reset the agent state back to idle."""
-    global _agent_state
-    _agent_state = {
-        "messages": [],
-        "is_running": False,
-        "is_complete": False,
-        "result": None,
-        "started_at": None,
-    }
+async def reset_agent(session_id: Optional[str] = None, chat_id: Optional[str] = None):
+    """Reset the agent state of a session back to idle."""
+    await agent_sessions.reset(_agent_session_id(session_id, chat_id))
     return {"status": "reset"}
+
+
+@app.get("/agent_events")
+async def agent_events(
+    session_id: Optional[str] = None,
+    chat_id: Optional[str] = None,
+    since_step: int = 0,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-Sent Events stream of a session's agent progress.
+
+    Events: ``start``, ``step`` (id = step number), ``complete`` (ends the
+    stream) and ``reset``; comment lines are heartbeats. A reconnecting
+    EventSource sends Last-Event-ID and resumes after that step; plain
+    clients pass ``since_step`` instead.
+    """
+    session_id = _agent_session_id(session_id, chat_id)
+    cursor = int(last_event_id) if last_event_id and last_event_id.isdigit() else since_step
+    if agent_event_broker.full:
+        return JSONResponse(status_code=503, content={"detail": "Too many subscribers"})
+
+    async def stream():
+        yield f"retry: {AGENT_EVENTS_RETRY_MS}\n\n"
+        try:
+            async for event in iter_session_events(agent_sessions, session_id, cursor):
+                yield format_sse(event)
+        except TooManySubscribers:
+            return  # lost the race for the last slot; the client retries
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/agent_events/ws")
+async def agent_events_ws(
+    websocket: WebSocket,
+    session_id: Optional[str] = None,
+    chat_id: Optional[str] = None,
+    since_step: int = 0,
+):
+    """WebSocket variant of /agent_events; heartbeats are {"type": "heartbeat"}."""
+    session_id = _agent_session_id(session_id, chat_id)
+    await websocket.accept()
+    try:
+        async for event in iter_session_events(agent_sessions, session_id, since_step):
+            await websocket.send_json(event or {"type": "heartbeat"})
+        await websocket.close()
+    except TooManySubscribers as e:
+        await websocket.close(code=1013, reason=str(e))
+    except WebSocketDisconnect:
+        pass
@@ -6,6 +6,7 @@ Provides OpenTelemetry instrumentation, metrics, and tracing
 from .setup import setup_telemetry, get_tracer, get_meter, get_prometheus_metrics
 from .middleware import TelemetryMiddleware
 from .metrics import MetricsCollector
+from .loop_monitor import EventLoopMonitor, LOOP_MONITOR_ENABLED
 
 __all__ = [
     "setup_telemetry",
@@ -14,4 +15,6 @@ __all__ = [
     "get_prometheus_metrics",
     "TelemetryMiddleware",
     "MetricsCollector",
+    "EventLoopMonitor",
+    "LOOP_MONITOR_ENABLED",
 ]
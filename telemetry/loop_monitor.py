@@ -0,0 +1,252 @@
+"""
+Event loop lag and executor saturation monitoring
+
+UI builders run synchronously inside async handlers, so a slow render blocks
+every other request on the loop. This module measures that directly:
+
+- ``ui_server.event_loop.lag`` histogram: how late a periodic timer fires
+- ``ui_server.event_loop.max_stall`` gauge: worst lag since the last scrape
+- ``ui_server.event_loop.stalls`` counter: stalls above the threshold; a stack
+  snapshot of the loop thread is logged and written to disk for each one
+- ``ui_server.executor.queue_depth`` / ``ui_server.executor.active`` gauges
+  for registered thread and process pools
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from opentelemetry import metrics
+from opentelemetry.metrics import CallbackOptions, Observation
+
+from conf import logger
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+LOOP_STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "250"))
+LOOP_STALL_SNAPSHOT_DIR = os.getenv("LOOP_STALL_SNAPSHOT_DIR", "logs/loop_stalls")
+LOOP_STALL_MAX_SNAPSHOTS = int(os.getenv("LOOP_STALL_MAX_SNAPSHOTS", "50"))
+
+
+def _executor_stats(executor: Executor) -> Dict[str, int]:
+    """Queue depth and active workers of a stdlib executor (best effort)."""
+    if isinstance(executor, ThreadPoolExecutor):
+        threads = len(executor._threads)
+        idle = getattr(executor, "_idle_semaphore", None)
+        idle_count = idle._value if idle is not None else 0
+        return {
+            "queue_depth": executor._work_queue.qsize(),
+            "active": max(threads - idle_count, 0),
+        }
+    if isinstance(executor, ProcessPoolExecutor):
+        pending = len(getattr(executor, "_pending_work_items", {}))
+        processes = len(getattr(executor, "_processes", None) or {})
+        return {
+            "queue_depth": max(pending - processes, 0),
+            "active": min(pending, processes),
+        }
+    return {"queue_depth": 0, "active": 0}
+
+
+class EventLoopMonitor:
+    """
+    Measures event loop lag from inside the loop and detects stalls from a
+    watchdog thread, which can still run while the loop is blocked.
+    """
+
+    def __init__(
+        self,
+        meter: Optional[metrics.Meter] = None,
+        interval_ms: float = LOOP_MONITOR_INTERVAL_MS,
+        stall_threshold_ms: float = LOOP_STALL_THRESHOLD_MS,
+        snapshot_dir: Optional[str] = LOOP_STALL_SNAPSHOT_DIR,
+        max_snapshots: int = LOOP_STALL_MAX_SNAPSHOTS,
+    ):
+        """
+        Initialize the monitor
+
+        Args:
+            meter: OpenTelemetry Meter instance
+            interval_ms: Timer interval used to sample lag
+            stall_threshold_ms: Lag above which a stack snapshot is taken
+            snapshot_dir: Where stall snapshots are written (None disables)
+            max_snapshots: Snapshot files kept on disk (oldest are reused)
+        """
+        if meter is None:
+            meter = metrics.get_meter(__name__)
+
+        self.interval = interval_ms / 1000
+        self.stall_threshold = stall_threshold_ms / 1000
+        self.snapshot_dir = snapshot_dir
+        self.max_snapshots = max(max_snapshots, 1)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._heartbeat = time.perf_counter()
+        self._stall_reported = False
+        self._max_lag_ms = 0.0
+        self._lock = threading.Lock()
+        self._snapshots = 0
+        self._executors: Dict[str, Executor] = {}
+        self._lag_listeners: List[Callable[[float], None]] = []
+
+        self.lag_histogram = meter.create_histogram(
+            name="ui_server.event_loop.lag",
+            description="Event loop scheduling lag in milliseconds",
+            unit="ms",
+        )
+        self.stall_counter = meter.create_counter(
+            name="ui_server.event_loop.stalls",
+            description="Event loop stalls above the snapshot threshold",
+            unit="1",
+        )
+        meter.create_observable_gauge(
+            name="ui_server.event_loop.max_stall",
+            callbacks=[self._observe_max_stall],
+            description="Largest event loop lag since the previous collection",
+            unit="ms",
+        )
+        meter.create_observable_gauge(
+            name="ui_server.executor.queue_depth",
+            callbacks=[self._observe_queue_depth],
+            description="Work items waiting for an executor worker",
+            unit="1",
+        )
+        meter.create_observable_gauge(
+            name="ui_server.executor.active",
+            callbacks=[self._observe_active],
+            description="Executor workers currently running work",
+            unit="1",
+        )
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Start sampling on the running loop and launch the watchdog thread."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._sample())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="event-loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        logger.info(
+            "Event loop monitor started",
+            interval_ms=self.interval * 1000,
+            stall_threshold_ms=self.stall_threshold * 1000,
+        )
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.interval * 2)
+            self._watchdog = None
+
+    def register_executor(self, name: str, executor: Executor) -> None:
+        """Export queue depth and active workers for ``executor``."""
+        self._executors[name] = executor
+
+    def add_lag_listener(self, listener: Callable[[float], None]) -> None:
+        """Call ``listener(lag_ms)`` on the loop for every lag sample."""
+        self._lag_listeners.append(listener)
+
+    # ------------------------------------------------------------------
+    # Sampling
+    # ------------------------------------------------------------------
+
+    async def _sample(self) -> None:
+        while not self._stop.is_set():
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag_ms = max(now - expected, 0.0) * 1000
+            self._heartbeat = now
+            self._stall_reported = False
+            self.lag_histogram.record(lag_ms)
+            with self._lock:
+                if lag_ms > self._max_lag_ms:
+                    self._max_lag_ms = lag_ms
+            for listener in self._lag_listeners:
+                listener(lag_ms)
+
+    def _watch(self) -> None:
+        # Poll at half the interval so a stall is noticed while it is ongoing
+        poll = max(self.interval / 2, 0.01)
+        while not self._stop.wait(poll):
+            blocked_for = time.perf_counter() - self._heartbeat - self.interval
+            if blocked_for < self.stall_threshold or self._stall_reported:
+                continue
+            self._stall_reported = True
+            self.stall_counter.add(1)
+            self._snapshot(blocked_for * 1000)
+
+    def _snapshot(self, blocked_ms: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = "".join(traceback.format_stack(frame))
+        logger.warning(
+            "Event loop stall detected",
+            blocked_ms=round(blocked_ms, 1),
+            stack=stack,
+        )
+        if not self.snapshot_dir:
+            return
+        slot = self._snapshots % self.max_snapshots
+        self._snapshots += 1
+        path = os.path.join(self.snapshot_dir, f"stall-{slot:04d}.txt")
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"time: {time.strftime('%Y-%m-%dT%H:%M:%S%z')}\n")
+                f.write(f"blocked_ms: {blocked_ms:.1f}\n\n")
+                f.write(stack)
+        except OSError as e:
+            logger.error(f"Error saving event loop stall snapshot: {e}")
+
+    # ------------------------------------------------------------------
+    # Observable callbacks
+    # ------------------------------------------------------------------
+
+    def _observe_max_stall(self, options: CallbackOptions) -> Iterable[Observation]:
+        with self._lock:
+            value = self._max_lag_ms
+            self._max_lag_ms = 0.0
+        # A stall in progress has not been sampled by the loop yet
+        if self._task is not None:
+            ongoing = (time.perf_counter() - self._heartbeat - self.interval) * 1000
+            value = max(value, ongoing)
+        return [Observation(value)]
+
+    def _observe_queue_depth(self, options: CallbackOptions) -> List[Observation]:
+        return [
+            Observation(_executor_stats(executor)["queue_depth"], {"executor": name})
+            for name, executor in list(self._executors.items())
+        ]
+
+    def _observe_active(self, options: CallbackOptions) -> List[Observation]:
+        return [
+            Observation(_executor_stats(executor)["active"], {"executor": name})
+            for name, executor in list(self._executors.items())
+        ]
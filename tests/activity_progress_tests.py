@@ -0,0 +1,36 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+
+from components.experiements.activity_progress import (
+    build_agent_progress_card,
+    make_step_row_dict,
+    render_agent_progress_card,
+)
+
+
+def test_precompiled_card_matches_built_card():
+    session_id = 'chat "quoted" сессия'
+    rendered = render_agent_progress_card(session_id, "http://ui-server:8003/")
+    card = build_agent_progress_card(session_id, "http://ui-server:8003")
+    assert json.loads(rendered) == card
+    poll = card["card"]["timers"][0]["tick_actions"][0]["url"]
+    assert poll.startswith("http://ui-server:8003/new_messages?session_id=@{session_id_query}&")
+
+
+def test_session_id_is_url_encoded_for_the_poll_url():
+    card = json.loads(render_agent_progress_card("chat a&b#1", "http://ui-server:8003"))
+    variables = {v["name"]: v["value"] for v in card["card"]["variables"]}
+    assert variables["session_id"] == "chat a&b#1"
+    assert variables["session_id_query"] == "chat%20a%26b%231"
+
+
+def test_step_row_template_fills_number_and_text():
+    row = make_step_row_dict(2, 'Parsing "user" request...')
+    assert row["items"][0]["items"][0]["text"] == "2"
+    assert row["items"][1]["text"] == 'Parsing "user" request...'
+    assert row["margins"] == {"bottom": 8}
+    assert make_step_row_dict(8, "done")["margins"] is None
@@ -0,0 +1,107 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import time
+
+from utils.agent_events import EventBroker, iter_session_events
+from utils.agent_sessions import AgentSessions
+from utils.session_store import MemorySessionStore
+
+
+def make_sessions(queue_size=32):
+    return AgentSessions(MemorySessionStore(maxsize=10, ttl=60), EventBroker(queue_size=queue_size))
+
+
+def test_sessions_are_isolated_and_stale_runs_stop():
+    sessions = make_sessions()
+
+    async def main():
+        run = await sessions.start("chat-1")
+        await sessions.add_step("chat-1", run, "Parsing user request...")
+        await sessions.start("chat-2")
+        assert (await sessions.snapshot("chat-2"))["messages"] == []
+        assert (await sessions.snapshot("chat-1"))["last_step"] == 1
+
+        await sessions.reset("chat-1")
+        # The producer of the reset run is told to stop
+        assert await sessions.add_step("chat-1", run, "Searching...") is None
+        return await sessions.snapshot("chat-1")
+
+    snapshot = asyncio.run(main())
+    assert snapshot["last_step"] == 0 and not snapshot["is_running"]
+
+
+def test_long_poll_returns_on_new_step():
+    sessions = make_sessions()
+
+    async def main():
+        run = await sessions.start("chat-1")
+
+        async def produce():
+            await asyncio.sleep(0.05)
+            await sessions.add_step("chat-1", run, "Searching knowledge base...")
+
+        asyncio.get_running_loop().create_task(produce())
+        started = time.monotonic()
+        snapshot = await sessions.wait_for_update("chat-1", since_step=0, timeout=5)
+        waited = time.monotonic() - started
+        # Nothing newer than the cursor: the poll times out empty-handed
+        idle = await sessions.wait_for_update("chat-1", since_step=1, timeout=0.02)
+        return snapshot, waited, idle
+
+    snapshot, waited, idle = asyncio.run(main())
+    assert waited < 1
+    assert snapshot["messages"] == [{"step": 1, "text": "Searching knowledge base..."}]
+    assert idle["messages"] == [] and idle["is_running"]
+
+
+def test_long_poll_with_a_cursor_from_an_earlier_run_starts_over():
+    sessions = make_sessions()
+
+    async def main():
+        run = await sessions.start("chat-1")
+
+        async def produce():
+            await asyncio.sleep(0.05)
+            await sessions.add_step("chat-1", run, "Parsing user request...")
+
+        asyncio.get_running_loop().create_task(produce())
+        started = time.monotonic()
+        # since_step=7 came from a run before a restart or reset
+        snapshot = await sessions.wait_for_update("chat-1", since_step=7, timeout=5)
+        return snapshot, time.monotonic() - started
+
+    snapshot, waited = asyncio.run(main())
+    assert waited < 1
+    assert snapshot["messages"] == [{"step": 1, "text": "Parsing user request..."}]
+
+
+def test_push_channel_fans_out_and_recovers_from_lag():
+    sessions = make_sessions(queue_size=2)
+
+    async def collect(cursor):
+        events = []
+        async for event in iter_session_events(sessions, "chat-1", cursor, heartbeat_s=1):
+            events.append(event)
+        return events
+
+    async def main():
+        run = await sessions.start("chat-1")
+        await sessions.add_step("chat-1", run, "Initializing agent context...")
+        readers = [asyncio.ensure_future(collect(cursor)) for cursor in (0, 1)]
+        while sessions.broker.subscriber_count < 2:
+            await asyncio.sleep(0)
+        # More events than a subscriber queue holds, without yielding to readers
+        for text in ("Parsing...", "Searching...", "Analyzing..."):
+            await sessions.add_step("chat-1", run, text)
+        await sessions.complete("chat-1", run, "done")
+        return await asyncio.gather(*readers)
+
+    from_start, resumed = asyncio.run(main())
+    assert [e["id"] for e in from_start] == [1, 2, 3, 4, 4]
+    assert [e["id"] for e in resumed] == [2, 3, 4, 4]
+    assert from_start[-1] == {"id": 4, "type": "complete", "result": "done"}
+    assert sessions.broker.subscriber_count == 0
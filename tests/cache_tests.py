@@ -0,0 +1,344 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import gc
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from models.build import BuildOutput
+from utils.cache_admin import CacheControlPlane
+import utils.cache as cache_module
+from utils.cache import (
+    LRUCache,
+    NamespacedCache,
+    NamespaceReaper,
+    RedisCache,
+    ShardedLRUCache,
+    TieredCache,
+    cache_function,
+    deserialize_value,
+    estimate_size,
+    get_async_redis_client,
+    namespace_patterns,
+    serialize_value,
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def redis_cache():
+    server = fakeredis.FakeServer()
+    return RedisCache(
+        maxsize=100,
+        expiry=60,
+        host="localhost",
+        port=6379,
+        db=0,
+        client=fakeredis.FakeRedis(server=server),
+        async_client=fakeredis.FakeAsyncRedis(server=server),
+    )
+
+
+def test_serializer_round_trips_json_and_models():
+    output = BuildOutput(widgets_count=1, widgets=[{"type": "text", "order": 1}])
+    restored = deserialize_value(serialize_value(output))
+    assert isinstance(restored, BuildOutput)
+    assert restored == output
+    assert deserialize_value(serialize_value({"a": [1, "b", None]})) == {"a": [1, "b", None]}
+
+
+def test_serializer_never_evaluates_payloads():
+    with pytest.raises(Exception):
+        deserialize_value(b"j__import__('os').system('true')")
+    with pytest.raises(TypeError):
+        deserialize_value(b'm{"cls": "os:system", "data": {}}')
+
+
+def test_keys_are_stable_across_processes(redis_cache):
+    key = ("get_balance", ("ru",), ())
+    code = (
+        "from utils.cache import RedisCache;"
+        "print(RedisCache(1, 1, 'h', 1, 0, client=object())._serialize_key(%r))" % (key,)
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    other = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=root,
+        env=dict(os.environ, PYTHONHASHSEED="123"),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip().splitlines()[-1]
+    assert redis_cache._serialize_key(key) == other
+
+
+def test_sync_get_set_many(redis_cache):
+    redis_cache.set("a", {"x": 1})
+    assert redis_cache.get("a") == {"x": 1}
+    redis_cache.set_many({"b": [1, 2], "c": "text"})
+    assert redis_cache.get_many(["a", "b", "c", "missing"]) == [{"x": 1}, [1, 2], "text", None]
+    assert 0 < redis_cache.client.ttl(redis_cache._serialize_key("b")) <= 60
+    redis_cache.clear()
+    assert redis_cache.get("a") is None
+
+
+def test_async_get_set_many(redis_cache):
+    async def scenario():
+        await redis_cache.aset("a", 1)
+        await redis_cache.aset_many({"b": 2, "c": 3})
+        return await redis_cache.aget("a"), await redis_cache.aget_many(["b", "c", "d"])
+
+    assert asyncio.run(scenario()) == (1, [2, 3, None])
+
+
+def test_cache_function_wraps_coroutines():
+    calls = []
+
+    @cache_function(backend="memory", enabled=True)
+    async def load(x):
+        calls.append(x)
+        return x * 2
+
+    async def scenario():
+        return [await load(2), await load(2), await load(3)]
+
+    assert asyncio.run(scenario()) == [4, 4, 6]
+    assert calls == [2, 3]
+
+
+def test_lru_cache_async_aliases():
+    cache = LRUCache(maxsize=2, expiry=0)
+    asyncio.run(cache.aset("k", "v"))
+    assert asyncio.run(cache.aget("k")) == "v"
+
+
+@pytest.fixture
+def tiered_cache(redis_cache):
+    return TieredCache(LRUCache(maxsize=10, expiry=30), redis_cache, name="test")
+
+
+def test_tiered_cache_promotes_l2_hits(tiered_cache, redis_cache):
+    redis_cache.set("k", {"v": 1})
+    assert tiered_cache.get("k") == {"v": 1}
+    assert tiered_cache.l1.get("k") == {"v": 1}
+    assert tiered_cache.get("k") == {"v": 1}
+    assert tiered_cache.stats == {"l1_hits": 1, "l1_misses": 1, "l2_hits": 1, "l2_misses": 0}
+
+
+def test_tiered_cache_single_flight_threads(tiered_cache):
+    calls = []
+    gate = threading.Event()
+
+    def loader():
+        calls.append(1)
+        gate.wait(1)
+        return "value"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(tiered_cache.get_or_load, "k", loader) for _ in range(8)]
+        time.sleep(0.1)
+        gate.set()
+        results = [f.result() for f in futures]
+
+    assert results == ["value"] * 8
+    assert len(calls) == 1
+
+
+def test_tiered_cache_single_flight_async(tiered_cache):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def scenario():
+        return await asyncio.gather(
+            *[tiered_cache.aget_or_load("k", loader) for _ in range(10)]
+        )
+
+    assert asyncio.run(scenario()) == ["value"] * 10
+    assert len(calls) == 1
+
+
+def test_tiered_cache_async_flights_are_dropped_with_their_loop():
+    # No L2 here: the injected fake async client would keep its loop alive
+    cache = TieredCache(LRUCache(maxsize=10, expiry=30), None, name="test")
+
+    async def loader():
+        return "value"
+
+    assert asyncio.run(cache.aget_or_load("k", loader)) == "value"
+    gc.collect()
+    assert len(cache._async_flights) == 0
+
+
+def test_cache_function_accepts_tiered_instance(tiered_cache):
+    calls = []
+
+    @cache_function(enabled=True, backend=tiered_cache)
+    def render(x):
+        calls.append(x)
+        return {"x": x}
+
+    assert render(1) == render(1) == {"x": 1}
+    assert calls == [1]
+
+
+def test_sharded_cache_evicts_by_bytes():
+    cache = ShardedLRUCache(max_bytes=4000, expiry=0, shards=1, name="test-bytes")
+    for i in range(10):
+        cache.set(i, "x" * 500)
+    assert cache.total_bytes() <= 4000
+    assert cache.get(9) == "x" * 500
+    assert cache.get(0) is None
+    assert cache.eviction_counts["capacity"] > 0
+
+
+def test_sharded_cache_rejects_oversize_and_expires():
+    cache = ShardedLRUCache(max_bytes=1000, expiry=1, shards=1, name="test-oversize")
+    cache.set("big", "x" * 5000)
+    assert cache.get("big") is None
+    assert cache.eviction_counts["oversize"] == 1
+
+    cache.set("k", "v")
+    key_entry = cache.shards[0].entries["k"]
+    cache.shards[0].entries["k"] = (key_entry[0], key_entry[1] - 5, key_entry[2])
+    assert cache.get("k") is None
+    assert cache.eviction_counts["expired"] == 1
+    assert cache.total_bytes() == 0
+
+
+def test_estimate_size_stops_at_limit():
+    big = [{"name": "x" * 100} for _ in range(10000)]
+    assert estimate_size(big, limit=1000) > 1000
+    assert estimate_size("abc") < estimate_size("abc" * 100)
+
+
+def test_namespace_patterns_cover_wildcards():
+    assert namespace_patterns("render:get_categories:uz") == (
+        "",
+        "*:*:uz",
+        "*:get_categories",
+        "*:get_categories:uz",
+        "render",
+        "render:*:uz",
+        "render:get_categories",
+        "render:get_categories:uz",
+    )
+    with pytest.raises(ValueError):
+        namespace_patterns("render:*:uz")
+
+
+def test_namespaced_invalidation_is_targeted():
+    cache = NamespacedCache(LRUCache(100, 60))
+    for function in ("get_categories", "get_news"):
+        for language in ("ru", "uz"):
+            cache.set(f"render:{function}:{language}", {"k": 1}, function + language)
+
+    cache.invalidate("render:*:uz")
+    assert cache.get("render:get_categories:uz", {"k": 1}) is None
+    assert cache.get("render:get_news:uz", {"k": 1}) is None
+    assert cache.get("render:get_news:ru", {"k": 1}) == "get_newsru"
+
+    cache.invalidate("render:get_news")
+    assert cache.get("render:get_news:ru", {"k": 1}) is None
+    assert cache.get("render:get_categories:ru", {"k": 1}) == "get_categoriesru"
+
+    cache.clear()
+    assert cache.get("render:get_categories:ru", {"k": 1}) is None
+
+
+def test_namespaced_redis_versions_are_shared_and_reaped(redis_cache):
+    worker_a = NamespacedCache(redis_cache, version_ttl=0)
+    worker_b = NamespacedCache(redis_cache, version_ttl=0)
+    asyncio.run(worker_a.aset("render:get_categories:ru", "key", {"widgets": 1}))
+    worker_a.set("render:get_news:ru", "key", {"widgets": 2})
+    assert worker_b.get("render:get_categories:ru", "key") == {"widgets": 1}
+
+    worker_b.invalidate("render:get_categories")
+    assert asyncio.run(worker_a.aget("render:get_categories:ru", "key")) is None
+    assert worker_a.get("render:get_news:ru", "key") == {"widgets": 2}
+
+    reaper = NamespaceReaper(worker_a, interval=1)
+    assert reaper.enabled
+    assert reaper.reap_once() == 1
+    assert worker_a.get("render:get_news:ru", "key") == {"widgets": 2}
+
+
+def test_cache_admin_requires_token_and_targets_namespaces():
+    app = FastAPI()
+    render = NamespacedCache(ShardedLRUCache(max_bytes=1 << 20, expiry=60), name="render")
+    control = CacheControlPlane(token="s3cret")
+    control.register("render", render)
+    app.include_router(control.router())
+    client = TestClient(app)
+
+    render.set("render:get_categories:uz", "k", {"widgets": [1]})
+    render.set("render:get_categories:ru", "k", {"widgets": [2]})
+    render.get("render:get_categories:uz", "k")
+
+    assert client.get("/admin/cache/stats").status_code == 401
+    assert client.get("/admin/cache/stats", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    headers = {"Authorization": "Bearer s3cret"}
+    namespaces = client.get("/admin/cache/stats", headers=headers).json()["caches"]["render"]["namespaces"]
+    assert namespaces["render:get_categories:uz"]["hits"] == 1
+    assert namespaces["render:get_categories:uz"]["entries"] == 1
+    assert namespaces["render:get_categories:uz"]["bytes"] > 0
+    # The first admin API keeps its flat counters
+    assert set(client.get("/admin/cache_metrics", headers=headers).json()) == {
+        "hits", "misses", "evictions", "expires", "errors"
+    }
+
+    response = client.post("/admin/cache/invalidate", json={"language": "uz"}, headers=headers)
+    assert response.json()["pattern"] == "render:*:uz"
+    assert render.get("render:get_categories:uz", "k") is None
+    assert render.get("render:get_categories:ru", "k") == {"widgets": [2]}
+
+    response = client.put("/admin/cache/render/limits", json={"expiry": 5, "max_bytes": 4096}, headers=headers)
+    assert response.json()["limits"] == {"max_bytes": 4096, "expiry": 5}
+    assert client.post("/admin/cache/warmup", json={}, headers=headers).status_code == 503
+
+
+def test_cache_admin_stats_over_redis_report_counters_only(redis_cache):
+    app = FastAPI()
+    render = NamespacedCache(redis_cache, name="render")
+    control = CacheControlPlane(token="s3cret")
+    control.register("render", render)
+    app.include_router(control.router())
+
+    render.set("render:get_news:ru", "k", {"widgets": [1]})
+    assert render.get("render:get_news:ru", "k") == {"widgets": [1]}
+    response = TestClient(app).get("/admin/cache/stats", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    namespace = response.json()["caches"]["render"]["namespaces"]["render:get_news:ru"]
+    assert namespace["hits"] == 1 and namespace["sets"] == 1
+    assert namespace["entries"] == 0
+
+
+def test_async_clients_are_per_loop_and_dropped_with_it():
+    async def client():
+        return get_async_redis_client("localhost", 6379, 0)
+
+    async def same_loop():
+        return get_async_redis_client("localhost", 6379, 0) is await client()
+
+    loops_before = len(cache_module._async_clients)
+    assert asyncio.run(same_loop())
+    first = asyncio.run(client())
+    second = asyncio.run(client())
+    assert first is not second
+    del first, second
+    gc.collect()
+    assert len(cache_module._async_clients) == loops_before
@@ -0,0 +1,85 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import gc
+
+import pytest
+
+from utils.coalesce import RequestCoalescer
+
+
+def test_identical_concurrent_requests_render_once():
+    coalescer = RequestCoalescer(window_ms=0)
+    calls = []
+
+    async def render():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"widgets_count": 1}
+
+    async def main():
+        results = await asyncio.gather(
+            *(coalescer.run("get_categories:ru:chat:abc", "get_categories", render) for _ in range(5))
+        )
+        return results, coalescer.in_flight_count()
+
+    results, in_flight = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert in_flight == 0
+    # In-flight maps are per loop and go away with the loop
+    gc.collect()
+    assert len(coalescer.in_flight) == 0
+
+
+def test_completion_window_reuses_result_then_expires():
+    coalescer = RequestCoalescer(window_ms=50)
+    calls = []
+
+    async def render():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        first = await coalescer.run("k", "get_news", render)
+        second = await coalescer.run("k", "get_news", render)
+        await asyncio.sleep(0.06)
+        third = await coalescer.run("k", "get_news", render)
+        return first, second, third
+
+    assert asyncio.run(main()) == (1, 1, 2)
+
+
+def test_failures_are_shared_but_not_remembered():
+    coalescer = RequestCoalescer(window_ms=1000)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("bad backend_output")
+
+    async def main():
+        return await asyncio.gather(
+            coalescer.run("k", "get_news", fail),
+            coalescer.run("k", "get_news", fail),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+    assert not coalescer.recent
+
+
+@pytest.mark.parametrize(
+    "function_name, expected",
+    [
+        ("get_categories", True),
+        ("human_approval_request", False),
+        ("send_money_to_someone_via_card", False),
+        ("pay_for_home_utility", False),
+        ("search_products", False),
+    ],
+)
+def test_side_effecting_functions_are_excluded(function_name, expected):
+    assert RequestCoalescer(enabled=True).is_coalescable(function_name) is expected
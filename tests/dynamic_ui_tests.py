@@ -0,0 +1,50 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subprocess
+
+from functions_to_format import dynamic_ui_builder
+from functions_to_format.dynamic_ui_builder import DynamicUIBuilder, cache_key_for_data
+from utils.cache import ShardedLRUCache
+
+
+def test_cache_key_is_stable():
+    key = cache_key_for_data({"title": "Balance", "items": [1, 2, {"a": None}]})
+    assert key.startswith("dynamic_ui:")
+    # Key order does not matter
+    assert key == cache_key_for_data({"items": [1, 2, {"a": None}], "title": "Balance"})
+    assert key != cache_key_for_data({"title": "Balance", "items": [2, 1, {"a": None}]})
+
+    code = (
+        "from functions_to_format.dynamic_ui_builder import cache_key_for_data;"
+        "print(cache_key_for_data({'title': 'Balance', 'items': [1, 2, {'a': None}]}))"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    other = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=root,
+        env=dict(os.environ, PYTHONHASHSEED="123"),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip().splitlines()[-1]
+    assert other == key
+
+
+def test_oversized_inputs_bypass_the_cache(monkeypatch):
+    monkeypatch.setattr(dynamic_ui_builder, "UI_BUILDER_CACHE_MAX_INPUT_BYTES", 1024)
+    monkeypatch.setattr(dynamic_ui_builder, "UI_BUILDER_ENABLE_CACHING", True)
+    cache = ShardedLRUCache(max_bytes=1 << 20, expiry=60)
+    monkeypatch.setattr(dynamic_ui_builder, "ui_cache", cache)
+
+    assert cache_key_for_data({"text": "x" * 2000}) is None
+    assert cache_key_for_data({"text": object()}) is None
+
+    builder = DynamicUIBuilder()
+    small = {"title": "ok"}
+    assert builder.build_ui(small) == builder.build_ui(dict(small))
+    assert len(cache) == 1
+    builder.build_ui({"text": "x" * 2000})
+    assert len(cache) == 1
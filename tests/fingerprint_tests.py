@@ -0,0 +1,88 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataclasses
+import enum
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel
+
+from utils.cache import cache_function
+from utils.fingerprint import fingerprint
+
+
+class LanguageOptions(enum.Enum):
+    # Mirrors functions_to_format.functions.general.const_values.LanguageOptions
+    RU = "ru"
+    UZ = "uz"
+
+
+class Item(BaseModel):
+    name: str
+    price: int
+    tags: List[str] = []
+
+
+class Listing(BaseModel):
+    items: List[Item]
+    language: LanguageOptions
+    note: Optional[str] = None
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    y: int
+
+
+def test_dict_order_does_not_matter():
+    assert fingerprint({"a": 1, "b": [1, 2]}) == fingerprint({"b": [1, 2], "a": 1})
+
+
+def test_type_tags_prevent_collisions():
+    values = [1, "1", 1.0, True, None, [1], {"1": 1}, [["a", 1]], {"a": 1}, b"1"]
+    assert len({fingerprint(v) for v in values}) == len(values)
+
+
+def test_models_enums_and_dataclasses():
+    listing = Listing(items=[Item(name="a", price=1)], language=LanguageOptions.UZ)
+    same = Listing(items=[Item(name="a", price=1)], language=LanguageOptions.UZ)
+    other = Listing(items=[Item(name="a", price=1)], language=LanguageOptions.RU)
+    assert fingerprint(listing) == fingerprint(same)
+    assert fingerprint(listing) != fingerprint(other)
+    assert fingerprint(Point(1, 2)) == fingerprint(Point(1, 2)) != fingerprint(Point(2, 1))
+
+
+def test_unknown_objects_raise():
+    with pytest.raises(TypeError):
+        fingerprint({"handler": object()})
+
+
+def test_cache_function_accepts_unhashable_arguments():
+    calls = []
+
+    @cache_function(enabled=True, backend="memory", ignore=["request_id"])
+    def render(items: List[Item], language: LanguageOptions, request_id: str = ""):
+        calls.append(request_id)
+        return [item.name for item in items]
+
+    items = [Item(name="a", price=1), Item(name="b", price=2)]
+    assert render(items, LanguageOptions.RU, request_id="1") == ["a", "b"]
+    assert render(list(items), LanguageOptions.RU, request_id="2") == ["a", "b"]
+    assert calls == ["1"]
+
+
+def test_cache_function_bypasses_unfingerprintable_arguments():
+    calls = []
+
+    @cache_function(enabled=True, backend="memory")
+    def render(obj):
+        calls.append(obj)
+        return "ok"
+
+    marker = object()
+    assert render(marker) == render(marker) == "ok"
+    assert len(calls) == 2
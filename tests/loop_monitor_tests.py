@@ -0,0 +1,68 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import time
+
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+from telemetry.loop_monitor import EventLoopMonitor
+
+
+def make_monitor(**kwargs):
+    reader = InMemoryMetricReader()
+    meter = MeterProvider(metric_readers=[reader]).get_meter("loop_monitor_tests")
+    return EventLoopMonitor(meter=meter, **kwargs), reader
+
+
+def collect(reader):
+    """Data points by metric name, from one collection (gauges reset when read)."""
+    data = reader.get_metrics_data()
+    if data is None:
+        return {}
+    return {
+        metric.name: list(metric.data.data_points)
+        for resource in data.resource_metrics
+        for scope in resource.scope_metrics
+        for metric in scope.metrics
+    }
+
+
+def run_blocking(monitor, block_s):
+    async def main():
+        await monitor.start()
+        await asyncio.sleep(0.03)
+        time.sleep(block_s)  # block the loop
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+
+    asyncio.run(main())
+
+
+def test_lag_is_sampled_and_max_stall_resets_on_read():
+    monitor, reader = make_monitor(interval_ms=10, stall_threshold_ms=10_000, snapshot_dir=None)
+    lags = []
+    monitor.add_lag_listener(lags.append)
+    run_blocking(monitor, 0.08)
+
+    assert max(lags) >= 60
+    metrics = collect(reader)
+    histogram = metrics["ui_server.event_loop.lag"][0]
+    assert histogram.count == len(lags) and histogram.max >= 60
+    assert metrics["ui_server.event_loop.max_stall"][0].value >= 60
+    assert "ui_server.event_loop.stalls" not in metrics
+    # Read once: the next collection starts from zero
+    assert collect(reader)["ui_server.event_loop.max_stall"][0].value == 0
+
+
+def test_stall_is_counted_once_with_a_stack_snapshot(tmp_path):
+    monitor, reader = make_monitor(interval_ms=10, stall_threshold_ms=50, snapshot_dir=str(tmp_path))
+    run_blocking(monitor, 0.3)
+
+    assert collect(reader)["ui_server.event_loop.stalls"][0].value == 1
+    with open(tmp_path / "stall-0000.txt", encoding="utf-8") as f:
+        snapshot = f.read()
+    assert "blocked_ms:" in snapshot and "run_blocking" in snapshot
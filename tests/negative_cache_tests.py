@@ -0,0 +1,67 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import structlog
+
+from utils.negative_cache import NegativeCache
+
+
+class FlakyHandler:
+    """Stands in for a FunctionStrategy with text_fallback = True."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.calls = 0
+
+    def build_widget_inputs(self, backend_output):
+        self.calls += 1
+        if backend_output.get("bad"):
+            raise ValueError("invalid backend_output")
+        if backend_output.get("bug"):
+            raise KeyError("handler bug")
+        return backend_output
+
+    def build_output(self, widget_inputs):
+        if widget_inputs.get("broken_widget"):
+            raise ValueError("widget builder failed")
+        return "widgets"
+
+    def __call__(self, backend_output):
+        return self.cache.run(
+            "FlakyHandler",
+            backend_output,
+            lambda: self.build_widget_inputs(backend_output),
+            self.build_output,
+            lambda: "text-only",
+            structlog.get_logger(),
+        )
+
+
+def test_invalid_payload_is_remembered_once_and_served_from_cache():
+    cache = NegativeCache(maxsize=100, ttl=60, enabled=True)
+    handler = FlakyHandler(cache)
+
+    assert handler({"bad": 1}) == "text-only"
+    assert len(cache.cache.cache) == 1
+    # Same payload: straight to the fallback, build_widget_inputs is not called
+    assert handler({"bad": 1}) == "text-only"
+    assert handler.calls == 1
+    assert len(cache.cache.cache) == 1
+
+    # A different payload is not affected
+    assert handler({"ok": 1}) == "widgets"
+    assert handler.calls == 2
+
+
+def test_handler_bugs_and_widget_failures_fall_back_but_are_not_remembered():
+    cache = NegativeCache(maxsize=100, ttl=60, enabled=True)
+    handler = FlakyHandler(cache)
+
+    assert handler({"bug": 1}) == "text-only"
+    assert handler({"bug": 1}) == "text-only"
+    assert handler({"broken_widget": 1}) == "text-only"
+    assert handler({"broken_widget": 1}) == "text-only"
+    assert handler.calls == 4
+    assert len(cache.cache.cache) == 0
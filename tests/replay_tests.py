@@ -0,0 +1,41 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+from fastapi import FastAPI
+
+from benchmarks.replay import ReplayItem, replay
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.post("/chat/v3/build_ui")
+    async def build_ui():
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    return app
+
+
+def run(**kwargs):
+    items = [ReplayItem("get_news", "ru", {"i": i}) for i in range(4)]
+    report = asyncio.run(replay(items, concurrency=1, app=make_app(), **kwargs))
+    return report["total"]["latency_ms"]
+
+
+def test_closed_loop_times_each_request_from_sending():
+    latency = run()
+    # Everything is released at start; waiting for the semaphore is not latency
+    assert latency["count"] == 4
+    assert latency["max"] < 180
+
+
+def test_open_loop_counts_time_queued_behind_slow_requests():
+    latency = run(rate=100)
+    # Scheduled every 10 ms but served one per 100 ms: the backlog is latency
+    assert latency["count"] == 4
+    assert latency["max"] > 300
@@ -0,0 +1,223 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import gc
+import time
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from utils.security import (
+    BodyLimitMiddleware,
+    InputRejected,
+    RateLimiter,
+    RateLimitMiddleware,
+    RedisRateLimiter,
+    body_limits_checked,
+    check_suspicious_patterns,
+    guard_raw_input,
+    parse_quotas,
+    validate_input,
+)
+
+
+def test_gcra_allows_burst_then_paces():
+    limiter = RateLimiter(max_requests=5, window=1, enabled=True)
+    assert [limiter.acquire("a")[0] for _ in range(5)] == [True] * 5
+    allowed, retry_after = limiter.acquire("a")
+    assert not allowed and 0 < retry_after <= 0.2
+    # Other keys have their own budget
+    assert limiter.check("b")
+    time.sleep(0.21)
+    assert limiter.check("a")
+
+
+def test_idle_keys_are_evicted():
+    limiter = RateLimiter(max_requests=1000, window=1, enabled=True)
+    for i in range(100):
+        limiter.acquire(f"client-{i}")
+    assert len(limiter) == 100
+    time.sleep(0.01)
+    assert limiter.evict_idle() == 100
+    assert len(limiter) == 0
+
+
+def test_middleware_returns_429_with_retry_after():
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return "pong"
+
+    @app.get("/health")
+    def health():
+        return "Ok"
+
+    limiter = RateLimiter(max_requests=2, window=60, enabled=True)
+    known_keys = {"key-1": {}, "key-2": {}}
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, authenticate=known_keys.get)
+    client = TestClient(app)
+
+    headers = {"X-Api-Key": "key-1"}
+    assert [client.get("/ping", headers=headers).status_code for _ in range(2)] == [200, 200]
+    rejected = client.get("/ping", headers=headers)
+    assert rejected.status_code == 429
+    assert int(rejected.headers["retry-after"]) == 30
+    # Keyed per api key, and health checks are exempt
+    assert client.get("/ping", headers={"X-Api-Key": "key-2"}).status_code == 200
+    assert client.get("/health", headers=headers).status_code == 200
+
+
+def test_unknown_api_keys_are_limited_per_ip():
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return "pong"
+
+    limiter = RateLimiter(max_requests=2, window=60, enabled=True)
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, authenticate=lambda key: None)
+    client = TestClient(app)
+
+    statuses = [
+        client.get("/ping", headers={"X-Api-Key": f"rotated-{i}"}).status_code for i in range(5)
+    ]
+    assert statuses == [200, 200, 429, 429, 429]
+    assert client.get("/ping?api_key=another").status_code == 429
+
+
+def test_per_api_key_quotas():
+    quotas = parse_quotas("partner=10/1:10,broken=abc")
+    assert quotas == {"key:partner": (10, 1, 10)}
+    limiter = RateLimiter(max_requests=1, window=60, enabled=True, quotas=quotas)
+    assert sum(limiter.acquire("key:partner")[0] for _ in range(12)) == 10
+    assert sum(limiter.acquire("key:other")[0] for _ in range(3)) == 1
+
+
+def test_redis_limiter_falls_back_to_local_limits():
+    import redis
+
+    # Nothing listens on port 1: every Redis call fails fast
+    offline = dict(port=1, socket_connect_timeout=0.05, socket_timeout=0.05)
+    limiter = RedisRateLimiter(
+        max_requests=2,
+        window=60,
+        enabled=True,
+        client=redis.Redis(**offline),
+        async_client=redis.asyncio.Redis(**offline),
+    )
+    decisions = [limiter.acquire("key:a")[0] for _ in range(3)]
+    assert decisions == [True, True, False]
+    # The failure is remembered: later checks skip Redis for a while
+    assert limiter._redis_down_until > time.monotonic()
+
+
+def test_redis_limiter_uses_one_async_client_per_loop():
+    import redis
+
+    limiter = RedisRateLimiter(max_requests=2, window=60, enabled=True, client=redis.Redis(port=1))
+
+    async def script():
+        return limiter._async_script()
+
+    async def same_loop():
+        return limiter._async_script() is await script()
+
+    assert asyncio.run(same_loop())
+    first = asyncio.run(script())
+    second = asyncio.run(script())
+    # A new loop never gets a client bound to a closed one
+    assert first.registered_client is not second.registered_client
+    del first, second
+    gc.collect()
+    assert len(limiter._async_scripts) == 0
+
+
+def test_redis_limiter_shares_budget_between_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # fakeredis needs it for EVAL
+    server = fakeredis.FakeServer()
+
+    def worker():
+        return RedisRateLimiter(
+            max_requests=3,
+            window=60,
+            enabled=True,
+            client=fakeredis.FakeRedis(server=server),
+            async_client=fakeredis.FakeAsyncRedis(server=server),
+        )
+
+    first, second = worker(), worker()
+    decisions = [limiter.acquire("key:a")[0] for limiter in (first, second, first, second)]
+    assert decisions == [True, True, True, False]
+    allowed, retry_after = asyncio.run(second.aacquire("key:a"))
+    assert not allowed and 0 < retry_after <= 20
+
+
+def test_raw_guard_checks_size_depth_and_string_leaves():
+    with pytest.raises(InputRejected) as e:
+        guard_raw_input(b'{"a": "' + b"x" * 100 + b'"}', max_size=50)
+    assert e.value.status_code == 413
+    with pytest.raises(InputRejected) as e:
+        guard_raw_input(b'{"a": ' + b"[" * 30 + b"]" * 30 + b"}", max_depth=20)
+    assert e.value.status_code == 413
+    # Limits the middleware already enforced are not checked again
+    guard_raw_input(b'{"a": ' + b"[" * 30 + b"]" * 30 + b"}", max_depth=20, checked=(100, 20))
+    # Brackets and escaped quotes inside strings are not structure
+    guard_raw_input(b'{"a": "[[[[[[\\" [[[["}', max_depth=2)
+    with pytest.raises(InputRejected):
+        guard_raw_input(b'{"llm_output": "\\u003cScript>"}', pattern_action="reject")
+    guard_raw_input(b'{"llm_output": "<script>"}', pattern_action="log")
+
+
+def test_raw_guard_screens_string_values_not_keys():
+    # Benign payloads whose key names match a pattern
+    guard_raw_input(b'{"backend_output": {"prototype": "v2", "constructor" : "Acme"}}', pattern_action="reject")
+    guard_raw_input(b'{"\\u003cscript": 1}', pattern_action="reject")
+    with pytest.raises(InputRejected) as e:
+        guard_raw_input(b'{"prototype": ["see __proto__"]}', pattern_action="reject")
+    assert e.value.status_code == 400
+    # check_suspicious_patterns keeps scanning keys, as it does for parsed data
+    assert not check_suspicious_patterns(b'{"constructor": "Acme"}')
+
+
+def test_validate_input_walks_tree_without_recursion():
+    deep = []
+    for _ in range(10_000):
+        deep = [deep]
+    assert not validate_input({"backend_output": deep})
+    assert not validate_input({"text": ["ok", {"k": "javascript:alert(1)"}]})
+    assert validate_input({"text": ["ok", {"k": 1, "v": None}]})
+
+
+def test_body_limit_middleware_rejects_before_parsing():
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        return {"size": len(await request.body()), "checked": body_limits_checked(request.scope)}
+
+    app.add_middleware(
+        BodyLimitMiddleware, default_limit=100, routes="/upload=1000", max_depth=5
+    )
+    client = TestClient(app)
+
+    assert client.post("/echo", content=b"x" * 100).json() == {"size": 100}
+    # Declared Content-Length, then a chunked body without one
+    assert client.post("/echo", content=b"x" * 101).status_code == 413
+    chunks = (b"x" * 40 for _ in range(3))
+    assert client.post("/echo", content=chunks).status_code == 413
+    assert client.post("/upload", content=b"x" * 500).json() == {"size": 500, "checked": [1000, None]}
+    assert client.post("/upload", json={}).json()["checked"] == [1000, 5]
+    nested = client.post("/echo", json=[[[[[[1]]]]]])
+    assert nested.status_code == 413
+    assert nested.json() == {"detail": "Request body nested too deeply"}
+    assert client.post("/echo", json=["[[[[[[[["]).status_code == 200
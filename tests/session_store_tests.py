@@ -0,0 +1,149 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import time
+
+import pytest
+
+from utils.session_store import (
+    MemorySessionStore,
+    RedisSessionStore,
+    SessionStore,
+    SqliteSessionStore,
+)
+
+
+def make_store(backend, tmp_path, ttl=60):
+    if backend == "memory":
+        return MemorySessionStore(maxsize=2, ttl=ttl)
+    if backend == "sqlite":
+        return SqliteSessionStore(str(tmp_path / "sessions.sqlite3"), ttl=ttl, poll_ms=10)
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisSessionStore(ttl=ttl, prefix="test:session:", client=fakeredis.FakeAsyncRedis())
+
+
+BACKENDS = ["memory", "sqlite", "redis"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_state_and_items_round_trip(backend, tmp_path):
+    store = make_store(backend, tmp_path)
+
+    async def main():
+        await store.set("agent:a", {"run_id": 1, "is_running": True})
+        assert await store.append("agent:a", "step one") == 1
+        assert await store.append("agent:a", "step two") == 2
+        assert await store.items("agent:a", 1) == ["step two"]
+        state = await store.get("agent:a")
+        await store.set("agent:a", {"run_id": 2}, clear_items=True)
+        return state, await store.items("agent:a"), await store.get("agent:missing")
+
+    state, items, missing = asyncio.run(main())
+    assert state == {"run_id": 1, "is_running": True}
+    assert items == [] and missing is None
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_sessions_expire_after_ttl(backend, tmp_path):
+    store = make_store(backend, tmp_path, ttl=0.05)
+
+    async def main():
+        await store.set("agent:a", {"run_id": 1})
+        await store.append("agent:a", "step one")
+        await asyncio.sleep(0.1)
+        return await store.get("agent:a"), await store.items("agent:a")
+
+    assert asyncio.run(main()) == (None, [])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_published_events_reach_listeners(backend, tmp_path):
+    store = make_store(backend, tmp_path)
+    received = []
+    store.add_listener(lambda key, event: received.append((key, event)))
+
+    async def main():
+        await store.start()
+        try:
+            # Give the pub/sub subscription time to attach
+            await asyncio.sleep(0.05)
+            await store.publish("agent:a", {"id": 1, "type": "step"})
+            deadline = time.monotonic() + 2
+            while not received and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+        finally:
+            await store.stop()
+
+    asyncio.run(main())
+    assert received == [("agent:a", {"id": 1, "type": "step"})]
+
+
+def test_memory_store_is_bounded(tmp_path):
+    store = make_store("memory", tmp_path)
+
+    async def main():
+        for key in ("a", "b", "c"):
+            await store.set(key, {"key": key})
+        return await store.get("a"), len(store)
+
+    assert asyncio.run(main()) == (None, 2)
+
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    producer = SqliteSessionStore(path, poll_ms=10)
+    consumer = SqliteSessionStore(path, poll_ms=10)
+    received = []
+    consumer.add_listener(lambda key, event: received.append(event))
+
+    async def main():
+        await consumer.start()
+        try:
+            await asyncio.sleep(0.03)
+            await producer.set("agent:a", {"run_id": 1})
+            await producer.append("agent:a", "step one")
+            await producer.publish("agent:a", {"id": 1, "type": "step"})
+            deadline = time.monotonic() + 2
+            while not received and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            return await consumer.get("agent:a"), await consumer.items("agent:a")
+        finally:
+            await consumer.stop()
+
+    assert asyncio.run(main()) == ({"run_id": 1}, ["step one"])
+    assert received == [{"id": 1, "type": "step"}]
+
+
+def test_partial_backends_fail_when_built():
+    class GetOnly(SessionStore):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+
+
+def test_redis_listener_skips_malformed_events(tmp_path):
+    store = make_store("redis", tmp_path)
+    received = []
+    store.add_listener(lambda key, event: received.append((key, event)))
+
+    async def main():
+        await store.start()
+        try:
+            await asyncio.sleep(0.05)
+            for bad in ("not json", '{"key": "agent:a"}', "[1, 2]"):
+                await store.client.publish(store.channel, bad)
+            await store.publish("agent:a", {"id": 1, "type": "step"})
+            deadline = time.monotonic() + 2
+            while not received and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            return store._task.done()
+        finally:
+            await store.stop()
+
+    assert asyncio.run(main()) is False
+    assert received == [("agent:a", {"id": 1, "type": "step"})]
@@ -0,0 +1,50 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.slow_requests import SlowRequestRecorder, parse_thresholds
+
+
+def make_recorder(directory, capacity=3):
+    return SlowRequestRecorder(
+        directory=str(directory),
+        capacity=capacity,
+        default_threshold_ms=1000,
+        thresholds=parse_thresholds("human_approval_request=300,broken=abc,=5"),
+    )
+
+
+def capture(recorder, i):
+    return recorder.capture({"function_name": "get_news", "i": i}, "ru", {"total_ms": 1500}, f"req-{i}")
+
+
+def test_threshold_per_function():
+    recorder = make_recorder("unused")
+    assert recorder.thresholds == {"human_approval_request": 300}
+    assert recorder.should_capture("human_approval_request", 300)
+    assert not recorder.should_capture("human_approval_request", 299)
+    assert not recorder.should_capture("get_news", 999)
+    assert recorder.should_capture("get_news", 1000)
+    recorder.enabled = False
+    assert not recorder.should_capture("get_news", 5000)
+
+
+def test_slots_rotate_and_restart_continues_after_newest(tmp_path):
+    recorder = make_recorder(tmp_path)
+    paths = [capture(recorder, i) for i in range(5)]
+    assert [os.path.basename(p) for p in paths] == [
+        "slot-0000.json", "slot-0001.json", "slot-0002.json", "slot-0000.json", "slot-0001.json"
+    ]
+    # Disk use stays at capacity and the oldest captures were overwritten
+    captures = recorder.list_captures()
+    assert len(captures) == 3
+    assert sorted(c["input"]["i"] for c in captures) == [2, 3, 4]
+    assert recorder.captured == 5
+
+    # Make slot 1 unambiguously the newest, whatever the filesystem's mtime resolution
+    newest = os.path.join(tmp_path, "slot-0001.json")
+    stamp = os.path.getmtime(newest) + 10
+    os.utime(newest, (stamp, stamp))
+    restarted = make_recorder(tmp_path)
+    assert os.path.basename(capture(restarted, 5)) == "slot-0002.json"
@@ -0,0 +1,66 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+
+import utils.users as users
+from utils.users import ApiKeyStore
+
+
+def write_keys(path, keys):
+    path.write_text(json.dumps(keys))
+    # Make the change visible even on filesystems with coarse mtimes
+    stamp = time.time_ns() + 10**9 * len(keys)
+    os.utime(path, ns=(stamp, stamp))
+
+
+def test_authenticate_uses_digest_index_and_reloads_on_change(tmp_path):
+    path = tmp_path / "api_keys.json"
+    write_keys(path, {"key-1": {"user": "a"}})
+    store = ApiKeyStore(str(path), check_interval=0)
+
+    assert store.authenticate("key-1") == {"user": "a"}
+    assert store.authenticate("key-2") is None
+    assert store.authenticate("") is None
+    assert "key-1" not in store._state[1]
+
+    write_keys(path, {"key-1": {"user": "a"}, "key-2": {}})
+    assert store.authenticate("key-2") == {}
+    assert len(store) == 2
+    # Unchanged file: no rebuild
+    assert not store.reload()
+
+
+def test_failed_reload_keeps_previous_keys(tmp_path):
+    path = tmp_path / "api_keys.json"
+    write_keys(path, {"key-1": {"user": "a"}})
+    store = ApiKeyStore(str(path), check_interval=3600)
+    assert store.authenticate("key-1") is not None
+
+    path.write_text("{not json")
+    assert not store.reload(force=True, trigger="signal")
+    assert store.authenticate("key-1") == {"user": "a"}
+    os.remove(path)
+    assert not store.reload(force=True)
+    assert store.authenticate("key-1") == {"user": "a"}
+
+
+def test_emptied_file_revokes_keys_and_failures_are_retried(tmp_path, monkeypatch):
+    path = tmp_path / "api_keys.json"
+    write_keys(path, {"key-1": {"user": "a"}})
+    store = ApiKeyStore(str(path), check_interval=0)
+    assert store.authenticate("key-1") is not None
+
+    write_keys(path, {})
+    assert store.authenticate("key-1") is None
+    assert len(store) == 0
+
+    # A transient failure is not remembered for this (mtime, size)
+    write_keys(path, {"key-2": {}, "key-3": {}})
+    monkeypatch.setattr(users, "check_memory_usage", lambda: False)
+    assert store.authenticate("key-2") is None
+    monkeypatch.undo()
+    assert store.authenticate("key-2") == {}
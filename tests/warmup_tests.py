@@ -0,0 +1,92 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import time
+
+from utils.warmup import (
+    WarmupState,
+    iter_recent_usage,
+    run_startup_warmup,
+    select_top_requests,
+)
+
+
+def write_usage(directory, chat_id, contexts, timestamp=None):
+    with open(os.path.join(directory, f"{chat_id}.jsonl"), "a") as f:
+        for context in contexts:
+            record = {"timestamp": timestamp or time.time(), "context": context, "output": {}}
+            f.write(json.dumps(record) + "\n")
+
+
+def usage_context(function_name, language="ru", backend_output=None):
+    return {
+        "chat_id": "chat",
+        "llm_output": "",
+        "backend_output": backend_output or {},
+        "version": "v3",
+        "language": language,
+        "api_key": "key",
+        "request_id": os.urandom(4).hex(),
+        "function_name": function_name,
+    }
+
+
+def test_select_top_requests_ranks_cacheable_fingerprints(tmp_path):
+    categories = usage_context("get_categories", backend_output={"categories": [1]})
+    write_usage(tmp_path, "chat-a", [categories] * 3 + [usage_context("start_page_widget")])
+    write_usage(tmp_path, "chat-b", [usage_context("send_money_to_someone_via_card")] * 5)
+    write_usage(tmp_path, "benchmark-synthetic", [usage_context("start_page_widget")] * 9)
+    write_usage(tmp_path, "chat-old", [categories], timestamp=time.time() - 7200)
+
+    records = iter_recent_usage(str(tmp_path), max_age_s=3600)
+    cacheable = {"get_categories", "start_page_widget"}.__contains__
+    top = select_top_requests(records, cacheable, top_n=5)
+
+    assert [r["function_name"] for r in top] == ["get_categories", "start_page_widget"]
+    assert top[0]["backend_output"] == {"categories": [1]}
+    assert top[0]["language"] == "ru"
+
+
+def test_startup_warmup_is_time_boxed_and_marks_ready(tmp_path):
+    state = WarmupState(enabled=True)
+    seen = {}
+
+    async def render(requests, deadline):
+        seen["requests"] = requests
+        seen["deadline"] = deadline
+        return {"rendered": len(requests)}
+
+    assert not state.ready
+    summary = asyncio.run(
+        run_startup_warmup(
+            render, lambda name: True, state=state, timeout_s=5, usage_dir=str(tmp_path)
+        )
+    )
+    assert state.ready
+    # No usage history: the shipped fixture list is used
+    assert summary["source"] == "fixtures"
+    assert summary["rendered"] == len(seen["requests"]) > 0
+    assert seen["deadline"] > time.monotonic()
+
+
+def test_hanging_render_is_cut_off_at_the_timeout(tmp_path):
+    state = WarmupState(enabled=True)
+
+    async def render(requests, deadline):
+        # Ignores the deadline, like a render stuck in one slow request
+        await asyncio.sleep(60)
+        return {}
+
+    started = time.monotonic()
+    summary = asyncio.run(
+        run_startup_warmup(
+            render, lambda name: True, state=state, timeout_s=0.1, usage_dir=str(tmp_path)
+        )
+    )
+    assert time.monotonic() - started < 5
+    assert state.ready
+    assert summary["status"] == "timeout"
@@ -0,0 +1,210 @@
+import os
+import time
+import fnmatch
+from typing import Any, Dict, Optional, Tuple
+from opentelemetry import metrics as otel_metrics
+
+"""
+This code provides:
+- Admission control for /chat/v3/build_ui under overload. Three signals are
+  watched: requests in flight, queue wait (arrival at the ASGI app until the
+  handler is entered, minus the body upload) and event loop lag (fed by the
+  EventLoopMonitor of telemetry.loop_monitor, so it needs
+  LOOP_MONITOR_ENABLED).
+- Past the degrade thresholds, requests get the text-only output
+  (FunctionStrategy text fallback) instead of the widget pipeline, and
+  low-priority functions (activity records, ADMISSION_LOW_PRIORITY) are
+  rejected. Past the reject thresholds every request is rejected with 503.
+- Queue wait and loop lag rise immediately and decay by half per sample, so
+  one spike sheds load for a short while instead of flapping.
+- AdmissionMiddleware, which stamps arrival and the body upload and counts
+  in-flight requests for the guarded paths; handlers stamp their entry with
+  AdmissionController.mark_entered(). Middlewares that buffer the body
+  (BodyLimitMiddleware) read it straight away, so the upload is subtracted
+  rather than ending the wait: upload time of slow clients is not queue wait.
+- Metrics: ui_server.admission.decisions (by decision, reason and function)
+  and ui_server.admission.in_flight.
+"""
+
+# Step 1: Load environment variables for admission control
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_PATHS = os.environ.get("ADMISSION_PATHS", "/chat/v3/build_ui")
+ADMISSION_DEGRADE_IN_FLIGHT = int(os.environ.get("ADMISSION_DEGRADE_IN_FLIGHT", 64))
+ADMISSION_REJECT_IN_FLIGHT = int(os.environ.get("ADMISSION_REJECT_IN_FLIGHT", 256))
+ADMISSION_DEGRADE_QUEUE_WAIT_MS = float(os.environ.get("ADMISSION_DEGRADE_QUEUE_WAIT_MS", 250))
+ADMISSION_REJECT_QUEUE_WAIT_MS = float(os.environ.get("ADMISSION_REJECT_QUEUE_WAIT_MS", 2000))
+ADMISSION_DEGRADE_LOOP_LAG_MS = float(os.environ.get("ADMISSION_DEGRADE_LOOP_LAG_MS", 100))
+ADMISSION_REJECT_LOOP_LAG_MS = float(os.environ.get("ADMISSION_REJECT_LOOP_LAG_MS", 1000))
+ADMISSION_RETRY_AFTER_S = int(os.environ.get("ADMISSION_RETRY_AFTER_S", 1))
+# Functions shed first (fnmatch patterns): rejected as soon as degradation starts
+ADMISSION_LOW_PRIORITY = os.environ.get(
+    "ADMISSION_LOW_PRIORITY",
+    "function_call_activity_record,function_response_activity_record",
+)
+
+ADMIT = "admit"
+DEGRADE = "degrade"
+REJECT = "reject"
+
+_ARRIVED_KEY = "admission_arrived"
+_STARTED_KEY = "admission_started"
+_READ_KEY = "admission_read"
+_ENTERED_KEY = "admission_entered"
+
+
+# Step 2: Admission controller
+class AdmissionController:
+    def __init__(
+        self,
+        degrade: Tuple[int, float, float] = (
+            ADMISSION_DEGRADE_IN_FLIGHT,
+            ADMISSION_DEGRADE_QUEUE_WAIT_MS,
+            ADMISSION_DEGRADE_LOOP_LAG_MS,
+        ),
+        reject: Tuple[int, float, float] = (
+            ADMISSION_REJECT_IN_FLIGHT,
+            ADMISSION_REJECT_QUEUE_WAIT_MS,
+            ADMISSION_REJECT_LOOP_LAG_MS,
+        ),
+        low_priority: str = ADMISSION_LOW_PRIORITY,
+        enabled: bool = ADMISSION_ENABLED,
+    ):
+        # (in_flight, queue_wait_ms, loop_lag_ms); 0 disables a threshold
+        self.degrade = degrade
+        self.reject = reject
+        self.patterns = [p.strip() for p in low_priority.split(",") if p.strip()]
+        self.enabled = enabled
+        self.in_flight = 0
+        self.queue_wait_ms = 0.0
+        self.loop_lag_ms = 0.0
+        self._low_priority: Dict[str, bool] = {}
+
+    def is_low_priority(self, function_name: str) -> bool:
+        low = self._low_priority.get(function_name)
+        if low is None:
+            low = any(fnmatch.fnmatchcase(function_name, p) for p in self.patterns)
+            self._low_priority[function_name] = low
+        return low
+
+    @staticmethod
+    def _smooth(current: float, sample: float) -> float:
+        # Rise at once, decay by half per sample
+        return sample if sample >= current else (current + sample) / 2
+
+    def observe_queue_wait(self, queued_ms: float):
+        self.queue_wait_ms = self._smooth(self.queue_wait_ms, queued_ms)
+
+    def observe_loop_lag(self, lag_ms: float):
+        # Registered with EventLoopMonitor.add_lag_listener()
+        self.loop_lag_ms = self._smooth(self.loop_lag_ms, lag_ms)
+
+    @staticmethod
+    def _exceeded(limits: Tuple[int, float, float], signals: Tuple[float, float, float]) -> Optional[str]:
+        for name, limit, value in zip(("in_flight", "queue_wait", "loop_lag"), limits, signals):
+            if limit and value >= limit:
+                return name
+        return None
+
+    def pressure(self) -> Tuple[str, str]:
+        """Current (level, reason): level is ADMIT, DEGRADE or REJECT."""
+        signals = (self.in_flight, self.queue_wait_ms, self.loop_lag_ms)
+        reason = self._exceeded(self.reject, signals)
+        if reason:
+            return REJECT, reason
+        reason = self._exceeded(self.degrade, signals)
+        if reason:
+            return DEGRADE, reason
+        return ADMIT, "none"
+
+    def decide(self, function_name: str, queued_ms: float = 0.0) -> str:
+        """ADMIT (full render), DEGRADE (text-only output) or REJECT (503)."""
+        if not self.enabled:
+            return ADMIT
+        self.observe_queue_wait(queued_ms)
+        level, reason = self.pressure()
+        decision = level
+        if level == DEGRADE and self.is_low_priority(function_name):
+            decision = REJECT
+        _decisions.add(1, {"decision": decision, "reason": reason, "function": function_name})
+        return decision
+
+    @staticmethod
+    def mark_entered(scope: Dict[str, Any]):
+        """Called by handlers on entry: ends the queue wait."""
+        state = scope.get("state")
+        if state is not None and _ARRIVED_KEY in state:
+            state.setdefault(_ENTERED_KEY, time.perf_counter())
+
+    @staticmethod
+    def queued_ms(scope: Dict[str, Any]) -> float:
+        """
+        Milliseconds from AdmissionMiddleware seeing the request until the handler
+        was entered (until now without mark_entered), not counting the body
+        upload; 0 without the middleware.
+        """
+        state = scope.get("state", {})
+        arrived = state.get(_ARRIVED_KEY)
+        if arrived is None:
+            return 0.0
+        entered = state.get(_ENTERED_KEY)
+        if entered is None:
+            entered = time.perf_counter()
+        upload = 0.0
+        started = state.get(_STARTED_KEY)
+        if started is not None and started < entered:
+            # Only the part of the upload that happened before the handler
+            upload = min(state.get(_READ_KEY, entered), entered) - started
+        return max(entered - arrived - upload, 0.0) * 1000
+
+
+# Step 3: ASGI middleware counting in-flight requests and stamping the upload
+class AdmissionMiddleware:
+    def __init__(self, app, controller: Optional[AdmissionController] = None, paths: str = ADMISSION_PATHS):
+        self.app = app
+        self.controller = controller if controller is not None else admission_controller
+        self.paths = frozenset(p.strip() for p in paths.split(",") if p.strip())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        state = scope.setdefault("state", {})
+        state[_ARRIVED_KEY] = time.perf_counter()
+
+        async def stamped_receive():
+            if _STARTED_KEY not in state:
+                state[_STARTED_KEY] = time.perf_counter()
+            message = await receive()
+            if (
+                _READ_KEY not in state
+                and message["type"] == "http.request"
+                and not message.get("more_body", False)
+            ):
+                state[_READ_KEY] = time.perf_counter()
+            return message
+
+        controller = self.controller
+        controller.in_flight += 1
+        try:
+            await self.app(scope, stamped_receive, send)
+        finally:
+            controller.in_flight -= 1
+
+
+# Step 4: Global controller and its metrics
+admission_controller = AdmissionController()
+
+_meter = otel_metrics.get_meter(__name__)
+_decisions = _meter.create_counter(
+    name="ui_server.admission.decisions",
+    description="Admission decisions (admit, degrade, reject) by the signal that triggered them",
+    unit="1",
+)
+_meter.create_observable_gauge(
+    name="ui_server.admission.in_flight",
+    callbacks=[
+        lambda options: [otel_metrics.Observation(admission_controller.in_flight)]
+    ],
+    description="Requests in flight on admission-controlled paths",
+    unit="1",
+)
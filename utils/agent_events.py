@@ -0,0 +1,167 @@
+import os
+import json
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional, Set
+from opentelemetry import metrics as otel_metrics
+
+"""
+This code provides:
+- A fan-out broker for agent progress events: one producer publishes per
+  session, every subscriber of that session gets its own bounded queue.
+- Slow subscribers never block the producer: when a queue is full the oldest
+  event is dropped and the subscriber is marked lagged, then catches up from
+  the session's message history instead of from the queue.
+- iter_session_events(), shared by the SSE and WebSocket endpoints: replay
+  from a cursor (Last-Event-ID / since_step), live events, heartbeats.
+- Metrics: ui_server.agent_events.subscribers and
+  ui_server.agent_events.dropped.
+"""
+
+# Step 1: Load environment variables for the push channel
+AGENT_EVENTS_QUEUE_SIZE = int(os.environ.get("AGENT_EVENTS_QUEUE_SIZE", 32))
+AGENT_EVENTS_MAX_SUBSCRIBERS = int(os.environ.get("AGENT_EVENTS_MAX_SUBSCRIBERS", 1000))
+AGENT_EVENTS_HEARTBEAT_S = float(os.environ.get("AGENT_EVENTS_HEARTBEAT_S", 15))
+AGENT_EVENTS_MAX_STREAM_S = float(os.environ.get("AGENT_EVENTS_MAX_STREAM_S", 600))
+# Reconnect delay suggested to EventSource clients
+AGENT_EVENTS_RETRY_MS = int(os.environ.get("AGENT_EVENTS_RETRY_MS", 2000))
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+# Step 2: Broker
+class Subscription:
+    def __init__(self, topic: str, maxsize: int):
+        self.topic = topic
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(max(maxsize, 1))
+        self.lagged = False
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        """Queue ``event``, dropping the oldest one when full."""
+        dropped = False
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.lagged = dropped = True
+        self.queue.put_nowait(event)
+        return not dropped
+
+
+class EventBroker:
+    def __init__(
+        self,
+        queue_size: int = AGENT_EVENTS_QUEUE_SIZE,
+        max_subscribers: int = AGENT_EVENTS_MAX_SUBSCRIBERS,
+    ):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.topics: Dict[str, Set[Subscription]] = {}
+        self.subscriber_count = 0
+
+    @property
+    def full(self) -> bool:
+        return self.subscriber_count >= self.max_subscribers
+
+    def subscribe(self, topic: str) -> Subscription:
+        if self.full:
+            raise TooManySubscribers(f"{self.subscriber_count} subscribers already connected")
+        subscription = Subscription(topic, self.queue_size)
+        self.topics.setdefault(topic, set()).add(subscription)
+        self.subscriber_count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self.topics.get(subscription.topic)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        self.subscriber_count -= 1
+        if not subscribers:
+            del self.topics[subscription.topic]
+
+    def publish(self, topic: str, event: Dict[str, Any]) -> int:
+        """Hand ``event`` to every subscriber of ``topic``; never blocks."""
+        subscribers = self.topics.get(topic)
+        if not subscribers:
+            return 0
+        for subscription in subscribers:
+            if not subscription.offer(event):
+                _dropped.add(1)
+        return len(subscribers)
+
+
+# Step 3: Event stream shared by SSE and WebSocket
+async def iter_session_events(
+    sessions: Any,
+    session_id: str,
+    cursor: int = 0,
+    heartbeat_s: float = AGENT_EVENTS_HEARTBEAT_S,
+    max_stream_s: float = AGENT_EVENTS_MAX_STREAM_S,
+) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """
+    Yield the session's events after ``cursor``, then live ones until the run
+    completes. ``None`` is a heartbeat. Events carry ``id`` = step number, so
+    a reconnecting client resumes with the last id it saw. ``sessions`` is
+    the AgentSessions of utils.agent_sessions.
+    """
+    broker: EventBroker = sessions.broker
+    # Subscribe before replaying, so nothing published in between is lost
+    subscription = broker.subscribe(sessions.topic(session_id))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_stream_s
+    try:
+        cursor, replay = await sessions.events_since(session_id, cursor)
+        while True:
+            for event in replay:
+                if event["type"] == "step" and event["id"] <= cursor:
+                    continue  # already sent by the replay
+                cursor = event["id"]
+                yield event
+                if event["type"] == "complete":
+                    return
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), min(heartbeat_s, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield None
+                replay = []
+                continue
+            if subscription.lagged:
+                # Events were dropped: rebuild from the session's history
+                subscription.lagged = False
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                cursor, replay = await sessions.events_since(session_id, cursor)
+            else:
+                replay = [event]
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def format_sse(event: Optional[Dict[str, Any]]) -> str:
+    if event is None:
+        return ": heartbeat\n\n"
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+# Step 4: Global broker and its metrics
+agent_event_broker = EventBroker()
+
+_meter = otel_metrics.get_meter(__name__)
+_dropped = _meter.create_counter(
+    name="ui_server.agent_events.dropped",
+    description="Agent events dropped from full subscriber queues",
+    unit="1",
+)
+_meter.create_observable_gauge(
+    name="ui_server.agent_events.subscribers",
+    callbacks=[
+        lambda options: [otel_metrics.Observation(agent_event_broker.subscriber_count)]
+    ],
+    description="Connected agent progress subscribers (SSE and WebSocket)",
+    unit="1",
+)
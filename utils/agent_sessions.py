@@ -0,0 +1,169 @@
+import os
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from utils.agent_events import EventBroker, agent_event_broker
+from utils.session_store import SessionStore, session_store
+
+"""
+This code provides:
+- Per-session agent progress state (messages, running/complete flags, result),
+  keyed by a session or chat id instead of one process-wide dict.
+- Storage in the shared session store (utils.session_store), so any worker
+  can answer a poll for a run started on another one; sessions expire after
+  SESSION_STORE_TTL seconds without writes.
+- Long-poll support: wait_for_update() returns as soon as a step newer than
+  the caller's cursor arrives, the run finishes, or the timeout elapses.
+- Every change is published through the store and lands in the local
+  EventBroker (utils.agent_events) of each worker for the push channel.
+"""
+
+# Step 1: Load environment variables for agent session configuration
+AGENT_LONG_POLL_MAX_S = float(os.environ.get("AGENT_LONG_POLL_MAX_S", 30))
+
+DEFAULT_SESSION_ID = "default"
+
+
+def _idle_state() -> Dict[str, Any]:
+    return {
+        "run_id": 0,
+        "is_running": False,
+        "is_complete": False,
+        "result": None,
+        "started_at": None,
+    }
+
+
+# Step 2: Agent sessions over the session store
+class AgentSessions:
+    def __init__(self, store: SessionStore, broker: EventBroker):
+        self.store = store
+        self.broker = broker
+        store.add_listener(broker.publish)
+
+    @staticmethod
+    def topic(session_id: str) -> str:
+        return f"agent:{session_id}"
+
+    async def _state(self, session_id: str) -> Dict[str, Any]:
+        return await self.store.get(self.topic(session_id)) or _idle_state()
+
+    async def _replace(self, session_id: str, state: Dict[str, Any], event: Dict[str, Any]):
+        key = self.topic(session_id)
+        await self.store.set(key, state, clear_items=True)
+        await self.store.publish(key, event)
+
+    async def start(self, session_id: str) -> int:
+        """Begin a new run; returns its run id, which producers must pass back."""
+        state = await self._state(session_id)
+        run_id = state["run_id"] + 1
+        started_at = datetime.now().isoformat()
+        await self._replace(
+            session_id,
+            {**_idle_state(), "run_id": run_id, "is_running": True, "started_at": started_at},
+            {"id": 0, "type": "start", "started_at": started_at},
+        )
+        return run_id
+
+    async def reset(self, session_id: str):
+        state = await self.store.get(self.topic(session_id))
+        if state is None:
+            return
+        # Bumping run_id stops the producer of the current run
+        await self._replace(
+            session_id,
+            {**_idle_state(), "run_id": state["run_id"] + 1},
+            {"id": 0, "type": "reset"},
+        )
+
+    async def is_current(self, session_id: str, run_id: int) -> bool:
+        return (await self._state(session_id))["run_id"] == run_id
+
+    async def add_step(self, session_id: str, run_id: int, text: str) -> Optional[Dict[str, Any]]:
+        """Record a step of ``run_id``; None when that run was reset or replaced."""
+        if not await self.is_current(session_id, run_id):
+            return None
+        key = self.topic(session_id)
+        message = {"step": await self.store.append(key, text), "text": text}
+        await self.store.publish(key, _step_event(message))
+        return message
+
+    async def complete(self, session_id: str, run_id: int, result: str) -> bool:
+        state = await self._state(session_id)
+        if state["run_id"] != run_id:
+            return False
+        key = self.topic(session_id)
+        await self.store.set(key, {**state, "is_running": False, "is_complete": True, "result": result})
+        last_step = len(await self.store.items(key))
+        await self.store.publish(key, {"id": last_step, "type": "complete", "result": result})
+        return True
+
+    async def snapshot(self, session_id: str, since_step: int = 0) -> Dict[str, Any]:
+        state = await self._state(session_id)
+        texts = await self.store.items(self.topic(session_id))
+        return {
+            "session_id": session_id,
+            "messages": _messages(texts, since_step),
+            "last_step": len(texts),
+            "is_running": state["is_running"],
+            "is_complete": state["is_complete"],
+            "result": state["result"],
+            "started_at": state["started_at"],
+        }
+
+    async def events_since(self, session_id: str, cursor: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Push-channel events a client with ``cursor`` has missed, and the cursor
+        they apply to: a cursor past the last step belongs to an earlier run.
+        """
+        snapshot = await self.snapshot(session_id)
+        if cursor > snapshot["last_step"]:
+            cursor = 0
+        events = [_step_event(m) for m in snapshot["messages"][max(cursor, 0):]]
+        if snapshot["is_complete"]:
+            events.append({"id": snapshot["last_step"], "type": "complete", "result": snapshot["result"]})
+        return cursor, events
+
+    async def _snapshot_after(self, session_id: str, since_step: int) -> Tuple[int, Dict[str, Any]]:
+        # Same cursor reset as events_since: a since_step past the last step
+        # belongs to an earlier run (restart or reset), so start over
+        snapshot = await self.snapshot(session_id, since_step)
+        if since_step > snapshot["last_step"]:
+            since_step = 0
+            snapshot = await self.snapshot(session_id, since_step)
+        return since_step, snapshot
+
+    async def wait_for_update(self, session_id: str, since_step: int, timeout: float) -> Dict[str, Any]:
+        """Snapshot after ``since_step``, waiting until there is a newer step or the run stops."""
+        timeout = min(max(timeout, 0), AGENT_LONG_POLL_MAX_S)
+        if timeout <= 0:
+            return (await self._snapshot_after(session_id, since_step))[1]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # Subscribe before reading, so a step published in between still wakes us
+        subscription = self.broker.subscribe(self.topic(session_id))
+        try:
+            while True:
+                since_step, snapshot = await self._snapshot_after(session_id, since_step)
+                remaining = deadline - loop.time()
+                if snapshot["messages"] or not snapshot["is_running"] or remaining <= 0:
+                    return snapshot
+                try:
+                    await asyncio.wait_for(subscription.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.broker.unsubscribe(subscription)
+
+
+def _messages(texts: List[str], since_step: int) -> List[Dict[str, Any]]:
+    # Steps are numbered 1..n, so step k lives at index k - 1
+    start = max(since_step, 0)
+    return [{"step": start + i, "text": text} for i, text in enumerate(texts[start:], start=1)]
+
+
+def _step_event(message: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": message["step"], "type": "step", **message}
+
+
+agent_sessions = AgentSessions(session_store, agent_event_broker)
@@ -1,10 +1,19 @@
 import os
+import sys
+import json
 import time
+import asyncio
+import hashlib
+import weakref
 import functools
+import importlib
 import threading
-from typing import Any, Callable, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from collections import OrderedDict
+from pydantic import BaseModel
+from opentelemetry import metrics as otel_metrics
 from conf import logger
+from utils.fingerprint import call_fingerprint, fingerprint
 
 """
 This code provides:
@@ -12,6 +21,8 @@ This code provides:
 - Configurable via environment variables for maximum flexibility.
 - Metrics for cache hits, misses, evictions to understand caching efficiency.
 - An optional admin endpoint integration to flush the cache at runtime.
+- Namespaced keys with version counters, so a namespace (or a wildcard
+  pattern of namespaces) is invalidated in O(1) without FLUSHDB.
 - Integration with distributed caches like Redis, if configured.
 - Easy to adapt and extend for various environments and requirements.
 """
@@ -20,18 +31,114 @@ This code provides:
 CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "true").lower() == "true"
 CACHE_MAXSIZE = int(os.environ.get("CACHE_MAXSIZE", 100))
 CACHE_EXPIRY = int(os.environ.get("CACHE_EXPIRY", 300))
-CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")  # "memory" or "redis"
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")  # "memory", "sharded", "redis" or "tiered"
 CACHE_LOG_LEVEL = os.environ.get("CACHE_LOG_LEVEL", "ERROR").upper()
 
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 REDIS_DB = int(os.environ.get("REDIS_DB", 0))
 
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_SHARDS = int(os.environ.get("CACHE_SHARDS", 16))
+
+
+# Step 2: Debug logging guard
+# Cache calls sit on the request hot path, so debug messages (and the
+# f-strings that build them) are only produced when CACHE_LOG_LEVEL=DEBUG.
+_CACHE_DEBUG = CACHE_LOG_LEVEL == "DEBUG"
+
 
 # Step 3: Metrics for cache operations
 # These counters help track the efficiency of the cache.
 # They can be integrated with external monitoring by a simple export or endpoint.
-cache_metrics = {"hits": 0, "misses": 0, "evictions": 0, "expires": 0}
+cache_metrics = {"hits": 0, "misses": 0, "evictions": 0, "expires": 0, "errors": 0}
+
+# OTel instruments are created once and shared by every cache instance (OTel
+# instrument names must be unique); observable gauges report all live
+# instances, which register themselves in the WeakSets below.
+_tiered_caches: "weakref.WeakSet" = weakref.WeakSet()
+_sharded_caches: "weakref.WeakSet" = weakref.WeakSet()
+_cache_instruments: Dict[str, Any] = {}
+_cache_instruments_lock = threading.Lock()
+
+
+def _observe_tiered_hit_ratio(options):
+    observations = []
+    for cache in list(_tiered_caches):
+        for tier in ("l1", "l2"):
+            hits = cache.stats[f"{tier}_hits"]
+            total = hits + cache.stats[f"{tier}_misses"]
+            if total:
+                observations.append(
+                    otel_metrics.Observation(
+                        hits / total, {"cache": cache.name, "tier": tier}
+                    )
+                )
+    return observations
+
+
+def _observe_cache_bytes(options):
+    return [
+        otel_metrics.Observation(cache.total_bytes(), {"cache": cache.name})
+        for cache in list(_sharded_caches)
+    ]
+
+
+def _observe_cache_entries(options):
+    return [
+        otel_metrics.Observation(len(cache), {"cache": cache.name})
+        for cache in list(_sharded_caches)
+    ]
+
+
+def _get_cache_instruments() -> Dict[str, Any]:
+    with _cache_instruments_lock:
+        if not _cache_instruments:
+            meter = otel_metrics.get_meter(__name__)
+            _cache_instruments["lookups"] = meter.create_counter(
+                name="ui_server.cache.lookups",
+                description="Cache lookups by tier and result",
+                unit="1",
+            )
+            _cache_instruments["loads"] = meter.create_counter(
+                name="ui_server.cache.loads",
+                description="Loader calls after a full miss, split into leader and coalesced waiters",
+                unit="1",
+            )
+            _cache_instruments["hit_ratio"] = meter.create_observable_gauge(
+                name="ui_server.cache.hit_ratio",
+                callbacks=[_observe_tiered_hit_ratio],
+                description="Hit ratio per cache tier since start",
+                unit="1",
+            )
+            _cache_instruments["evictions"] = meter.create_counter(
+                name="ui_server.cache.evictions",
+                description="Evicted entries by reason (capacity, expired, oversize, cleared)",
+                unit="1",
+            )
+            _cache_instruments["eviction_age"] = meter.create_histogram(
+                name="ui_server.cache.eviction_age",
+                description="Age of entries when they leave the cache",
+                unit="s",
+            )
+            _cache_instruments["bytes"] = meter.create_observable_gauge(
+                name="ui_server.cache.bytes",
+                callbacks=[_observe_cache_bytes],
+                description="Estimated bytes held by the cache",
+                unit="By",
+            )
+            _cache_instruments["invalidations"] = meter.create_counter(
+                name="ui_server.cache.invalidations",
+                description="Namespace invalidations (version bumps) by pattern",
+                unit="1",
+            )
+            _cache_instruments["entries"] = meter.create_observable_gauge(
+                name="ui_server.cache.entries",
+                callbacks=[_observe_cache_entries],
+                description="Entries held by the cache",
+                unit="1",
+            )
+        return _cache_instruments
 
 
 # Step 4: LRU in-memory cache class
@@ -51,17 +158,20 @@ class LRUCache:
         with self.lock:
             if key not in self.cache:
                 cache_metrics["misses"] += 1
-                logger.debug(f"Cache miss for key: {key}")
+                if _CACHE_DEBUG:
+                    logger.debug(f"Cache miss for key: {key}")
                 return None
             value, ts = self.cache[key]
             if self._is_expired(ts):
                 cache_metrics["expires"] += 1
-                logger.debug(f"Cache entry expired for key: {key}, evicting")
+                if _CACHE_DEBUG:
+                    logger.debug(f"Cache entry expired for key: {key}, evicting")
                 del self.cache[key]
                 return None
             self.cache.move_to_end(key)
             cache_metrics["hits"] += 1
-            logger.debug(f"Cache hit for key: {key}")
+            if _CACHE_DEBUG:
+                logger.debug(f"Cache hit for key: {key}")
             return value
 
     def set(self, key: Any, value: Any):
@@ -73,12 +183,261 @@ class LRUCache:
             if len(self.cache) > self.maxsize:
                 oldest_key, _ = self.cache.popitem(last=False)
                 cache_metrics["evictions"] += 1
-                logger.debug(f"Evicted oldest key due to size limit: {oldest_key}")
+                if _CACHE_DEBUG:
+                    logger.debug(f"Evicted oldest key due to size limit: {oldest_key}")
 
     def clear(self):
         with self.lock:
             self.cache.clear()
-            logger.debug("Cache cleared")
+            if _CACHE_DEBUG:
+                logger.debug("Cache cleared")
+
+    def entries(self) -> List[Tuple[Any, int, float]]:
+        """Snapshot of (key, estimated size, created_at) for admin stats."""
+        with self.lock:
+            items = [(key, value, ts) for key, (value, ts) in self.cache.items()]
+        return [(key, estimate_size(value), ts) for key, value, ts in items]
+
+    def limits(self) -> Dict[str, Any]:
+        return {"maxsize": self.maxsize, "expiry": self.expiry}
+
+    def configure(self, maxsize: Optional[int] = None, expiry: Optional[int] = None, **_):
+        """Change limits at runtime; shrinking evicts the oldest entries."""
+        with self.lock:
+            if expiry is not None:
+                self.expiry = expiry
+            if maxsize is not None:
+                self.maxsize = maxsize
+                while len(self.cache) > self.maxsize:
+                    self.cache.popitem(last=False)
+                    cache_metrics["evictions"] += 1
+
+    # In-memory operations never wait on I/O, so the async API is a thin alias
+    async def aget(self, key: Any) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: Any, value: Any):
+        self.set(key, value)
+
+
+# Step 4b: Byte-budgeted, lock-sharded LRU
+# LRUCache counts entries, so a 2 MB product list weighs the same as a short
+# text bubble, and every operation takes one global lock. ShardedLRUCache
+# splits the key space over independent shards (one lock each) and evicts by
+# an estimated byte size instead.
+_CONTAINER_OVERHEAD = 56
+_POINTER_SIZE = 8
+
+
+def estimate_size(obj: Any, limit: Optional[int] = None) -> int:
+    """
+    Cheap estimate of the memory held by a value.
+
+    Walks containers, pydantic models and plain objects iteratively; shared
+    sub-objects are counted once. Stops early and returns a value above
+    ``limit`` as soon as the running total exceeds it.
+    """
+    total = 0
+    seen = set()
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, str):
+            total += 49 + len(item)
+        elif isinstance(item, (bytes, bytearray)):
+            total += 33 + len(item)
+        elif item is None or isinstance(item, (bool, int, float)):
+            total += 28
+        elif isinstance(item, dict):
+            total += _CONTAINER_OVERHEAD + len(item) * 3 * _POINTER_SIZE
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            total += _CONTAINER_OVERHEAD + len(item) * _POINTER_SIZE
+            stack.extend(item)
+        elif isinstance(item, BaseModel):
+            total += _CONTAINER_OVERHEAD
+            stack.append(item.__dict__)
+        elif hasattr(item, "__dict__"):
+            total += _CONTAINER_OVERHEAD
+            stack.append(vars(item))
+        else:
+            total += sys.getsizeof(item)
+        if limit is not None and total > limit:
+            return total
+    return total
+
+
+class _Shard:
+    __slots__ = ("entries", "lock", "bytes")
+
+    def __init__(self):
+        # key -> (value, created_at, size)
+        self.entries: "OrderedDict[Any, Tuple[Any, float, int]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+
+
+class ShardedLRUCache:
+    def __init__(
+        self,
+        max_bytes: int = CACHE_MAX_BYTES,
+        expiry: int = CACHE_EXPIRY,
+        shards: int = CACHE_SHARDS,
+        max_item_bytes: Optional[int] = None,
+        size_of: Callable[..., int] = estimate_size,
+        name: str = "default",
+    ):
+        self.shard_count = max(shards, 1)
+        self.expiry = expiry
+        self._max_item_bytes = max_item_bytes
+        self._set_budget(max_bytes)
+        self.size_of = size_of
+        self.name = name
+        self.shards = [_Shard() for _ in range(self.shard_count)]
+        self.eviction_counts = {"capacity": 0, "expired": 0, "oversize": 0, "cleared": 0}
+
+        instruments = _get_cache_instruments()
+        self._evictions = instruments["evictions"]
+        self._eviction_age = instruments["eviction_age"]
+        _sharded_caches.add(self)
+
+    def _set_budget(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.shard_budget = max(max_bytes // self.shard_count, 1)
+        # A single entry may take at most one shard's budget
+        self.max_item_bytes = min(
+            self._max_item_bytes or self.shard_budget, self.shard_budget
+        )
+
+    def _shard(self, key: Any) -> _Shard:
+        return self.shards[hash(key) % self.shard_count]
+
+    def _evicted(self, reason: str, created_at: float, now: float, count: int = 1):
+        self.eviction_counts[reason] += count
+        cache_metrics["evictions" if reason != "expired" else "expires"] += count
+        attributes = {"cache": self.name, "reason": reason}
+        self._evictions.add(count, attributes)
+        if created_at:
+            self._eviction_age.record(now - created_at, attributes)
+
+    def get(self, key: Any) -> Optional[Any]:
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                cache_metrics["misses"] += 1
+                if _CACHE_DEBUG:
+                    logger.debug(f"Cache miss for key: {key}")
+                return None
+            value, created_at, size = entry
+            now = time.time()
+            if self.expiry > 0 and now - created_at > self.expiry:
+                del shard.entries[key]
+                shard.bytes -= size
+                self._evicted("expired", created_at, now)
+                return None
+            shard.entries.move_to_end(key)
+        cache_metrics["hits"] += 1
+        if _CACHE_DEBUG:
+            logger.debug(f"Cache hit for key: {key}")
+        return value
+
+    def set(self, key: Any, value: Any):
+        # Sizing happens outside the shard lock; it is the expensive part
+        size = self.size_of(value, self.max_item_bytes)
+        now = time.time()
+        if size > self.max_item_bytes:
+            self._evicted("oversize", 0.0, now)
+            if _CACHE_DEBUG:
+                logger.debug(f"Not caching {size} byte value for key: {key}")
+            return
+        shard = self._shard(key)
+        evicted = []
+        with shard.lock:
+            old = shard.entries.pop(key, None)
+            if old is not None:
+                shard.bytes -= old[2]
+            shard.entries[key] = (value, now, size)
+            shard.bytes += size
+            while shard.bytes > self.shard_budget and shard.entries:
+                _, (_, created_at, old_size) = shard.entries.popitem(last=False)
+                shard.bytes -= old_size
+                evicted.append(created_at)
+        for created_at in evicted:
+            self._evicted("capacity", created_at, now)
+
+    def delete(self, key: Any):
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.pop(key, None)
+            if entry is not None:
+                shard.bytes -= entry[2]
+
+    def clear(self):
+        now = time.time()
+        for shard in self.shards:
+            with shard.lock:
+                entries = list(shard.entries.values())
+                shard.entries.clear()
+                shard.bytes = 0
+            for _, created_at, _ in entries:
+                self._evicted("cleared", created_at, now)
+
+    def total_bytes(self) -> int:
+        return sum(shard.bytes for shard in self.shards)
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self.shards)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self),
+            "bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "evictions": dict(self.eviction_counts),
+        }
+
+    def entries(self) -> List[Tuple[Any, int, float]]:
+        """Snapshot of (key, size, created_at) for admin stats."""
+        snapshot = []
+        for shard in self.shards:
+            with shard.lock:
+                snapshot.extend(
+                    (key, size, created_at)
+                    for key, (_, created_at, size) in shard.entries.items()
+                )
+        return snapshot
+
+    def limits(self) -> Dict[str, Any]:
+        return {"max_bytes": self.max_bytes, "expiry": self.expiry}
+
+    def configure(self, max_bytes: Optional[int] = None, expiry: Optional[int] = None, **_):
+        """Change limits at runtime; shrinking evicts least recently used entries."""
+        if expiry is not None:
+            self.expiry = expiry
+        if max_bytes is None:
+            return
+        self._set_budget(max_bytes)
+        now = time.time()
+        for shard in self.shards:
+            evicted = []
+            with shard.lock:
+                while shard.bytes > self.shard_budget and shard.entries:
+                    _, (_, created_at, size) = shard.entries.popitem(last=False)
+                    shard.bytes -= size
+                    evicted.append(created_at)
+            for created_at in evicted:
+                self._evicted("capacity", created_at, now)
+
+    async def aget(self, key: Any) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: Any, value: Any):
+        self.set(key, value)
 
 
 # Step 5: Redis-based cache (optional)
@@ -88,12 +447,151 @@ class LRUCache:
 # This allows scaling horizontally and integrating with distributed environments.
 try:
     import redis
+    import redis.asyncio as redis_asyncio
 except ImportError:
     redis = None
+    redis_asyncio = None
+
+# orjson is optional: values are encoded with it when available, stdlib json otherwise.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+REDIS_KEY_PREFIX = os.environ.get("REDIS_KEY_PREFIX", "ui_server:cache:")
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 50))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", 0.5))
+REDIS_CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", 0.5))
+
+# Step 5a: Value serialization
+# Values are stored as a one-byte tag followed by JSON. Pydantic models keep
+# their class path so they come back as the same model; nothing is ever eval'ed.
+_JSON_TAG = b"j"
+_MODEL_TAG = b"m"
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _resolve_model(path: str) -> type:
+    module_name, _, qualname = path.partition(":")
+    target: Any = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    if not (isinstance(target, type) and issubclass(target, BaseModel)):
+        raise TypeError(f"{path} is not a pydantic model")
+    return target
+
+
+def serialize_value(value: Any) -> bytes:
+    """Encode a cache value; raises TypeError for values JSON cannot represent."""
+    if isinstance(value, BaseModel):
+        cls = type(value)
+        envelope = {
+            "cls": f"{cls.__module__}:{cls.__qualname__}",
+            "data": value.model_dump(mode="json"),
+        }
+        return _MODEL_TAG + _dumps(envelope)
+    return _JSON_TAG + _dumps(value)
+
+
+def deserialize_value(data: bytes) -> Any:
+    tag, body = data[:1], data[1:]
+    if tag == _JSON_TAG:
+        return _loads(body)
+    if tag == _MODEL_TAG:
+        envelope = _loads(body)
+        return _resolve_model(envelope["cls"]).model_validate(envelope["data"])
+    raise ValueError(f"Unknown cache value tag: {tag!r}")
+
+
+# Step 5b: Shared connection pools
+# One pool per (host, port, db) for sync clients, and one per event loop for
+# asyncio clients, because asyncio connections cannot cross loops. Loops are
+# held weakly: a discarded loop drops its clients, and a new loop that reuses
+# the old one's id() never gets a client bound to the dead one.
+_sync_clients: Dict[Tuple[str, int, int], Any] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, int, int], Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+_clients_lock = threading.Lock()
+
+
+def get_redis_client(host: str, port: int, db: int):
+    key = (host, port, db)
+    with _clients_lock:
+        client = _sync_clients.get(key)
+        if client is None:
+            pool = redis.ConnectionPool(
+                host=host,
+                port=port,
+                db=db,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            )
+            client = redis.Redis(connection_pool=pool)
+            _sync_clients[key] = client
+        return client
+
+
+def get_async_redis_client(host: str, port: int, db: int):
+    loop = asyncio.get_running_loop()
+    key = (host, port, db)
+    with _clients_lock:
+        clients = _async_clients.get(loop)
+        if clients is None:
+            clients = _async_clients[loop] = {}
+        client = clients.get(key)
+        if client is None:
+            pool = redis_asyncio.ConnectionPool(
+                host=host,
+                port=port,
+                db=db,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            )
+            client = redis_asyncio.Redis(connection_pool=pool)
+            clients[key] = client
+        return client
+
+
+_REDIS_ERRORS: Tuple[type, ...] = (
+    (redis.RedisError, OSError) if redis is not None else (OSError,)
+)
 
 
 class RedisCache:
-    def __init__(self, maxsize: int, expiry: int, host: str, port: int, db: int):
+    """
+    Redis cache with stable digest keys, JSON/orjson values and pooled clients.
+
+    Sync methods (get/set/get_many/set_many/clear) use a blocking pool and are
+    meant for sync code; async handlers should use the a-prefixed methods,
+    which go through redis.asyncio. Redis failures are logged and treated as
+    misses, so an unavailable Redis never breaks a request.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        expiry: int,
+        host: str,
+        port: int,
+        db: int,
+        prefix: str = REDIS_KEY_PREFIX,
+        client: Any = None,
+        async_client: Any = None,
+    ):
         self.maxsize = maxsize
         self.expiry = expiry
         if redis is None:
@@ -101,67 +599,838 @@ class RedisCache:
             raise RuntimeError(
                 "Redis backend requested but redis library not installed."
             )
-        self.client = redis.StrictRedis(host=host, port=port, db=db)
-        # We do not implement an LRU in Redis easily. This example uses a simple hash + TTL.
-        # For full LRU in Redis, we'd need a more complex strategy.
-        # We'll store items as key=hash(key), value=serialized data with timestamp.
-        # For demonstration, store JSON or repr. No real LRU eviction here, just TTL-based expiry.
+        self.host = host
+        self.port = port
+        self.db = db
+        self.prefix = prefix
+        # Explicit clients are used as-is (e.g. fakeredis in tests)
+        self._client = client
+        self._async_client = async_client
 
-    def get(self, key: Any) -> Optional[Any]:
-        skey = self._serialize_key(key)
-        data = self.client.get(skey)
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_redis_client(self.host, self.port, self.db)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is not None:
+            return self._async_client
+        return get_async_redis_client(self.host, self.port, self.db)
+
+    def _serialize_key(self, key: Any) -> str:
+        # Python's hash() is salted per process (PYTHONHASHSEED), so workers
+        # would never share entries; a canonical fingerprint is stable.
+        if isinstance(key, str):
+            return self.prefix + key
+        try:
+            return self.prefix + fingerprint(key)
+        except TypeError:
+            digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16)
+            return self.prefix + digest.hexdigest()
+
+    def _decode(self, key: Any, data: Optional[bytes]) -> Optional[Any]:
         if data is None:
             cache_metrics["misses"] += 1
-            logger.debug(f"Redis cache miss for key: {key}")
             return None
-        # Data is stored as bytes; we can just eval or decode.
-        # For safety, assume data is repr(value).
         try:
-            value = eval(data.decode("utf-8"))
-            cache_metrics["hits"] += 1
-            logger.debug(f"Redis cache hit for key: {key}")
-            return value
+            value = deserialize_value(data)
         except Exception as e:
-            logger.error(f"Error decoding Redis value for key: {key}: {e}")
+            cache_metrics["misses"] += 1
+            logger.error(f"Error decoding Redis value: {e}")
+            return None
+        cache_metrics["hits"] += 1
+        return value
+
+    def _encode(self, value: Any) -> Optional[bytes]:
+        try:
+            return serialize_value(value)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Value not cacheable in Redis: {e}")
+            return None
+
+    def _ex(self) -> Optional[int]:
+        return self.expiry if self.expiry > 0 else None
+
+    def entries(self) -> List[Tuple[Any, int, float]]:
+        # Nothing is held in process; scanning Redis for stats is not worth it
+        return []
+
+    def limits(self) -> Dict[str, Any]:
+        return {"expiry": self.expiry}
+
+    def configure(self, expiry: Optional[int] = None, **_):
+        """New TTL applies to keys written from now on."""
+        if expiry is not None:
+            self.expiry = expiry
+
+    # Sync API
+    def get(self, key: Any) -> Optional[Any]:
+        try:
+            data = self.client.get(self._serialize_key(key))
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis get failed: {e}")
             return None
+        return self._decode(key, data)
 
     def set(self, key: Any, value: Any):
-        skey = self._serialize_key(key)
-        # Store repr(value) for simplicity. Could use JSON if safer.
-        val_str = repr(value).encode("utf-8")
-        self.client.set(skey, val_str)
-        if self.expiry > 0:
-            self.client.expire(skey, self.expiry)
-        # No LRU eviction in basic Redis mode, rely on expiry and external tools or memory limits.
-        # If needed, implement a logic for keys counting and removing oldest. Not trivial with Redis without extra structures.
-        logger.debug(f"Stored key: {key} in Redis cache")
+        payload = self._encode(value)
+        if payload is None:
+            return
+        try:
+            self.client.set(self._serialize_key(key), payload, ex=self._ex())
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis set failed: {e}")
+
+    def get_many(self, keys: List[Any]) -> List[Optional[Any]]:
+        """Fetch several keys with a single MGET."""
+        if not keys:
+            return []
+        try:
+            values = self.client.mget([self._serialize_key(k) for k in keys])
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis mget failed: {e}")
+            return [None] * len(keys)
+        return [self._decode(k, v) for k, v in zip(keys, values)]
+
+    def set_many(self, items: Dict[Any, Any]):
+        """Store several values with one pipelined round trip of SET EX."""
+        pipe = self.client.pipeline(transaction=False)
+        queued = 0
+        for key, value in items.items():
+            payload = self._encode(value)
+            if payload is None:
+                continue
+            pipe.set(self._serialize_key(key), payload, ex=self._ex())
+            queued += 1
+        if not queued:
+            return
+        try:
+            pipe.execute()
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis pipeline set failed: {e}")
 
     def clear(self):
-        # A simple approach: flush entire Redis DB (careful in production).
-        # Alternatively, could store keys in a set and iterate to delete them.
-        self.client.flushdb()
-        logger.debug("Redis cache cleared")
+        # Only this cache's keys are removed; flushdb would wipe data other
+        # services keep in the same Redis database.
+        try:
+            batch = []
+            for skey in self.client.scan_iter(match=self.prefix + "*", count=500):
+                batch.append(skey)
+                if len(batch) >= 500:
+                    self.client.unlink(*batch)
+                    batch = []
+            if batch:
+                self.client.unlink(*batch)
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis clear failed: {e}")
 
-    def _serialize_key(self, key: Any) -> str:
-        # Convert complex key into a string.
-        # Use hash-based approach for uniqueness.
-        # key is (func.__name__, args, sorted(kwargs)).
-        # Just repr key, then hash.
-        return "cache:" + str(hash(key))
+    # Async API
+    async def aget(self, key: Any) -> Optional[Any]:
+        try:
+            data = await self.async_client.get(self._serialize_key(key))
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis get failed: {e}")
+            return None
+        return self._decode(key, data)
+
+    async def aset(self, key: Any, value: Any):
+        payload = self._encode(value)
+        if payload is None:
+            return
+        try:
+            await self.async_client.set(self._serialize_key(key), payload, ex=self._ex())
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis set failed: {e}")
+
+    async def aget_many(self, keys: List[Any]) -> List[Optional[Any]]:
+        if not keys:
+            return []
+        try:
+            values = await self.async_client.mget([self._serialize_key(k) for k in keys])
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis mget failed: {e}")
+            return [None] * len(keys)
+        return [self._decode(k, v) for k, v in zip(keys, values)]
+
+    async def aset_many(self, items: Dict[Any, Any]):
+        pipe = self.async_client.pipeline(transaction=False)
+        queued = 0
+        for key, value in items.items():
+            payload = self._encode(value)
+            if payload is None:
+                continue
+            pipe.set(self._serialize_key(key), payload, ex=self._ex())
+            queued += 1
+        if not queued:
+            return
+        try:
+            await pipe.execute()
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis pipeline set failed: {e}")
+
+
+# Step 5c: Two-tier cache (L1 in-process LRU in front of shared L2 Redis)
+# Reads go L1 -> L2 -> loader; L2 hits are promoted into L1. Each tier keeps
+# its own TTL (L1 short, so workers converge quickly after L2 changes).
+# Concurrent misses for one key are collapsed into a single load.
+CACHE_L1_MAXSIZE = int(os.environ.get("CACHE_L1_MAXSIZE", CACHE_MAXSIZE))
+CACHE_L1_EXPIRY = int(os.environ.get("CACHE_L1_EXPIRY", 30))
+CACHE_L2_EXPIRY = int(os.environ.get("CACHE_L2_EXPIRY", CACHE_EXPIRY))
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get("CACHE_SINGLE_FLIGHT_TIMEOUT", 30))
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TieredCache:
+    def __init__(
+        self,
+        l1: Any,
+        l2: Optional[RedisCache] = None,
+        name: str = "default",
+    ):
+        self.l1 = l1
+        self.l2 = l2
+        self.name = name
+        self.stats = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0}
+        self._flights: Dict[Any, _Flight] = {}
+        self._flights_lock = threading.Lock()
+        # Per event loop, like _async_clients: an id() of a collected loop can be reused
+        self._async_flights: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Any, asyncio.Future]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+        instruments = _get_cache_instruments()
+        self._lookups = instruments["lookups"]
+        self._loads = instruments["loads"]
+        _tiered_caches.add(self)
+
+    def _record(self, tier: str, hit: bool):
+        self.stats[f"{tier}_{'hits' if hit else 'misses'}"] += 1
+        self._lookups.add(
+            1, {"cache": self.name, "tier": tier, "result": "hit" if hit else "miss"}
+        )
+
+    # Plain get/set, same interface as the single-tier caches
+    def get(self, key: Any) -> Optional[Any]:
+        value = self.l1.get(key)
+        self._record("l1", value is not None)
+        if value is not None or self.l2 is None:
+            return value
+        value = self.l2.get(key)
+        self._record("l2", value is not None)
+        if value is not None:
+            self.l1.set(key, value)
+        return value
+
+    def set(self, key: Any, value: Any):
+        self.l1.set(key, value)
+        if self.l2 is not None:
+            self.l2.set(key, value)
+
+    def clear(self):
+        self.l1.clear()
+        if self.l2 is not None:
+            self.l2.clear()
+
+    def entries(self) -> List[Tuple[Any, int, float]]:
+        # Only the in-process tier can be inspected cheaply
+        return self.l1.entries()
+
+    def limits(self) -> Dict[str, Any]:
+        limits = {f"l1_{k}": v for k, v in self.l1.limits().items()}
+        if self.l2 is not None:
+            limits.update({f"l2_{k}": v for k, v in self.l2.limits().items()})
+        return limits
+
+    def configure(
+        self,
+        maxsize: Optional[int] = None,
+        expiry: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        l1_expiry: Optional[int] = None,
+        **_,
+    ):
+        """``expiry`` applies to L2, ``l1_expiry``/``maxsize``/``max_bytes`` to L1."""
+        self.l1.configure(maxsize=maxsize, max_bytes=max_bytes, expiry=l1_expiry)
+        if self.l2 is not None:
+            self.l2.configure(expiry=expiry)
+
+    async def aget(self, key: Any) -> Optional[Any]:
+        value = self.l1.get(key)
+        self._record("l1", value is not None)
+        if value is not None or self.l2 is None:
+            return value
+        value = await self.l2.aget(key)
+        self._record("l2", value is not None)
+        if value is not None:
+            self.l1.set(key, value)
+        return value
+
+    async def aset(self, key: Any, value: Any):
+        self.l1.set(key, value)
+        if self.l2 is not None:
+            await self.l2.aset(key, value)
+
+    # Read-through with single-flight
+    def get_or_load(self, key: Any, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value or compute it with ``loader``.
+        Threads missing on the same key wait for the first one's result.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            self._loads.add(1, {"cache": self.name, "role": "coalesced"})
+            if flight.done.wait(SINGLE_FLIGHT_TIMEOUT):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value
+            # Leader is stuck; do not block this caller forever
+            return loader()
+
+        self._loads.add(1, {"cache": self.name, "role": "leader"})
+        try:
+            value = loader()
+            self.set(key, value)
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def aget_or_load(self, key: Any, loader: Callable[[], Any]) -> Any:
+        """Async variant of get_or_load; ``loader`` returns an awaitable."""
+        value = await self.aget(key)
+        if value is not None:
+            return value
+
+        loop = asyncio.get_running_loop()
+        flights = self._async_flights.get(loop)
+        if flights is None:
+            flights = self._async_flights[loop] = {}
+        future = flights.get(key)
+        if future is not None:
+            self._loads.add(1, {"cache": self.name, "role": "coalesced"})
+            return await asyncio.shield(future)
+
+        future = loop.create_future()
+        flights[key] = future
+        self._loads.add(1, {"cache": self.name, "role": "leader"})
+        try:
+            value = await loader()
+            await self.aset(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure without waiters is not logged by asyncio
+            future.exception()
+            raise
+        finally:
+            flights.pop(key, None)
+
+
+def build_tiered_cache(
+    maxsize: int = CACHE_L1_MAXSIZE,
+    l1_expiry: int = CACHE_L1_EXPIRY,
+    l2_expiry: int = CACHE_L2_EXPIRY,
+    name: str = "default",
+) -> TieredCache:
+    """L1 LRU + L2 Redis; falls back to L1 only when redis-py is missing."""
+    l2 = None
+    if redis is not None:
+        l2 = RedisCache(maxsize, l2_expiry, REDIS_HOST, REDIS_PORT, REDIS_DB)
+    else:
+        logger.error("redis library not installed, TieredCache runs with L1 only.")
+    return TieredCache(LRUCache(maxsize, l1_expiry), l2, name=name)
+
+
+# Step 5d: Namespaced keys with O(1) invalidation
+# Keys are grouped into colon-separated namespaces ("render:get_categories:uz").
+# Every pattern that can cover a namespace ("render", "render:*:uz", ...) has a
+# version counter, and the sum of those counters is part of each stored key.
+# Invalidating a pattern bumps one counter: old keys are simply never read
+# again and age out through TTL/LRU, or are removed by NamespaceReaper.
+CACHE_NAMESPACE_VERSION_TTL = float(os.environ.get("CACHE_NAMESPACE_VERSION_TTL", 1.0))
+CACHE_NAMESPACE_REAPER_INTERVAL = float(
+    os.environ.get("CACHE_NAMESPACE_REAPER_INTERVAL", 0)
+)  # seconds, 0 disables the reaper
+NAMESPACE_MAX_DEPTH = 4
+_NAMESPACE_VERSIONS_KEY = "__namespace_versions__"
+_EPOCH_FIELD = "__epoch__"
+
+
+def normalize_pattern(pattern: str) -> str:
+    """
+    Canonical form of an invalidation pattern: trailing wildcards are dropped,
+    so "render:get_categories:*" == "render:get_categories" and "*" == "".
+    """
+    parts = [part.strip() for part in pattern.split(":")] if pattern else []
+    while parts and parts[-1] in ("*", ""):
+        parts.pop()
+    if len(parts) > NAMESPACE_MAX_DEPTH:
+        raise ValueError(f"Namespace pattern deeper than {NAMESPACE_MAX_DEPTH}: {pattern!r}")
+    return ":".join(parts)
+
+
+@functools.lru_cache(maxsize=4096)
+def namespace_patterns(namespace: str) -> Tuple[str, ...]:
+    """All normalized patterns that cover ``namespace`` (2**depth of them)."""
+    segments = namespace.split(":")
+    if len(segments) > NAMESPACE_MAX_DEPTH:
+        raise ValueError(f"Namespace deeper than {NAMESPACE_MAX_DEPTH}: {namespace!r}")
+    if any(not seg or seg == "*" or "@" in seg for seg in segments):
+        raise ValueError(f"Invalid namespace: {namespace!r}")
+    patterns = set()
+    for mask in range(1 << len(segments)):
+        parts = [seg if mask >> i & 1 else "*" for i, seg in enumerate(segments)]
+        while parts and parts[-1] == "*":
+            parts.pop()
+        patterns.add(":".join(parts))
+    return tuple(sorted(patterns))
+
+
+class LocalNamespaceVersions:
+    """Version counters for in-process caches."""
+
+    def __init__(self):
+        self.versions: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def token(self, patterns: Tuple[str, ...]) -> Optional[str]:
+        versions = self.versions
+        return "0.%d" % sum(versions.get(p, 0) for p in patterns)
+
+    async def atoken(self, patterns: Tuple[str, ...]) -> Optional[str]:
+        return self.token(patterns)
+
+    def bump(self, pattern: str) -> Optional[int]:
+        with self.lock:
+            version = self.versions.get(pattern, 0) + 1
+            self.versions[pattern] = version
+        return version
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.versions)
+
+
+class RedisNamespaceVersions:
+    """
+    Version counters in one Redis hash next to the cached keys, shared by all
+    workers. The hash carries an epoch, so if it is ever lost (eviction,
+    manual delete) tokens restart from a new epoch instead of reusing old ones.
+    """
+
+    def __init__(self, redis_cache: RedisCache):
+        self.redis_cache = redis_cache
+        self.key = redis_cache.prefix + _NAMESPACE_VERSIONS_KEY
+
+    @staticmethod
+    def _token(values: List[Any]) -> Optional[str]:
+        epoch = values[0]
+        if epoch is None:
+            return None
+        if isinstance(epoch, bytes):
+            epoch = epoch.decode()
+        return "%s.%d" % (epoch, sum(int(v) for v in values[1:] if v is not None))
+
+    def token(self, patterns: Tuple[str, ...]) -> Optional[str]:
+        client = self.redis_cache.client
+        try:
+            token = self._token(client.hmget(self.key, [_EPOCH_FIELD, *patterns]))
+            if token is None:
+                client.hsetnx(self.key, _EPOCH_FIELD, time.time_ns())
+                token = self._token(client.hmget(self.key, [_EPOCH_FIELD, *patterns]))
+            return token
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis namespace version read failed: {e}")
+            return None
+
+    async def atoken(self, patterns: Tuple[str, ...]) -> Optional[str]:
+        client = self.redis_cache.async_client
+        try:
+            token = self._token(await client.hmget(self.key, [_EPOCH_FIELD, *patterns]))
+            if token is None:
+                await client.hsetnx(self.key, _EPOCH_FIELD, time.time_ns())
+                token = self._token(
+                    await client.hmget(self.key, [_EPOCH_FIELD, *patterns])
+                )
+            return token
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis namespace version read failed: {e}")
+            return None
+
+    def bump(self, pattern: str) -> Optional[int]:
+        client = self.redis_cache.client
+        try:
+            client.hsetnx(self.key, _EPOCH_FIELD, time.time_ns())
+            return int(client.hincrby(self.key, pattern, 1))
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.error(f"Redis namespace invalidation failed: {e}")
+            return None
+
+    def snapshot(self) -> Dict[str, int]:
+        try:
+            raw = self.redis_cache.client.hgetall(self.key)
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Redis namespace version read failed: {e}")
+            return {}
+        versions = {}
+        for field, value in raw.items():
+            if isinstance(field, bytes):
+                field = field.decode()
+            if field != _EPOCH_FIELD:
+                versions[field] = int(value)
+        return versions
+
+
+def _shared_redis(backend: Any) -> Optional[RedisCache]:
+    if isinstance(backend, RedisCache):
+        return backend
+    if isinstance(backend, TieredCache) and backend.l2 is not None:
+        return backend.l2
+    return None
+
+
+class NamespacedCache:
+    """
+    Namespace-aware view over any cache backend (LRU, sharded, Redis, tiered).
+
+    get/set take a namespace and a key; keys that are not strings are
+    fingerprinted. invalidate("render:get_categories") or
+    invalidate("render:*:uz") costs one counter increment regardless of how
+    many entries it covers. Version tokens are cached locally for
+    ``version_ttl`` seconds, so other workers see an invalidation within that
+    window without a Redis round trip on every lookup.
+    """
+
+    def __init__(
+        self,
+        backend: Any,
+        versions: Any = None,
+        version_ttl: float = CACHE_NAMESPACE_VERSION_TTL,
+        name: str = "namespaced",
+    ):
+        self.backend = backend
+        if versions is None:
+            shared = _shared_redis(backend)
+            versions = (
+                RedisNamespaceVersions(shared)
+                if shared is not None
+                else LocalNamespaceVersions()
+            )
+        self.versions = versions
+        self.version_ttl = version_ttl
+        self.name = name
+        self._tokens: Dict[str, Tuple[str, float]] = {}
+        # namespace -> {"hits", "misses", "sets"}; namespaces are few and bounded
+        self.namespace_counts: Dict[str, Dict[str, int]] = {}
+
+        instruments = _get_cache_instruments()
+        self._lookups = instruments["lookups"]
+        self._invalidations = instruments["invalidations"]
+
+    @staticmethod
+    def _digest(key: Any) -> Optional[str]:
+        if isinstance(key, str):
+            return key
+        try:
+            return fingerprint(key)
+        except TypeError as e:
+            if _CACHE_DEBUG:
+                logger.debug(f"Key cannot be fingerprinted: {e}")
+            return None
+
+    def _cached_token(self, namespace: str) -> Optional[str]:
+        cached = self._tokens.get(namespace)
+        if cached is not None and time.monotonic() - cached[1] < self.version_ttl:
+            return cached[0]
+        return None
+
+    def _store_token(self, namespace: str, token: Optional[str]):
+        if token is not None:
+            self._tokens[namespace] = (token, time.monotonic())
+
+    def token(self, namespace: str) -> Optional[str]:
+        token = self._cached_token(namespace)
+        if token is None:
+            token = self.versions.token(namespace_patterns(namespace))
+            self._store_token(namespace, token)
+        return token
+
+    async def atoken(self, namespace: str) -> Optional[str]:
+        token = self._cached_token(namespace)
+        if token is None:
+            token = await self.versions.atoken(namespace_patterns(namespace))
+            self._store_token(namespace, token)
+        return token
+
+    @staticmethod
+    def make_key(namespace: str, token: str, digest: str) -> str:
+        return f"{namespace}@{token}:{digest}"
+
+    def _count(self, namespace: str, field: str):
+        counts = self.namespace_counts.get(namespace)
+        if counts is None:
+            counts = self.namespace_counts.setdefault(
+                namespace, {"hits": 0, "misses": 0, "sets": 0}
+            )
+        counts[field] += 1
+
+    def _record(self, namespace: str, hit: bool):
+        self._count(namespace, "hits" if hit else "misses")
+        self._lookups.add(
+            1, {"cache": self.name, "tier": "namespace", "result": "hit" if hit else "miss"}
+        )
+
+    def get(self, namespace: str, key: Any) -> Optional[Any]:
+        digest = self._digest(key)
+        token = self.token(namespace) if digest is not None else None
+        if token is None:
+            self._record(namespace, False)
+            return None
+        value = self.backend.get(self.make_key(namespace, token, digest))
+        self._record(namespace, value is not None)
+        return value
+
+    def set(self, namespace: str, key: Any, value: Any):
+        digest = self._digest(key)
+        token = self.token(namespace) if digest is not None else None
+        if token is not None:
+            self._count(namespace, "sets")
+            self.backend.set(self.make_key(namespace, token, digest), value)
+
+    async def aget(self, namespace: str, key: Any) -> Optional[Any]:
+        digest = self._digest(key)
+        token = await self.atoken(namespace) if digest is not None else None
+        if token is None:
+            self._record(namespace, False)
+            return None
+        value = await self.backend.aget(self.make_key(namespace, token, digest))
+        self._record(namespace, value is not None)
+        return value
+
+    async def aset(self, namespace: str, key: Any, value: Any):
+        digest = self._digest(key)
+        token = await self.atoken(namespace) if digest is not None else None
+        if token is not None:
+            self._count(namespace, "sets")
+            await self.backend.aset(self.make_key(namespace, token, digest), value)
+
+    def invalidate(self, pattern: str = "*") -> Optional[int]:
+        """
+        Invalidate every namespace matched by ``pattern`` ("*" matches one
+        segment; missing trailing segments match anything). Returns the new
+        version of the pattern, or None if the version store is unavailable.
+        """
+        normalized = normalize_pattern(pattern)
+        version = self.versions.bump(normalized)
+        # Drop locally cached tokens so this worker sees the change at once
+        self._tokens.clear()
+        if version is not None:
+            self._invalidations.add(1, {"cache": self.name, "pattern": normalized or "*"})
+            logger.info(
+                "Cache namespace invalidated",
+                cache=self.name,
+                pattern=normalized or "*",
+                version=version,
+            )
+        return version
+
+    def clear(self):
+        self.invalidate("*")
+
+    def limits(self) -> Dict[str, Any]:
+        return self.backend.limits()
+
+    def configure(self, **limits):
+        self.backend.configure(**limits)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-namespace hits/misses/sets of this worker, plus entries, bytes and
+        median age of live entries held in process (the L1 tier for tiered
+        caches; Redis-only backends report counters only).
+        """
+        now = time.time()
+        tokens: Dict[str, Optional[str]] = {}
+        live: Dict[str, List[Tuple[int, float]]] = {}
+        for key, size, created_at in self.backend.entries():
+            if not isinstance(key, str):
+                continue
+            namespace, sep, rest = key.partition("@")
+            if not sep:
+                continue
+            if namespace not in tokens:
+                try:
+                    tokens[namespace] = self.token(namespace)
+                except ValueError:
+                    tokens[namespace] = None
+            # Entries of invalidated versions are dead weight, not namespace data
+            if rest.partition(":")[0] != tokens[namespace]:
+                continue
+            live.setdefault(namespace, []).append((size, now - created_at))
+
+        stats: Dict[str, Dict[str, Any]] = {}
+        for namespace in set(self.namespace_counts) | set(live):
+            counts = self.namespace_counts.get(namespace, {"hits": 0, "misses": 0, "sets": 0})
+            lookups = counts["hits"] + counts["misses"]
+            items = live.get(namespace, [])
+            ages = sorted(age for _, age in items)
+            stats[namespace] = {
+                **counts,
+                "hit_ratio": round(counts["hits"] / lookups, 4) if lookups else None,
+                "entries": len(items),
+                "bytes": sum(size for size, _ in items),
+                "p50_age_s": round(ages[len(ages) // 2], 3) if ages else None,
+            }
+        return stats
+
+
+class NamespaceReaper:
+    """
+    Periodically removes keys of invalidated namespace versions from Redis
+    with SCAN + UNLINK, so invalidation never needs KEYS or FLUSHDB.
+    In-process backends need no reaper: stale entries fall out through LRU/TTL.
+    """
+
+    def __init__(
+        self,
+        cache: NamespacedCache,
+        interval: float = CACHE_NAMESPACE_REAPER_INTERVAL,
+        batch_size: int = 500,
+    ):
+        self.cache = cache
+        self.interval = interval
+        self.batch_size = batch_size
+        self.reaped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0 and isinstance(self.cache.versions, RedisNamespaceVersions)
+
+    def reap_once(self) -> int:
+        """One full SCAN pass; returns the number of unlinked keys."""
+        versions = self.cache.versions
+        if not isinstance(versions, RedisNamespaceVersions):
+            return 0
+        redis_cache = versions.redis_cache
+        client = redis_cache.client
+        prefix = redis_cache.prefix
+        current: Dict[str, Optional[str]] = {}
+        batch: List[Any] = []
+        removed = 0
+        try:
+            for raw in client.scan_iter(match=prefix + "*@*", count=self.batch_size):
+                skey = raw.decode() if isinstance(raw, bytes) else raw
+                namespace, _, rest = skey[len(prefix):].partition("@")
+                token = rest.partition(":")[0]
+                if namespace not in current:
+                    try:
+                        current[namespace] = versions.token(namespace_patterns(namespace))
+                    except ValueError:
+                        current[namespace] = None
+                live = current[namespace]
+                if live is None or token == live:
+                    continue
+                batch.append(raw)
+                if len(batch) >= self.batch_size:
+                    removed += client.unlink(*batch)
+                    batch = []
+            if batch:
+                removed += client.unlink(*batch)
+        except _REDIS_ERRORS as e:
+            cache_metrics["errors"] += 1
+            logger.warning(f"Namespace reaper pass failed: {e}")
+        self.reaped += removed
+        if removed and _CACHE_DEBUG:
+            logger.debug(f"Namespace reaper removed {removed} stale keys")
+        return removed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.reap_once)
+
+    async def start(self):
+        if self._task is None and self.enabled:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
 
 
 # Step 6: No-operation cache for disabled caching scenario
 class NoOpCache:
     def get(self, key: Any) -> Optional[Any]:
-        logger.debug(f"Caching disabled, miss for key: {key}")
+        if _CACHE_DEBUG:
+            logger.debug(f"Caching disabled, miss for key: {key}")
         cache_metrics["misses"] += 1
         return None
 
     def set(self, key: Any, value: Any):
-        logger.debug("Caching disabled, not storing value.")
+        if _CACHE_DEBUG:
+            logger.debug("Caching disabled, not storing value.")
 
     def clear(self):
-        logger.debug("Caching disabled, clear does nothing.")
+        if _CACHE_DEBUG:
+            logger.debug("Caching disabled, clear does nothing.")
+
+    def entries(self) -> List[Tuple[Any, int, float]]:
+        return []
+
+    def limits(self) -> Dict[str, Any]:
+        return {}
+
+    def configure(self, **_):
+        pass
+
+    async def aget(self, key: Any) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: Any, value: Any):
+        self.set(key, value)
 
 
 # Step 7: Choose the appropriate cache backend
@@ -172,17 +1441,46 @@ elif CACHE_BACKEND.lower() == "redis":
     global_cache = RedisCache(
         CACHE_MAXSIZE, CACHE_EXPIRY, REDIS_HOST, REDIS_PORT, REDIS_DB
     )
+elif CACHE_BACKEND.lower() == "tiered":
+    # Per-process LRU in front of shared Redis
+    global_cache = build_tiered_cache(name="global")
+elif CACHE_BACKEND.lower() == "sharded":
+    # Byte-budgeted in-memory LRU
+    global_cache = ShardedLRUCache(CACHE_MAX_BYTES, CACHE_EXPIRY, name="global")
 else:
     # Default LRU in-memory
     global_cache = LRUCache(CACHE_MAXSIZE, CACHE_EXPIRY)
 
 
+def build_cache(
+    backend: str,
+    maxsize: int = CACHE_MAXSIZE,
+    expiry: int = CACHE_EXPIRY,
+    max_bytes: int = CACHE_MAX_BYTES,
+    name: str = "default",
+):
+    """Create a cache instance for a backend name ("memory", "sharded", "redis", "tiered")."""
+    backend = backend.lower()
+    if backend == "redis":
+        if redis is None:
+            logger.error("redis library not installed, cannot use Redis backend.")
+            return NoOpCache()
+        return RedisCache(maxsize, expiry, REDIS_HOST, REDIS_PORT, REDIS_DB)
+    if backend == "tiered":
+        l1_expiry = min(expiry, CACHE_L1_EXPIRY) if expiry > 0 else CACHE_L1_EXPIRY
+        return build_tiered_cache(maxsize, l1_expiry, expiry, name=name)
+    if backend == "sharded":
+        return ShardedLRUCache(max_bytes, expiry, name=name)
+    return LRUCache(maxsize, expiry)
+
+
 # Step 8: Decorator for caching function results
 def cache_function(
     maxsize: Optional[int] = None,
     expiry: Optional[int] = None,
     enabled: Optional[bool] = None,
-    backend: Optional[str] = None,
+    backend: Optional[Any] = None,
+    ignore: Optional[List[str]] = None,
 ):
     """
     Decorator for caching function results.
@@ -190,9 +1488,18 @@ def cache_function(
     - maxsize: override global maxsize for this function
     - expiry: override global expiry for this function
     - enabled: override global enabled flag
-    - backend: override global backend ("memory" or "redis")
+    - backend: override global backend ("memory", "sharded", "redis" or
+      "tiered"), or a ready cache instance (e.g. a shared TieredCache)
+    - ignore: keyword argument names left out of the cache key
 
     This allows fine-grained tuning per function.
+    Coroutine functions are supported and use the backend's async API.
+    Backends with get_or_load (TieredCache) also collapse concurrent misses
+    for the same arguments into a single call.
+
+    Keys are canonical fingerprints of the arguments (utils.fingerprint), so
+    dicts, lists, pydantic models and enums can be passed. Calls with
+    arguments that cannot be fingerprinted are executed without caching.
     """
     if enabled is None:
         enabled = CACHE_ENABLED
@@ -203,40 +1510,73 @@ def cache_function(
     if backend is None:
         backend = CACHE_BACKEND
 
-    if not enabled:
-        func_cache = NoOpCache()
-    else:
-        if backend.lower() == "redis":
-            if redis is None:
-                logger.error(
-                    "redis library not installed, cannot use Redis backend for this function."
-                )
-                func_cache = NoOpCache()
-            else:
-                func_cache = RedisCache(
-                    maxsize, expiry, REDIS_HOST, REDIS_PORT, REDIS_DB
-                )
-        else:
-            func_cache = LRUCache(maxsize, expiry)
+    def make_cache(name: str):
+        if not enabled:
+            return NoOpCache()
+        if not isinstance(backend, str):
+            return backend
+        return build_cache(backend, maxsize, expiry, name=name)
+
+    ignored = frozenset(ignore or ())
 
     def decorator(func: Callable):
+        func_cache = make_cache(func.__name__)
+        single_flight = hasattr(func_cache, "get_or_load")
+        func_id = f"{func.__module__}.{func.__qualname__}"
+
+        def make_key(args, kwargs) -> Optional[str]:
+            try:
+                return call_fingerprint(func_id, args, kwargs, ignored)
+            except TypeError as e:
+                if _CACHE_DEBUG:
+                    logger.debug(f"Not caching {func_id}: {e}")
+                return None
+
+        if asyncio.iscoroutinefunction(func):
+            # Coroutine functions go through the non-blocking cache API
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                if key is None:
+                    return await func(*args, **kwargs)
+                if single_flight:
+                    return await func_cache.aget_or_load(
+                        key, lambda: func(*args, **kwargs)
+                    )
+                result = await func_cache.aget(key)
+                if result is not None:
+                    return result
+                result = await func(*args, **kwargs)
+                await func_cache.aset(key, result)
+                return result
+
+            async_wrapper.cache = func_cache
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             # Construct cache key
-            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            key = make_key(args, kwargs)
+            if key is None:
+                return func(*args, **kwargs)
+            if single_flight:
+                return func_cache.get_or_load(key, lambda: func(*args, **kwargs))
             result = func_cache.get(key)
             if result is not None:
-                logger.debug(
-                    f"Used cached result for {func.__name__}, args={args}, kwargs={kwargs}"
-                )
+                if _CACHE_DEBUG:
+                    logger.debug(
+                        f"Used cached result for {func.__name__}, args={args}, kwargs={kwargs}"
+                    )
                 return result
             result = func(*args, **kwargs)
             func_cache.set(key, result)
-            logger.debug(
-                f"Computed and cached result for {func.__name__}, args={args}, kwargs={kwargs}"
-            )
+            if _CACHE_DEBUG:
+                logger.debug(
+                    f"Computed and cached result for {func.__name__}, args={args}, kwargs={kwargs}"
+                )
             return result
 
+        wrapper.cache = func_cache
         return wrapper
 
     return decorator
@@ -257,30 +1597,26 @@ def clear_global_cache():
 
 
 # Step 11: Integration with CLI or admin endpoint
-# For an admin endpoint, assume we have access to a FastAPI app.
-# We can write a helper to register an endpoint that flushes the cache and returns metrics.
-def register_admin_endpoint(app, cache_instance):
+# The admin API lives in utils.cache_admin (token-protected control plane);
+# this helper mounts it with the given cache registered as "global".
+def register_admin_endpoint(app, cache_instance, control_plane=None):
     """
-    Registers an admin endpoint /admin/flush_cache to flush the cache and return metrics.
-    This integrates with the rest of the application that uses FastAPI.
+    Registers the admin endpoints (/admin/flush_cache, /admin/cache_metrics,
+    /admin/cache/...) on a FastAPI app and returns the control plane, so more
+    caches and a warm-up handler can be registered on it.
     """
+    from utils.cache_admin import CacheControlPlane
 
-    @app.post("/admin/flush_cache")
-    def flush_cache():
-        cache_instance.clear()
-        return {
-            "message": "Cache flushed successfully.",
-            "metrics": get_cache_metrics(),
-        }
-
-    @app.get("/admin/cache_metrics")
-    def cache_metrics_endpoint():
-        return get_cache_metrics()
+    if control_plane is None:
+        control_plane = CacheControlPlane()
+    control_plane.register("global", cache_instance)
+    app.include_router(control_plane.router())
+    return control_plane
 
 
 # Step 12: Code is now flexible, easy to integrate with other modules:
 # - Switch backend from memory to redis by changing CACHE_BACKEND
 # - Adjust CACHE_ENABLED to turn caching on/off
 # - Adjust CACHE_MAXSIZE, CACHE_EXPIRY for different loads
-# - Integrate with admin endpoints by calling register_admin_endpoint(app, global_cache) in server code
+# - Admin endpoints are mounted by register_admin_endpoint(app, global_cache) in server code
 # - Metrics and logs provide deep insights without code modifications.
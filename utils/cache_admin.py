@@ -0,0 +1,201 @@
+import os
+import hmac
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel, Field
+from conf import logger
+from utils.cache import NamespacedCache, get_cache_metrics
+
+"""
+This code provides:
+- An authenticated admin API over the server's caches, mounted under /admin.
+- Per-namespace stats (hits, misses, entries, bytes, median age).
+- Targeted invalidation by function and/or language, or by raw pattern.
+- TTL and size limits adjustable at runtime, without a redeploy.
+- A warm-up trigger that pre-renders a list of requests in the background.
+
+Requests must carry the admin token in X-Admin-Token or as a Bearer token.
+When CACHE_ADMIN_TOKEN is not set the whole API answers 403.
+"""
+
+# Step 1: Load environment variables for admin configuration
+CACHE_ADMIN_TOKEN = os.environ.get("CACHE_ADMIN_TOKEN", "")
+
+# Receives request bodies ({"function_name", "llm_output", "backend_output",
+# "api_key", "language"}) and returns a summary of what was rendered.
+WarmupHandler = Callable[[List[Dict[str, Any]]], Awaitable[Dict[str, Any]]]
+
+
+# Step 2: Request models
+class InvalidateRequest(BaseModel):
+    cache: str = "render"
+    # Namespaced caches use "{cache}:{function_name}:{language}" namespaces
+    function_name: Optional[str] = None
+    language: Optional[str] = None
+    # Raw pattern, e.g. "render:*:uz"; overrides function_name/language
+    pattern: Optional[str] = None
+
+
+class LimitsRequest(BaseModel):
+    expiry: Optional[int] = Field(None, ge=0)
+    maxsize: Optional[int] = Field(None, ge=1)
+    max_bytes: Optional[int] = Field(None, ge=1)
+    l1_expiry: Optional[int] = Field(None, ge=0)
+
+
+class WarmupRequest(BaseModel):
+    requests: List[Dict[str, Any]] = Field(default_factory=list)
+
+
+# Step 3: Control plane
+class CacheControlPlane:
+    def __init__(self, token: str = CACHE_ADMIN_TOKEN):
+        self.token = token
+        self.caches: Dict[str, Any] = {}
+        self.warmup_handler: Optional[WarmupHandler] = None
+        self.warmup_task: Optional[asyncio.Task] = None
+        self.last_warmup: Optional[Dict[str, Any]] = None
+
+    def register(self, name: str, cache: Any):
+        self.caches[name] = cache
+
+    def set_warmup_handler(self, handler: WarmupHandler):
+        self.warmup_handler = handler
+
+    def authorize(
+        self,
+        x_admin_token: Optional[str] = Header(None),
+        authorization: Optional[str] = Header(None),
+    ):
+        if not self.token:
+            raise HTTPException(status_code=403, detail="Admin API is disabled")
+        supplied = x_admin_token
+        if supplied is None and authorization and authorization.startswith("Bearer "):
+            supplied = authorization[len("Bearer "):]
+        # Constant-time comparison, so the token cannot be guessed byte by byte
+        if supplied is None or not hmac.compare_digest(
+            supplied.encode("utf-8"), self.token.encode("utf-8")
+        ):
+            raise HTTPException(status_code=401, detail="Invalid admin token")
+
+    def _cache(self, name: str) -> Any:
+        cache = self.caches.get(name)
+        if cache is None:
+            raise HTTPException(status_code=404, detail=f"Unknown cache: {name}")
+        return cache
+
+    def stats(self) -> Dict[str, Any]:
+        caches = {}
+        for name, cache in self.caches.items():
+            info: Dict[str, Any] = {
+                "type": type(cache).__name__,
+                "limits": cache.limits() if hasattr(cache, "limits") else {},
+            }
+            if isinstance(cache, NamespacedCache):
+                info["namespaces"] = cache.stats()
+                cache = cache.backend
+                info["backend"] = type(cache).__name__
+            # ShardedLRUCache.stats() is a method, TieredCache.stats a dict
+            backend_stats = getattr(cache, "stats", None)
+            if backend_stats is not None:
+                info["stats"] = backend_stats() if callable(backend_stats) else dict(backend_stats)
+            caches[name] = info
+        return {"global": get_cache_metrics(), "caches": caches}
+
+    def invalidate(self, request: InvalidateRequest) -> Dict[str, Any]:
+        cache = self._cache(request.cache)
+        if not isinstance(cache, NamespacedCache):
+            if request.pattern or request.function_name or request.language:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Cache {request.cache} has no namespaces; flush it instead",
+                )
+            cache.clear()
+            return {"cache": request.cache, "pattern": "*", "invalidated": True}
+
+        pattern = request.pattern or ":".join(
+            [request.cache, request.function_name or "*", request.language or "*"]
+        )
+        try:
+            version = cache.invalidate(pattern)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {
+            "cache": request.cache,
+            "pattern": pattern,
+            "invalidated": version is not None,
+            "version": version,
+        }
+
+    def configure(self, name: str, request: LimitsRequest) -> Dict[str, Any]:
+        cache = self._cache(name)
+        limits = request.model_dump(exclude_none=True)
+        if not hasattr(cache, "configure"):
+            raise HTTPException(status_code=400, detail=f"Cache {name} has no limits")
+        cache.configure(**limits)
+        logger.info("Cache limits changed", cache=name, **limits)
+        return {"cache": name, "limits": cache.limits()}
+
+    async def _run_warmup(self, requests: List[Dict[str, Any]]):
+        started = time.time()
+        try:
+            summary = await self.warmup_handler(requests)
+            self.last_warmup = {"status": "done", **summary}
+        except Exception as e:
+            logger.exception(f"Cache warm-up failed: {e}")
+            self.last_warmup = {"status": "failed", "error": str(e)}
+        self.last_warmup["duration_s"] = round(time.time() - started, 3)
+
+    def trigger_warmup(self, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if self.warmup_handler is None:
+            raise HTTPException(status_code=503, detail="No warm-up handler registered")
+        if self.warmup_task is not None and not self.warmup_task.done():
+            raise HTTPException(status_code=409, detail="Warm-up already running")
+        self.last_warmup = {"status": "running", "requests": len(requests)}
+        self.warmup_task = asyncio.get_running_loop().create_task(
+            self._run_warmup(requests)
+        )
+        return self.last_warmup
+
+    # Step 4: Routes
+    def router(self) -> APIRouter:
+        router = APIRouter(prefix="/admin", dependencies=[Depends(self.authorize)])
+
+        @router.get("/cache/stats")
+        def cache_stats():
+            return self.stats()
+
+        @router.post("/cache/invalidate")
+        def cache_invalidate(request: InvalidateRequest):
+            return self.invalidate(request)
+
+        @router.put("/cache/{name}/limits")
+        def cache_limits(name: str, request: LimitsRequest):
+            return self.configure(name, request)
+
+        @router.post("/cache/warmup", status_code=202)
+        async def cache_warmup(request: WarmupRequest):
+            return self.trigger_warmup(request.requests)
+
+        @router.get("/cache/warmup")
+        async def cache_warmup_status():
+            return self.last_warmup or {"status": "idle"}
+
+        # Kept from the first admin API
+        @router.post("/flush_cache")
+        def flush_cache(cache: str = "global"):
+            self._cache(cache).clear()
+            return {
+                "message": "Cache flushed successfully.",
+                "metrics": get_cache_metrics(),
+            }
+
+        # Flat global counters, as existing consumers read them; per-cache
+        # stats are under /admin/cache/stats
+        @router.get("/cache_metrics")
+        def cache_metrics_endpoint():
+            return get_cache_metrics()
+
+        return router
@@ -0,0 +1,161 @@
+import os
+import time
+import asyncio
+import fnmatch
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from opentelemetry import metrics as otel_metrics
+
+"""
+This code provides:
+- Deduplication of identical /chat/v3/build_ui requests: while one request
+  renders, identical ones await the same future instead of rendering again.
+- A short completion window (COALESCE_WINDOW_MS) during which the finished
+  result is still handed to identical requests. Renders mostly run
+  synchronously on the event loop, so backend retries usually arrive just
+  after the first render has finished, not during it.
+- Only the rendering request writes a usage record; identical requests it
+  serves do not add one (they are retries within the same chat).
+- An exclusion list for side-effecting or personalized functions, which must
+  run once per request (COALESCE_EXCLUDE, fnmatch patterns).
+- Metrics: ui_server.coalesce.requests (by function and role) and
+  ui_server.coalesce.in_flight.
+"""
+
+# Step 1: Load environment variables for coalescing configuration
+COALESCE_ENABLED = os.environ.get("COALESCE_ENABLED", "true").lower() == "true"
+COALESCE_WINDOW_MS = float(os.environ.get("COALESCE_WINDOW_MS", 100))
+COALESCE_MAX_RECENT = int(os.environ.get("COALESCE_MAX_RECENT", 1000))
+COALESCE_EXCLUDE = os.environ.get(
+    "COALESCE_EXCLUDE",
+    "human_approval*,pay_for_home_utility,send_money*,"
+    "function_call_activity_record,function_response_activity_record,"
+    "get_products,search_products",
+)
+
+
+# Step 2: Coalescer
+class RequestCoalescer:
+    def __init__(
+        self,
+        window_ms: float = COALESCE_WINDOW_MS,
+        exclude: str = COALESCE_EXCLUDE,
+        max_recent: int = COALESCE_MAX_RECENT,
+        enabled: bool = COALESCE_ENABLED,
+    ):
+        self.window = window_ms / 1000
+        self.patterns = [p.strip() for p in exclude.split(",") if p.strip()]
+        self.max_recent = max(max_recent, 0)
+        self.enabled = enabled
+        # Per event loop: an id() of a collected loop can be reused by a new one
+        self.in_flight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        # key -> (result, expires_at); insertion order is expiry order
+        self.recent: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._eligible: Dict[str, bool] = {}
+
+    def in_flight_count(self) -> int:
+        return sum(len(futures) for futures in list(self.in_flight.values()))
+
+    def is_coalescable(self, function_name: str) -> bool:
+        eligible = self._eligible.get(function_name)
+        if eligible is None:
+            eligible = self.enabled and not any(
+                fnmatch.fnmatchcase(function_name, p) for p in self.patterns
+            )
+            self._eligible[function_name] = eligible
+        return eligible
+
+    @staticmethod
+    def key(function_name: str, language: str, chat_id: str, request_key: str) -> str:
+        # chat_id is part of the key, so results are never shared across chats.
+        # Only the leader's render writes a usage record; joined and recent
+        # requests (retries within the same chat) do not get one of their own
+        return f"{function_name}:{language}:{chat_id}:{request_key}"
+
+    def _recent_result(self, key: str) -> Optional[Any]:
+        entry = self.recent.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            self.recent.pop(key, None)
+            return None
+        return entry[0]
+
+    def _remember(self, key: str, result: Any):
+        if self.window <= 0 or not self.max_recent:
+            return
+        now = time.monotonic()
+        recent = self.recent
+        recent.pop(key, None)
+        recent[key] = (result, now + self.window)
+        while recent:
+            oldest, (_, expires_at) = next(iter(recent.items()))
+            if expires_at >= now and len(recent) <= self.max_recent:
+                break
+            recent.pop(oldest)
+
+    async def run(
+        self, key: str, function_name: str, render: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return ``await render()``, shared with identical concurrent requests."""
+        result = self._recent_result(key)
+        if result is not None:
+            _requests.add(1, {"function": function_name, "role": "recent"})
+            return result
+
+        loop = asyncio.get_running_loop()
+        in_flight = self.in_flight.get(loop)
+        if in_flight is None:
+            in_flight = self.in_flight[loop] = {}
+        future = in_flight.get(key)
+        if future is not None:
+            _requests.add(1, {"function": function_name, "role": "joined"})
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled; render for this request instead
+                return await render()
+
+        future = loop.create_future()
+        in_flight[key] = future
+        _requests.add(1, {"function": function_name, "role": "leader"})
+        try:
+            result = await render()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure without waiters is not logged by asyncio
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            self._remember(key, result)
+            return result
+        finally:
+            in_flight.pop(key, None)
+
+
+# Step 3: Global coalescer and its metrics
+request_coalescer = RequestCoalescer()
+
+_meter = otel_metrics.get_meter(__name__)
+_requests = _meter.create_counter(
+    name="ui_server.coalesce.requests",
+    description="Coalescable requests by role: leader renders, joined/recent reuse its result",
+    unit="1",
+)
+_meter.create_observable_gauge(
+    name="ui_server.coalesce.in_flight",
+    callbacks=[
+        lambda options: [otel_metrics.Observation(request_coalescer.in_flight_count())]
+    ],
+    description="Distinct coalescable renders currently in flight",
+    unit="1",
+)
@@ -0,0 +1,228 @@
+import enum
+import struct
+import hashlib
+import dataclasses
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+"""
+This code provides:
+- Deterministic fingerprints for unhashable values: dicts, lists, pydantic
+  models, dataclasses and enums such as LanguageOptions.
+- Hashing over canonical, type-tagged and length-prefixed bytes fed to
+  blake2b, instead of building a json.dumps(sort_keys=True) string (which
+  also needs model_dump() first for pydantic models).
+- Identical results across processes and runs (no reliance on hash()).
+
+Two values get the same fingerprint only if they have the same type tags and
+contents, so {"a": 1} and [["a", 1]], or 1 and "1", never collide by encoding.
+Lists and tuples share a tag, as they do in JSON.
+Objects of unknown types raise TypeError instead of being hashed by identity.
+"""
+
+# Step 1: Encoding primitives
+# Every value is written as a one-byte type tag followed by its length or
+# value in ASCII digits and a terminator (netstring style), e.g. "abc" is
+# b"s3:abc" and 42 is b"i42;". Lengths make the encoding unambiguous.
+_F64 = struct.Struct(">d").pack
+_FLUSH_AT = 4096  # parts buffered before feeding the hasher
+
+# Class tags are computed once per class
+_class_tags: Dict[type, bytes] = {}
+
+
+def _class_tag(cls: type) -> bytes:
+    tag = _class_tags.get(cls)
+    if tag is None:
+        name = f"{cls.__module__}.{cls.__qualname__}".encode("utf-8")
+        tag = _class_tags[cls] = b"%d:%s" % (len(name), name)
+    return tag
+
+
+# Step 2: Canonical encoding
+# Type dispatch is resolved once per type: isinstance() against pydantic's
+# ABC-based metaclass is comparatively slow and models are nested deeply.
+_STR, _DICT, _LIST, _INT, _NONE, _BOOL, _FLOAT = range(7)
+_MODEL, _ENUM, _BYTES, _SET, _DATACLASS = range(7, 12)
+_kinds: Dict[type, int] = {
+    str: _STR,
+    dict: _DICT,
+    list: _LIST,
+    tuple: _LIST,
+    int: _INT,
+    type(None): _NONE,
+    bool: _BOOL,
+    float: _FLOAT,
+    bytes: _BYTES,
+    bytearray: _BYTES,
+    set: _SET,
+    frozenset: _SET,
+}
+
+
+def _kind(t: type) -> int:
+    kind = _kinds.get(t)
+    if kind is not None:
+        return kind
+    if issubclass(t, BaseModel):
+        kind = _MODEL
+    elif issubclass(t, enum.Enum):
+        kind = _ENUM
+    elif dataclasses.is_dataclass(t):
+        kind = _DATACLASS
+    # Subclasses of the builtins are encoded as their base type
+    elif issubclass(t, bool):
+        kind = _BOOL
+    elif issubclass(t, str):
+        kind = _STR
+    elif issubclass(t, int):
+        kind = _INT
+    elif issubclass(t, float):
+        kind = _FLOAT
+    elif issubclass(t, dict):
+        kind = _DICT
+    elif issubclass(t, (list, tuple)):
+        kind = _LIST
+    elif issubclass(t, (bytes, bytearray)):
+        kind = _BYTES
+    elif issubclass(t, (set, frozenset)):
+        kind = _SET
+    else:
+        raise TypeError(
+            f"Cannot fingerprint object of type {t.__module__}.{t.__qualname__}"
+        )
+    _kinds[t] = kind
+    return kind
+
+
+# Per model class: (encoded field name, field name) pairs in sorted order
+_model_fields: Dict[type, List[tuple]] = {}
+
+
+def _model_field_keys(cls: type) -> List[tuple]:
+    keys = _model_fields.get(cls)
+    if keys is None:
+        keys = []
+        for name in sorted(cls.model_fields):
+            data = name.encode("utf-8")
+            keys.append((b"s%d:%s" % (len(data), data), name))
+        _model_fields[cls] = keys
+    return keys
+
+
+def _encode(obj: Any, hasher) -> None:
+    """
+    Feed the canonical encoding of ``obj`` to ``hasher``.
+
+    JSON-like values take the exact-type fast path; everything else goes
+    through the cached kind lookup. Parts are joined and hashed in batches.
+    """
+    parts: List[bytes] = []
+    append = parts.append
+    kinds = _kinds
+
+    def enc(o: Any):
+        t = type(o)
+        if t is str:
+            data = o.encode("utf-8")
+            append(b"s%d:" % len(data))
+            append(data)
+        elif t is dict:
+            append(b"d%d:" % len(o))
+            try:
+                # Fast path: keys of one sortable type (str in practice)
+                keys = sorted(o)
+            except TypeError:
+                keys = sorted(o, key=fingerprint)
+            for key in keys:
+                enc(key)
+                enc(o[key])
+        elif t is list or t is tuple:
+            append(b"l%d:" % len(o))
+            for item in o:
+                enc(item)
+        elif t is int:
+            append(b"i%d;" % o)
+        elif o is None:
+            append(b"N")
+        else:
+            kind = kinds.get(t)
+            if kind is None:
+                kind = _kind(t)
+            if kind == _MODEL:
+                # Field values are read from __dict__ instead of via model_dump()
+                append(b"m")
+                append(_class_tag(t))
+                values = o.__dict__
+                field_keys = _model_field_keys(t)
+                append(b"d%d:" % len(field_keys))
+                for encoded_name, name in field_keys:
+                    append(encoded_name)
+                    enc(values.get(name))
+                extra = o.__pydantic_extra__
+                if extra:
+                    enc(extra)
+            elif kind == _BOOL:
+                append(b"T" if o else b"F")
+            elif kind == _FLOAT:
+                # 1.0 and 1 are different fingerprints; -0.0 is normalized to 0.0
+                append(b"f")
+                append(_F64(o + 0.0))
+            elif kind == _ENUM:
+                append(b"e")
+                append(_class_tag(t))
+                enc(o.value)
+            elif kind == _STR:
+                enc(str(o))
+            elif kind == _INT:
+                enc(int(o))
+            elif kind == _DICT:
+                enc(dict(o))
+            elif kind == _LIST:
+                enc(list(o))
+            elif kind == _BYTES:
+                append(b"b%d:" % len(o))
+                append(bytes(o))
+            elif kind == _SET:
+                append(b"S%d:" % len(o))
+                for digest in sorted(fingerprint(item) for item in o):
+                    enc(digest)
+            else:  # _DATACLASS
+                append(b"c")
+                append(_class_tag(t))
+                for field in dataclasses.fields(o):
+                    enc(field.name)
+                    enc(getattr(o, field.name))
+        if len(parts) >= _FLUSH_AT:
+            hasher.update(b"".join(parts))
+            parts.clear()
+
+    enc(obj)
+    hasher.update(b"".join(parts))
+
+
+# Step 3: Public API
+def fingerprint(*objs: Any, digest_size: int = 16) -> str:
+    """
+    Return a hex digest identifying ``objs`` by value.
+
+    Raises TypeError if any nested value has an unsupported type.
+    """
+    hasher = hashlib.blake2b(digest_size=digest_size)
+    _encode(objs[0] if len(objs) == 1 else objs, hasher)
+    return hasher.hexdigest()
+
+
+def call_fingerprint(
+    name: str,
+    args: tuple,
+    kwargs: Dict[str, Any],
+    ignore: Optional[frozenset] = None,
+) -> str:
+    """
+    Fingerprint a function call; keyword arguments named in ``ignore`` are
+    left out (e.g. loggers or request ids that do not affect the result).
+    """
+    if ignore:
+        kwargs = {k: v for k, v in kwargs.items() if k not in ignore}
+    return fingerprint(name, args, kwargs)
@@ -0,0 +1,108 @@
+import os
+from typing import Any, Callable, Optional, TypeVar
+from opentelemetry import metrics as otel_metrics
+from pydantic import ValidationError
+from utils.cache import LRUCache
+from utils.fingerprint import fingerprint
+
+"""
+This code provides:
+- The text-fallback flow of FunctionStrategy handlers that opt in with
+  ``text_fallback = True``: build the widget inputs, build the output, and
+  answer with the text-only output when either step fails.
+- A short-TTL negative cache of payloads that failed validation, keyed by
+  handler and backend_output fingerprint, so retries of the same malformed
+  backend_output go straight to the fallback.
+- Only validation errors raised while building the widget inputs are
+  remembered. TypeError, KeyError or AttributeError are as likely to be bugs
+  in a handler, and failures while building the widgets are not about the
+  payload; both still fall back, but every time.
+- Metrics: ui_server.negative_cache.hits and ui_server.negative_cache.stores,
+  per handler.
+"""
+
+# Step 1: Load environment variables for the negative cache
+NEGATIVE_CACHE_ENABLED = (
+    os.environ.get("NEGATIVE_CACHE_ENABLED", "true").lower() == "true"
+)
+NEGATIVE_CACHE_TTL = int(os.environ.get("NEGATIVE_CACHE_TTL", 60))
+NEGATIVE_CACHE_MAXSIZE = int(os.environ.get("NEGATIVE_CACHE_MAXSIZE", 1000))
+
+# Failures of build_widget_inputs() that depend only on the payload
+VALIDATION_ERRORS = (ValidationError, ValueError)
+
+Inputs = TypeVar("Inputs")
+Output = TypeVar("Output")
+
+
+# Step 2: Negative cache and the fallback flow
+class NegativeCache:
+    def __init__(
+        self,
+        maxsize: int = NEGATIVE_CACHE_MAXSIZE,
+        ttl: int = NEGATIVE_CACHE_TTL,
+        enabled: bool = NEGATIVE_CACHE_ENABLED,
+    ):
+        self.cache = LRUCache(maxsize, ttl)
+        self.enabled = enabled
+
+    def key(self, handler: str, backend_output: Any) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            return fingerprint(handler, backend_output)
+        except TypeError:
+            return None
+
+    def run(
+        self,
+        handler: str,
+        backend_output: Any,
+        build_inputs: Callable[[], Inputs],
+        build_output: Callable[[Inputs], Output],
+        fall_back: Callable[[], Output],
+        logger: Any,
+    ) -> Output:
+        """``build_output(build_inputs())``, or ``fall_back()`` when that fails."""
+        key = self.key(handler, backend_output)
+        if key is not None and self.cache.get(key) is not None:
+            _hits.add(1, {"handler": handler})
+            logger.info("Known invalid backend_output, using text fallback", handler=handler)
+            return fall_back()
+
+        try:
+            inputs = build_inputs()
+        except Exception as e:
+            if key is not None and isinstance(e, VALIDATION_ERRORS):
+                self.cache.set(key, True)
+                _stores.add(1, {"handler": handler})
+            return self._fall_back(handler, e, fall_back, logger)
+        try:
+            return build_output(inputs)
+        except Exception as e:
+            return self._fall_back(handler, e, fall_back, logger)
+
+    @staticmethod
+    def _fall_back(handler: str, error: Exception, fall_back: Callable[[], Output], logger: Any) -> Output:
+        logger.error(
+            "Error creating widgets, falling back to text widget only",
+            handler=handler,
+            error=str(error),
+        )
+        return fall_back()
+
+
+# Step 3: Global negative cache and its metrics
+negative_cache = NegativeCache()
+
+_meter = otel_metrics.get_meter(__name__)
+_hits = _meter.create_counter(
+    name="ui_server.negative_cache.hits",
+    description="Requests answered with the text fallback because the payload is known to be invalid",
+    unit="1",
+)
+_stores = _meter.create_counter(
+    name="ui_server.negative_cache.stores",
+    description="Payloads remembered as invalid",
+    unit="1",
+)
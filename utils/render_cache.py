@@ -0,0 +1,106 @@
+import os
+from typing import Any, Iterable, Optional
+from conf import logger
+from utils.cache import (
+    CACHE_BACKEND,
+    CACHE_ENABLED,
+    CACHE_MAX_BYTES,
+    NamespacedCache,
+    NamespaceReaper,
+    build_cache,
+)
+from utils.fingerprint import fingerprint
+
+"""
+This code provides:
+- A cache of rendered /chat/v3/build_ui outputs for functions whose output
+  depends only on the request (llm_output, backend_output, api_key).
+- One namespace per function and language, "render:{function_name}:{language}",
+  so a single function ("render:get_categories"), a language ("render:*:uz")
+  or everything ("render") can be invalidated in O(1).
+- An allowlist (RENDER_CACHE_FUNCTIONS); functions with side effects or
+  per-call ids (human approval, transfers, payments) must not be listed.
+"""
+
+# Step 1: Load environment variables for render cache configuration
+RENDER_CACHE_ENABLED = (
+    CACHE_ENABLED
+    and os.environ.get("RENDER_CACHE_ENABLED", "true").lower() == "true"
+)
+RENDER_CACHE_FUNCTIONS = os.environ.get(
+    "RENDER_CACHE_FUNCTIONS",
+    "get_categories,get_suppliers_by_category,get_fields_of_supplier,"
+    "get_home_balances,get_home_utility_suppliers,start_page_widget,"
+    "get_weather_info,get_news,calculate_mortgage",
+)
+# "memory", "sharded", "redis" or "tiered"; the sharded LRU bounds memory by bytes
+RENDER_CACHE_BACKEND = os.environ.get(
+    "RENDER_CACHE_BACKEND", "sharded" if CACHE_BACKEND == "memory" else CACHE_BACKEND
+)
+RENDER_CACHE_MAXSIZE = int(os.environ.get("RENDER_CACHE_MAXSIZE", 1000))
+RENDER_CACHE_EXPIRY = int(os.environ.get("RENDER_CACHE_EXPIRY", 300))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", CACHE_MAX_BYTES))
+
+
+def parse_functions(raw: str) -> frozenset:
+    return frozenset(name.strip() for name in raw.split(",") if name.strip())
+
+
+# Step 2: Render cache
+class RenderCache:
+    def __init__(
+        self,
+        cache: NamespacedCache,
+        functions: Iterable[str],
+        enabled: bool = True,
+    ):
+        self.cache = cache
+        self.functions = frozenset(functions)
+        self.enabled = enabled
+        self.reaper = NamespaceReaper(cache)
+
+    def is_cacheable(self, function_name: str) -> bool:
+        return self.enabled and function_name in self.functions
+
+    @staticmethod
+    def namespace(function_name: str, language: str) -> str:
+        return f"render:{function_name}:{language}"
+
+    @staticmethod
+    def request_key(
+        llm_output: str, backend_output: Any, api_key: str, version: str
+    ) -> Optional[str]:
+        """Fingerprint of everything the output depends on, None if not hashable."""
+        try:
+            return fingerprint(version, llm_output, backend_output, api_key)
+        except TypeError as e:
+            logger.warning(f"Render cache key not computable: {e}")
+            return None
+
+    async def aget(self, function_name: str, language: str, key: str) -> Optional[Any]:
+        return await self.cache.aget(self.namespace(function_name, language), key)
+
+    async def aset(self, function_name: str, language: str, key: str, output: Any):
+        await self.cache.aset(self.namespace(function_name, language), key, output)
+
+    def invalidate(self, function_name: str = "*", language: str = "*") -> Optional[int]:
+        return self.cache.invalidate(self.namespace(function_name, language))
+
+
+# Step 3: Global render cache used by the server
+def build_render_cache() -> RenderCache:
+    backend = build_cache(
+        RENDER_CACHE_BACKEND,
+        RENDER_CACHE_MAXSIZE,
+        RENDER_CACHE_EXPIRY,
+        max_bytes=RENDER_CACHE_MAX_BYTES,
+        name="render",
+    )
+    return RenderCache(
+        NamespacedCache(backend, name="render"),
+        parse_functions(RENDER_CACHE_FUNCTIONS),
+        enabled=RENDER_CACHE_ENABLED,
+    )
+
+
+render_cache = build_render_cache()
@@ -0,0 +1,489 @@
+import os
+import json
+from abc import ABC, abstractmethod
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from conf import logger
+
+try:
+    import redis
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis = None
+    redis_asyncio = None
+
+"""
+This code provides:
+- A session-state store shared by every worker of the server: agent progress
+  today, and any other per-session state (patch baselines, pagination
+  cursors) later. Each session key holds a JSON state dict plus an
+  append-only list of items (e.g. agent steps).
+- Change notifications: publish() reaches the listeners of every worker, so
+  a long-poll or SSE stream on one worker sees steps produced on another.
+- Three backends, selected with SESSION_STORE_BACKEND:
+  - "memory": one process only; a bounded TTL map.
+  - "redis": keys with EXPIRE, notifications over Redis pub/sub.
+  - "sqlite": several workers on one host sharing a WAL-mode database file;
+    notifications are an events table the workers poll.
+- TTL eviction: a session expires SESSION_STORE_TTL seconds after its last write.
+"""
+
+# Step 1: Load environment variables for session store configuration
+SESSION_STORE_BACKEND = os.environ.get("SESSION_STORE_BACKEND", "memory")  # "memory", "redis" or "sqlite"
+SESSION_STORE_TTL = float(os.environ.get("SESSION_STORE_TTL", 3600))
+SESSION_STORE_MAXSIZE = int(os.environ.get("SESSION_STORE_MAXSIZE", 1000))
+SESSION_STORE_PREFIX = os.environ.get("SESSION_STORE_PREFIX", "ui_server:session:")
+SESSION_STORE_SQLITE_PATH = os.environ.get("SESSION_STORE_SQLITE_PATH", "logs/sessions.sqlite3")
+SESSION_STORE_POLL_MS = float(os.environ.get("SESSION_STORE_POLL_MS", 100))
+# How long sqlite keeps published events for slower pollers
+SESSION_STORE_EVENT_RETENTION_S = float(os.environ.get("SESSION_STORE_EVENT_RETENTION_S", 60))
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+REDIS_DB = int(os.environ.get("REDIS_DB", 0))
+
+# Receives (key, event) for every published event, from any worker
+EventHandler = Callable[[str, Dict[str, Any]], Any]
+
+
+# Step 2: Common interface
+class SessionStore(ABC):
+    """
+    Async key -> (state, items) store. Subclasses implement every abstract
+    method (a partial backend fails when built); listeners registered with
+    add_listener() get every published event.
+    """
+
+    def __init__(self, ttl: float = SESSION_STORE_TTL):
+        self.ttl = ttl
+        self.listeners: List[EventHandler] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add_listener(self, handler: EventHandler):
+        self.listeners.append(handler)
+
+    def _deliver(self, key: str, event: Dict[str, Any]):
+        for handler in self.listeners:
+            try:
+                handler(key, event)
+            except Exception as e:
+                logger.exception(f"Session event listener failed: {e}")
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, state: Dict[str, Any], clear_items: bool = False):
+        ...
+
+    @abstractmethod
+    async def append(self, key: str, item: Any) -> int:
+        """Append ``item`` and return the new number of items."""
+        ...
+
+    @abstractmethod
+    async def items(self, key: str, start: int = 0) -> List[Any]:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def publish(self, key: str, event: Dict[str, Any]):
+        ...
+
+    async def _listen(self):
+        """Deliver events published by other workers; runs until stopped."""
+
+    async def start(self):
+        if self._task is None and type(self)._listen is not SessionStore._listen:
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Step 3: In-process backend
+class _MemoryRecord:
+    __slots__ = ("state", "items", "written_at")
+
+    def __init__(self):
+        self.state: Optional[Dict[str, Any]] = None
+        self.items: List[Any] = []
+        self.written_at = time.monotonic()
+
+
+class MemorySessionStore(SessionStore):
+    """Bounded TTL map; least recently used sessions go first beyond maxsize."""
+
+    def __init__(self, maxsize: int = SESSION_STORE_MAXSIZE, ttl: float = SESSION_STORE_TTL):
+        super().__init__(ttl)
+        self.maxsize = max(maxsize, 1)
+        self.records: "OrderedDict[str, _MemoryRecord]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _expired(self, record: _MemoryRecord, now: float) -> bool:
+        return self.ttl > 0 and now - record.written_at > self.ttl
+
+    def _lookup(self, key: str) -> Optional[_MemoryRecord]:
+        record = self.records.get(key)
+        if record is None:
+            return None
+        if self._expired(record, time.monotonic()):
+            del self.records[key]
+            return None
+        self.records.move_to_end(key)
+        return record
+
+    def _write(self, key: str) -> _MemoryRecord:
+        record = self._lookup(key)
+        if record is None:
+            record = self.records[key] = _MemoryRecord()
+            now = time.monotonic()
+            while len(self.records) > self.maxsize or self._expired(
+                next(iter(self.records.values())), now
+            ):
+                self.records.popitem(last=False)
+        record.written_at = time.monotonic()
+        return record
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        record = self._lookup(key)
+        return None if record is None else record.state
+
+    async def set(self, key: str, state: Dict[str, Any], clear_items: bool = False):
+        record = self._write(key)
+        record.state = state
+        if clear_items:
+            record.items = []
+
+    async def append(self, key: str, item: Any) -> int:
+        record = self._write(key)
+        record.items.append(item)
+        return len(record.items)
+
+    async def items(self, key: str, start: int = 0) -> List[Any]:
+        record = self._lookup(key)
+        return [] if record is None else record.items[max(start, 0):]
+
+    async def delete(self, key: str):
+        self.records.pop(key, None)
+
+    async def publish(self, key: str, event: Dict[str, Any]):
+        self._deliver(key, event)
+
+
+# Step 4: Redis backend
+_REDIS_ERRORS = (redis.RedisError, OSError) if redis is not None else (OSError,)
+
+
+class RedisSessionStore(SessionStore):
+    """
+    State in "{prefix}{key}", items in a list at "{prefix}{key}:items", both
+    expiring with the session. Events go out on the "{prefix}events" channel.
+    Redis failures are logged; reads then behave as if the session were gone.
+    """
+
+    def __init__(
+        self,
+        ttl: float = SESSION_STORE_TTL,
+        prefix: str = SESSION_STORE_PREFIX,
+        client: Any = None,
+    ):
+        super().__init__(ttl)
+        if redis_asyncio is None:
+            raise RuntimeError("Redis session store requested but redis library not installed.")
+        self.prefix = prefix
+        self.channel = prefix + "events"
+        # Explicit clients are used as-is (e.g. fakeredis in tests)
+        self.client = client or redis_asyncio.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+
+    @property
+    def _ttl_ms(self) -> Optional[int]:
+        return int(self.ttl * 1000) if self.ttl > 0 else None
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = await self.client.get(self.prefix + key)
+        except _REDIS_ERRORS as e:
+            logger.warning(f"Session store get failed: {e}")
+            return None
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, state: Dict[str, Any], clear_items: bool = False):
+        items_key = self.prefix + key + ":items"
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.set(self.prefix + key, json.dumps(state), px=self._ttl_ms)
+                if clear_items:
+                    pipe.delete(items_key)
+                elif self._ttl_ms:
+                    pipe.pexpire(items_key, self._ttl_ms)
+                await pipe.execute()
+        except _REDIS_ERRORS as e:
+            logger.warning(f"Session store set failed: {e}")
+
+    async def append(self, key: str, item: Any) -> int:
+        items_key = self.prefix + key + ":items"
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.rpush(items_key, json.dumps(item))
+                if self._ttl_ms:
+                    pipe.pexpire(items_key, self._ttl_ms)
+                    pipe.pexpire(self.prefix + key, self._ttl_ms)
+                length, *_ = await pipe.execute()
+        except _REDIS_ERRORS as e:
+            logger.warning(f"Session store append failed: {e}")
+            return 0
+        return length
+
+    async def items(self, key: str, start: int = 0) -> List[Any]:
+        try:
+            raw = await self.client.lrange(self.prefix + key + ":items", max(start, 0), -1)
+        except _REDIS_ERRORS as e:
+            logger.warning(f"Session store items failed: {e}")
+            return []
+        return [json.loads(item) for item in raw]
+
+    async def delete(self, key: str):
+        try:
+            await self.client.delete(self.prefix + key, self.prefix + key + ":items")
+        except _REDIS_ERRORS as e:
+            logger.warning(f"Session store delete failed: {e}")
+
+    async def publish(self, key: str, event: Dict[str, Any]):
+        try:
+            await self.client.publish(self.channel, json.dumps({"key": key, "event": event}))
+        except _REDIS_ERRORS as e:
+            logger.warning(f"Session store publish failed: {e}")
+
+    async def _listen(self):
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is None or message.get("type") != "message":
+                        continue
+                    try:
+                        payload = json.loads(message["data"])
+                        key, event = payload["key"], payload["event"]
+                    except (ValueError, KeyError, TypeError) as e:
+                        # Foreign or malformed publish: skip it, keep listening
+                        logger.warning(f"Skipping bad session event {message['data']!r:.200}: {e}")
+                        continue
+                    self._deliver(key, event)
+            except _REDIS_ERRORS as e:
+                logger.warning(f"Session store subscription lost, retrying: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+
+# Step 5: SQLite backend (single host, several workers)
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    key TEXT PRIMARY KEY, state TEXT, expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS session_items (
+    key TEXT NOT NULL, idx INTEGER NOT NULL, item TEXT NOT NULL,
+    PRIMARY KEY (key, idx)
+);
+CREATE TABLE IF NOT EXISTS session_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL, event TEXT NOT NULL, created_at REAL NOT NULL
+);
+"""
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    One database file shared by all workers on the host (WAL mode). Each
+    worker polls session_events every SESSION_STORE_POLL_MS for new events.
+    Calls run in the default executor, so the event loop never waits on a lock.
+    """
+
+    def __init__(
+        self,
+        path: str = SESSION_STORE_SQLITE_PATH,
+        ttl: float = SESSION_STORE_TTL,
+        poll_ms: float = SESSION_STORE_POLL_MS,
+        retention_s: float = SESSION_STORE_EVENT_RETENTION_S,
+    ):
+        super().__init__(ttl)
+        self.path = path
+        self.poll = poll_ms / 1000
+        self.retention = retention_s
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, timeout=5, isolation_level=None, check_same_thread=False
+        )
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SQLITE_SCHEMA)
+
+    def _expires_at(self) -> float:
+        return time.time() + self.ttl if self.ttl > 0 else float("inf")
+
+    def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    async def _call(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.to_thread(self._run, fn)
+
+    def _touch(self, conn: sqlite3.Connection, key: str, state: Optional[str] = None):
+        conn.execute(
+            "INSERT INTO sessions (key, state, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at, "
+            "state = COALESCE(excluded.state, sessions.state)",
+            (key, state, self._expires_at()),
+        )
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        def fn(conn):
+            return conn.execute(
+                "SELECT state FROM sessions WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+
+        row = await self._call(fn)
+        return None if row is None or row[0] is None else json.loads(row[0])
+
+    async def set(self, key: str, state: Dict[str, Any], clear_items: bool = False):
+        def fn(conn):
+            self._purge_if_expired(conn, key)
+            self._touch(conn, key, json.dumps(state))
+            if clear_items:
+                conn.execute("DELETE FROM session_items WHERE key = ?", (key,))
+
+        await self._call(fn)
+
+    async def append(self, key: str, item: Any) -> int:
+        def fn(conn):
+            self._purge_if_expired(conn, key)
+            self._touch(conn, key)
+            (idx,) = conn.execute(
+                "SELECT COALESCE(MAX(idx), 0) + 1 FROM session_items WHERE key = ?", (key,)
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO session_items (key, idx, item) VALUES (?, ?, ?)",
+                (key, idx, json.dumps(item)),
+            )
+            return idx
+
+        return await self._call(fn)
+
+    async def items(self, key: str, start: int = 0) -> List[Any]:
+        def fn(conn):
+            return conn.execute(
+                "SELECT i.item FROM session_items i JOIN sessions s ON s.key = i.key "
+                "WHERE i.key = ? AND i.idx > ? AND s.expires_at > ? ORDER BY i.idx",
+                (key, max(start, 0), time.time()),
+            ).fetchall()
+
+        return [json.loads(row[0]) for row in await self._call(fn)]
+
+    @staticmethod
+    def _purge_if_expired(conn: sqlite3.Connection, key: str):
+        # An expired session must not leak its old items into a new one
+        expired = conn.execute(
+            "SELECT 1 FROM sessions WHERE key = ? AND expires_at <= ?", (key, time.time())
+        ).fetchone()
+        if expired:
+            conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            conn.execute("DELETE FROM session_items WHERE key = ?", (key,))
+
+    async def delete(self, key: str):
+        def fn(conn):
+            conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            conn.execute("DELETE FROM session_items WHERE key = ?", (key,))
+
+        await self._call(fn)
+
+    async def publish(self, key: str, event: Dict[str, Any]):
+        def fn(conn):
+            conn.execute(
+                "INSERT INTO session_events (key, event, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(event), time.time()),
+            )
+
+        await self._call(fn)
+
+    def purge(self) -> int:
+        """Drop expired sessions and old events; returns removed sessions."""
+
+        def fn(conn):
+            now = time.time()
+            conn.execute("DELETE FROM session_events WHERE created_at < ?", (now - self.retention,))
+            conn.execute(
+                "DELETE FROM session_items WHERE key IN "
+                "(SELECT key FROM sessions WHERE expires_at <= ?)",
+                (now,),
+            )
+            return conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+
+        return self._run(fn)
+
+    async def _listen(self):
+        (last_id,) = await self._call(
+            lambda conn: conn.execute("SELECT COALESCE(MAX(id), 0) FROM session_events").fetchone()
+        )
+        next_purge = time.monotonic() + self.retention
+        while True:
+            await asyncio.sleep(self.poll)
+            try:
+                rows = await self._call(
+                    lambda conn: conn.execute(
+                        "SELECT id, key, event FROM session_events WHERE id > ? ORDER BY id",
+                        (last_id,),
+                    ).fetchall()
+                )
+                for event_id, key, event in rows:
+                    last_id = event_id
+                    self._deliver(key, json.loads(event))
+                if time.monotonic() >= next_purge:
+                    next_purge = time.monotonic() + self.retention
+                    await asyncio.to_thread(self.purge)
+            except sqlite3.Error as e:
+                logger.warning(f"Session store poll failed: {e}")
+
+
+# Step 6: Backend selection
+def build_session_store(backend: str = SESSION_STORE_BACKEND) -> SessionStore:
+    if backend == "redis":
+        if redis_asyncio is not None:
+            return RedisSessionStore()
+        logger.error("redis library not installed, session store falls back to memory.")
+    elif backend == "sqlite":
+        return SqliteSessionStore()
+    elif backend != "memory":
+        logger.error(f"Unknown SESSION_STORE_BACKEND={backend}, using memory.")
+    return MemorySessionStore()
+
+
+session_store = build_session_store()
@@ -0,0 +1,155 @@
+import os
+import json
+import glob
+import time
+import threading
+from typing import Any, Dict, List, Optional
+from conf import logger
+
+"""
+This code provides:
+- Capture of slow /chat/v3/build_ui requests into a bounded on-disk ring buffer.
+- Per-function latency thresholds, configurable via environment variables.
+- Each capture holds the full InputV3 body, the language header, a timing
+  breakdown and the request_id, so it can be replayed by benchmarks.harness.
+"""
+
+# Step 1: Load environment variables for capture configuration
+SLOW_REQUEST_CAPTURE_ENABLED = (
+    os.environ.get("SLOW_REQUEST_CAPTURE_ENABLED", "true").lower() == "true"
+)
+SLOW_REQUEST_THRESHOLD_MS = float(os.environ.get("SLOW_REQUEST_THRESHOLD_MS", 1000))
+# Per-function overrides: "human_approval_request=300,get_products=1500"
+SLOW_REQUEST_THRESHOLDS = os.environ.get("SLOW_REQUEST_THRESHOLDS", "")
+SLOW_REQUEST_DIR = os.environ.get("SLOW_REQUEST_DIR", "logs/slow_requests")
+SLOW_REQUEST_CAPACITY = int(os.environ.get("SLOW_REQUEST_CAPACITY", 200))
+
+
+def parse_thresholds(raw: str) -> Dict[str, float]:
+    """Parse "name=ms,name=ms" into a dict, ignoring malformed entries."""
+    thresholds: Dict[str, float] = {}
+    for item in raw.split(","):
+        name, sep, value = item.partition("=")
+        if not sep or not name.strip():
+            continue
+        try:
+            thresholds[name.strip()] = float(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid slow request threshold: {item!r}")
+    return thresholds
+
+
+# Step 2: Ring buffer of capture files
+class SlowRequestRecorder:
+    """
+    Fixed number of slot files (``slot-0000.json`` ...) reused round-robin,
+    so disk usage stays bounded no matter how many slow requests happen.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        capacity: int,
+        default_threshold_ms: float,
+        thresholds: Optional[Dict[str, float]] = None,
+        enabled: bool = True,
+    ):
+        self.directory = directory
+        self.capacity = max(capacity, 1)
+        self.default_threshold_ms = default_threshold_ms
+        self.thresholds = thresholds or {}
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.next_slot = self._initial_slot()
+        self.captured = 0
+
+    def _slot_path(self, slot: int) -> str:
+        return os.path.join(self.directory, f"slot-{slot:04d}.json")
+
+    def _initial_slot(self) -> int:
+        # Continue after the most recently written slot so a restart does not
+        # overwrite the newest captures first.
+        existing = glob.glob(os.path.join(self.directory, "slot-*.json"))
+        if not existing:
+            return 0
+        newest = max(existing, key=os.path.getmtime)
+        try:
+            slot = int(os.path.basename(newest)[5:9])
+        except ValueError:
+            return 0
+        return (slot + 1) % self.capacity
+
+    def threshold_for(self, function_name: str) -> float:
+        return self.thresholds.get(function_name, self.default_threshold_ms)
+
+    def should_capture(self, function_name: str, duration_ms: float) -> bool:
+        return self.enabled and duration_ms >= self.threshold_for(function_name)
+
+    def capture(
+        self,
+        input_data: Dict[str, Any],
+        language: str,
+        timings: Dict[str, float],
+        request_id: str,
+        error: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Write one capture into the next slot
+
+        Safe to call from a worker thread; failures are logged, never raised.
+        """
+        function_name = input_data.get("function_name") or ""
+        record = {
+            "captured_at": time.time(),
+            "request_id": request_id,
+            "function_name": function_name,
+            "language": language,
+            "threshold_ms": self.threshold_for(function_name),
+            "timings_ms": timings,
+            "error": error,
+            "input": input_data,
+        }
+        with self.lock:
+            slot = self.next_slot
+            self.next_slot = (slot + 1) % self.capacity
+            self.captured += 1
+        path = self._slot_path(slot)
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error saving slow request capture: {e}")
+            return None
+        logger.info(
+            "Captured slow request",
+            function_name=function_name,
+            request_id=request_id,
+            total_ms=timings.get("total_ms"),
+            path=path,
+        )
+        return path
+
+    def list_captures(self) -> List[Dict[str, Any]]:
+        """All readable captures, oldest first."""
+        captures = []
+        for path in glob.glob(os.path.join(self.directory, "slot-*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    captures.append(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                continue
+        captures.sort(key=lambda c: c.get("captured_at", 0))
+        return captures
+
+
+# Step 3: Global recorder used by the server
+slow_request_recorder = SlowRequestRecorder(
+    directory=SLOW_REQUEST_DIR,
+    capacity=SLOW_REQUEST_CAPACITY,
+    default_threshold_ms=SLOW_REQUEST_THRESHOLD_MS,
+    thresholds=parse_thresholds(SLOW_REQUEST_THRESHOLDS),
+    enabled=SLOW_REQUEST_CAPTURE_ENABLED,
+)
@@ -4,14 +4,20 @@ import logging
 import re
 import psutil
 import sys
-from functools import lru_cache
-from typing import Dict, Any
+import time
+import signal
+import hashlib
+import threading
+from typing import Dict, Any, Optional, Tuple
+from opentelemetry import metrics as otel_metrics
 
 
 # Janis Rubins step 1: Define constants and patterns for flexibility and security
 USER_FILE_PATH = os.environ.get("USER_FILE_PATH", "configs/users.json")
 API_KEYS_FILE_PATH = os.environ.get("API_KEYS_FILE_PATH", "configs/api_keys.json")
 MAX_FILE_SIZE = int(os.environ.get("MAX_USER_FILE_SIZE", 1024 * 1024))  # 1MB default
+# How often the request path may stat() the API key file for changes (seconds)
+API_KEYS_RELOAD_CHECK_S = float(os.environ.get("API_KEYS_RELOAD_CHECK_S", 1.0))
 SUSPICIOUS_PATTERNS = [
     '__proto__', 'constructor', 'prototype', '<script', 'eval(', 'settimeout',
     'setinterval', 'function(', 'javascript:', 'data:', 'vbscript:', 'onerror=', 'onload='
@@ -58,26 +64,48 @@ def file_is_safe(path: str) -> bool:
                 return False
     return True
 
-@lru_cache(maxsize=1)
+def _file_version(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+# path -> ((mtime_ns, size), parsed data); only successful loads are kept
+_json_cache: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
 def load_json(path: str) -> Dict[str, Any]:
     # Janis Rubins step 5: Load JSON file with caching, logging, and security checks
+    # Each file keeps its own cache entry, re-read when its mtime/size changes
+    data = _load_json_version(path, _file_version(path))
+    return data if data is not None else {}
+
+def _load_json_version(path: str, version: Optional[Tuple[int, int]]) -> Optional[Any]:
+    # Returns None when the file cannot be loaded; failures are not cached, so the
+    # next call retries (transient memory pressure, a half-written file)
+    cached = _json_cache.get(path)
+    if cached is not None and version is not None and cached[0] == version:
+        return cached[1]
     logger.debug(f"Attempting to load JSON from {path}")
     if not check_memory_usage():
         logger.error("Memory limit exceeded before loading file")
-        return {}
+        return None
 
     if not file_is_safe(path):
-        logger.error(f"File {path} not safe to load, returning empty dict.")
-        return {}
+        logger.error(f"File {path} not safe to load.")
+        return None
 
     try:
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
-            logger.debug(f"Loaded JSON from {path}: keys={list(data.keys())}")
-            return data
     except Exception as e:
         logger.error(f"Error loading JSON from {path}: {e}", exc_info=True)
-        return {}
+        return None
+    if isinstance(data, dict):
+        logger.debug(f"Loaded JSON from {path}: keys={list(data.keys())}")
+    if version is not None:
+        _json_cache[path] = (version, data)
+    return data
 
 def get_users() -> Dict[str, Any]:
     # Janis Rubins step 6: get_users uses load_json for caching and logging
@@ -91,20 +119,121 @@ def get_users() -> Dict[str, Any]:
     return data
 
 def get_api_keys() -> Dict[str, Any]:
-    # Janis Rubins step 7: get_api_keys similar to get_users, uses load_json
+    # Janis Rubins step 7: get_api_keys returns the mapping held by the API key store
     logger.debug("get_api_keys called")
-    data = load_json(API_KEYS_FILE_PATH)
-    if not isinstance(data, dict):
-        logger.error("API keys data is not a dictionary, returning empty dict.")
-        return {}
-    # Optional: Validate structure of API keys data if needed
-    logger.debug("API keys loaded successfully.")
-    return data
+    api_key_store.maybe_reload()
+    return api_key_store.data
+
+class ApiKeyStore:
+    """
+    In-memory API key index for the request path.
+    Keys are indexed by a keyed BLAKE2b digest, so authenticate() is one digest plus
+    one dict lookup whatever the number of keys, and never compares the caller's key
+    character by character. The file is re-read when its mtime/size changes (checked
+    at most every check_interval seconds) or on SIGHUP; a reload builds a new index
+    and swaps it in with one assignment, and a failed reload keeps the previous one.
+    """
+    def __init__(self, path: str = API_KEYS_FILE_PATH, check_interval: float = API_KEYS_RELOAD_CHECK_S):
+        self.path = path
+        self.check_interval = check_interval
+        self._secret = os.urandom(32)
+        # (raw mapping, digest index, file version) replaced as one tuple
+        self._state: Tuple[Dict[str, Any], Dict[bytes, Any], Optional[Tuple[int, int]]] = ({}, {}, None)
+        self._loaded = False
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def digest(self, api_key: str) -> bytes:
+        return hashlib.blake2b(api_key.encode("utf-8"), key=self._secret, digest_size=16).digest()
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return self._state[0]
+
+    def __len__(self) -> int:
+        return len(self._state[1])
+
+    def reload(self, force: bool = False, trigger: str = "mtime") -> bool:
+        """
+        Re-read the file if it changed (or always with force=True).
+        Returns True when a new index was swapped in.
+        """
+        # Janis Rubins step 8: Rebuild the digest index off to the side, then swap
+        version = _file_version(self.path)
+        if not force and self._loaded and version == self._state[2]:
+            return False
+        with self._lock:
+            if not force and self._loaded and version == self._state[2]:
+                return False
+            self._loaded = True
+            data = _load_json_version(self.path, version) if version is not None else None
+            if not isinstance(data, dict):
+                # Missing, unsafe or unreadable file: keep serving the previous keys.
+                # An empty mapping ({}) is a valid file and revokes every key.
+                logger.error(f"API key reload from {self.path} failed, keeping {len(self)} keys.")
+                _reloads.add(1, {"trigger": trigger, "result": "failed"})
+                return False
+            index = {self.digest(str(key)): record for key, record in data.items()}
+            self._state = (data, index, version)
+        logger.debug(f"Loaded {len(index)} API keys from {self.path}")
+        _reloads.add(1, {"trigger": trigger, "result": "ok"})
+        return True
+
+    def maybe_reload(self):
+        # stat() the file at most once per check_interval
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            self.reload()
+
+    def authenticate(self, api_key: Optional[str]) -> Optional[Any]:
+        """
+        Return the record stored for api_key, or None when it is unknown.
+        Records may be falsy (e.g. {}), so test the result with "is not None".
+        """
+        if not api_key:
+            return None
+        self.maybe_reload()
+        return self._state[1].get(self.digest(api_key))
+
+    def install_sighup_handler(self, loop=None) -> bool:
+        """
+        Reload on SIGHUP. Pass the running event loop when called from async code.
+        Returns False where SIGHUP does not exist or handlers cannot be installed.
+        """
+        if not hasattr(signal, "SIGHUP"):
+            return False
+        try:
+            if loop is not None:
+                loop.add_signal_handler(signal.SIGHUP, self.reload, True, "signal")
+            else:
+                signal.signal(signal.SIGHUP, lambda signum, frame: self.reload(True, "signal"))
+        except (ValueError, RuntimeError, NotImplementedError) as e:
+            logger.error(f"Cannot install SIGHUP handler for API key reloads: {e}")
+            return False
+        return True
+
+api_key_store = ApiKeyStore()
+
+_meter = otel_metrics.get_meter(__name__)
+_reloads = _meter.create_counter(
+    name="ui_server.api_keys.reloads",
+    description="API key file reloads by trigger (mtime, signal) and result (ok, failed)",
+    unit="1",
+)
+_meter.create_observable_gauge(
+    name="ui_server.api_keys.loaded",
+    callbacks=[lambda options: [otel_metrics.Observation(len(api_key_store))]],
+    description="API keys in the in-memory index",
+    unit="1",
+)
 
-# Janis Rubins step 8:
+# Janis Rubins step 9:
 # This file:
 # - Uses environment variables for paths and size limits for flexibility.
-# - Uses caching (lru_cache) to avoid re-loading the same file multiple times, saving CPU and I/O.
+# - Caches each file by path and (mtime, size), so files do not evict each other, edits are picked up
+#   and failed loads are retried instead of cached.
+# - Serves API key lookups from a digest index that reloads atomically on file change or SIGHUP.
 # - Performs size and suspicious pattern checks before loading, improving security.
 # - Logs deeply at each step, aiding debugging and performance monitoring.
 # - Maintains original logic (returning dicts of users/api_keys) but enhances safety, performance, and flexibility.
@@ -0,0 +1,173 @@
+import os
+import json
+import glob
+import time
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+from conf import logger
+from utils.fingerprint import fingerprint
+
+"""
+This code provides:
+- Selection of the most frequent cacheable /chat/v3/build_ui requests from
+  recent usage segments (logs/usage/*.jsonl), grouped by request fingerprint.
+- A shipped fallback list (share/warmup_requests.json) for fresh deployments
+  without usage history; it still pays lazy imports and first-render costs.
+- A time-boxed startup warm-up that runs in the background from the app
+  lifespan, and a readiness flag reported by /health.
+"""
+
+# Step 1: Load environment variables for warm-up configuration
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_TOP_N = int(os.environ.get("WARMUP_TOP_N", 50))
+WARMUP_TIMEOUT_S = float(os.environ.get("WARMUP_TIMEOUT_S", 20))
+WARMUP_USAGE_DIR = os.environ.get("WARMUP_USAGE_DIR", "logs/usage")
+WARMUP_MAX_AGE_S = float(os.environ.get("WARMUP_MAX_AGE_S", 24 * 3600))
+WARMUP_MAX_RECORDS = int(os.environ.get("WARMUP_MAX_RECORDS", 20000))
+WARMUP_FIXTURES = os.environ.get("WARMUP_FIXTURES", "share/warmup_requests.json")
+
+# Traffic generated by benchmarks, replays and earlier warm-ups is not real usage
+SKIPPED_CHAT_PREFIXES = ("benchmark-", "replay-", "warmup-")
+
+# Handler that renders request bodies; see WarmupHandler in utils.cache_admin
+WarmupRenderer = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+# Step 2: Reading usage segments
+def iter_recent_usage(
+    directory: str = WARMUP_USAGE_DIR,
+    max_age_s: float = WARMUP_MAX_AGE_S,
+    max_records: int = WARMUP_MAX_RECORDS,
+    now: Optional[float] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Usage records newer than ``max_age_s``, newest segment files first."""
+    cutoff = (now or time.time()) - max_age_s
+    paths = glob.glob(os.path.join(directory, "*.jsonl"))
+    paths.sort(key=os.path.getmtime, reverse=True)
+    emitted = 0
+    for path in paths:
+        if os.path.basename(path).startswith(SKIPPED_CHAT_PREFIXES):
+            continue
+        if os.path.getmtime(path) < cutoff:
+            break
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get("timestamp", now or time.time()) < cutoff:
+                        continue
+                    yield record
+                    emitted += 1
+                    if emitted >= max_records:
+                        return
+        except OSError as e:
+            logger.warning(f"Cannot read usage segment {path}: {e}")
+
+
+def record_to_request(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Turn a usage record into a warm-up request body, None if unusable."""
+    context = record.get("context") or {}
+    function_name = context.get("function_name")
+    if not function_name:
+        return None
+    return {
+        "function_name": function_name,
+        "llm_output": context.get("llm_output") or "",
+        "backend_output": context.get("backend_output") or {},
+        "api_key": context.get("api_key") or "",
+        "language": context.get("language") or "ru",
+    }
+
+
+def select_top_requests(
+    records: Iterator[Dict[str, Any]],
+    is_cacheable: Callable[[str], bool],
+    top_n: int = WARMUP_TOP_N,
+) -> List[Dict[str, Any]]:
+    """Most frequent cacheable requests, one body per distinct fingerprint."""
+    counts: Counter = Counter()
+    bodies: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        request = record_to_request(record)
+        if request is None or not is_cacheable(request["function_name"]):
+            continue
+        try:
+            key = fingerprint(request)
+        except TypeError:
+            continue
+        counts[key] += 1
+        bodies.setdefault(key, request)
+    return [bodies[key] for key, _ in counts.most_common(top_n)]
+
+
+def load_fixture_requests(path: str = WARMUP_FIXTURES) -> List[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            requests = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Cannot load warm-up fixtures {path}: {e}")
+        return []
+    return requests if isinstance(requests, list) else []
+
+
+# Step 3: Startup warm-up and readiness
+class WarmupState:
+    def __init__(self, enabled: bool = WARMUP_ENABLED):
+        # Nothing to wait for when warm-up is disabled
+        self.ready = not enabled
+        self.summary: Dict[str, Any] = {"status": "pending" if enabled else "disabled"}
+
+
+warmup_state = WarmupState()
+
+
+async def run_startup_warmup(
+    render: WarmupRenderer,
+    is_cacheable: Callable[[str], bool],
+    state: WarmupState = warmup_state,
+    top_n: int = WARMUP_TOP_N,
+    timeout_s: float = WARMUP_TIMEOUT_S,
+    usage_dir: str = WARMUP_USAGE_DIR,
+    fixtures: str = WARMUP_FIXTURES,
+) -> Dict[str, Any]:
+    """
+    Pre-render the top requests (or the fixture list) and mark ``state``
+    ready. ``render(requests, deadline=...)`` stops at the deadline; the scan
+    and the render are also cut off at ``timeout_s``, so one hanging render
+    cannot keep /health at 503. The process reports ready once the time box
+    is used up either way.
+    """
+    started = time.monotonic()
+    deadline = started + timeout_s
+
+    async def warm() -> Dict[str, Any]:
+        requests = await asyncio.to_thread(
+            select_top_requests, iter_recent_usage(usage_dir), is_cacheable, top_n
+        )
+        source = "usage"
+        if not requests:
+            requests = load_fixture_requests(fixtures)
+            source = "fixtures"
+        summary = await render(requests, deadline=deadline)
+        return {"status": "done", "source": source, "requests": len(requests), **summary}
+
+    try:
+        state.summary = await asyncio.wait_for(warm(), timeout_s)
+    except asyncio.TimeoutError:
+        logger.warning(f"Startup warm-up timed out after {timeout_s}s")
+        state.summary = {"status": "timeout"}
+    except asyncio.CancelledError:
+        state.summary = {"status": "cancelled"}
+        raise
+    except Exception as e:
+        logger.exception(f"Startup warm-up failed: {e}")
+        state.summary = {"status": "failed", "error": str(e)}
+    finally:
+        state.summary["duration_s"] = round(time.monotonic() - started, 3)
+        state.ready = True
+    logger.info("Startup warm-up finished", **state.summary)
+    return state.summary